@@ -1,13 +1,38 @@
 import asyncio
-from typing import Union, Callable, List, Coroutine
+import json
+import time
+import zlib
+from typing import AsyncIterator, Dict, Union, Callable, List, Coroutine, Optional
 
 import aiohttp
 
+from jonbot.api_interface.api_client.multiplexed_api_connection import (
+    MultiplexedApiConnection,
+    MultiplexedConnectionUnavailable,
+)
 from jonbot.api_interface.helpers.error_message_from_response import (
     error_message_from_response,
 )
+from jonbot.api_interface.helpers.serve_multiplexed_connection import MULTIPLEXED_ENDPOINT
+from jonbot.api_interface.helpers.server_sent_events import (
+    DONE_EVENT,
+    ERROR_EVENT,
+    ServerSentEventDecoder,
+    TOKEN_EVENT,
+    USAGE_EVENT,
+)
 from jonbot.backend.data_layer.models.api_endpoint_url import ApiRoute
-from jonbot.system.environment_variables import API_HOST_NAME
+from jonbot.system.environment_variables import (
+    API_HOST_NAME,
+    API_CLIENT_CONNECTION_LIMIT,
+    API_CLIENT_CONNECTION_LIMIT_PER_HOST,
+    API_CLIENT_DNS_CACHE_TTL_SECONDS,
+    API_CLIENT_KEEPALIVE_TIMEOUT_SECONDS,
+    API_CLIENT_USE_MULTIPLEXED_TRANSPORT,
+    API_CLIENT_MULTIPLEXED_RETRY_SECONDS,
+    API_WORKERS,
+    PORT_NUMBER,
+)
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
@@ -16,26 +41,163 @@ logger = get_jonbot_logger()
 class ApiClient:
     api_host_name = API_HOST_NAME
 
+    def __init__(
+            self,
+            connection_limit: int = API_CLIENT_CONNECTION_LIMIT,
+            connection_limit_per_host: int = API_CLIENT_CONNECTION_LIMIT_PER_HOST,
+            dns_cache_ttl_seconds: int = API_CLIENT_DNS_CACHE_TTL_SECONDS,
+            keepalive_timeout_seconds: float = API_CLIENT_KEEPALIVE_TIMEOUT_SECONDS,
+            api_port_number: Optional[int] = None,
+            use_multiplexed_transport: bool = API_CLIENT_USE_MULTIPLEXED_TRANSPORT,
+            multiplexed_retry_seconds: float = API_CLIENT_MULTIPLEXED_RETRY_SECONDS,
+            api_workers: int = API_WORKERS,
+    ):
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.dns_cache_ttl_seconds = dns_cache_ttl_seconds
+        self.keepalive_timeout_seconds = keepalive_timeout_seconds
+        self.api_port_number = api_port_number
+        self.use_multiplexed_transport = use_multiplexed_transport
+        self.multiplexed_retry_seconds = multiplexed_retry_seconds
+        self.api_workers = max(api_workers, 1)
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # worker index -> that worker's shared connection / when to try opening it again
+        self._multiplexed_connections: Dict[int, MultiplexedApiConnection] = {}
+        self._multiplexed_retry_at: Dict[int, float] = {}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        One pooled, keep-alive session per process. The session is bound to the event loop it was created on,
+        so a new one is made if the old one was closed or belongs to a different loop.
+        """
+        current_loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not current_loop:
+            self._discard_session(current_loop=current_loop)
+            logger.debug(
+                f"Creating pooled aiohttp session (limit: {self.connection_limit}, "
+                f"limit_per_host: {self.connection_limit_per_host}, "
+                f"dns_cache_ttl: {self.dns_cache_ttl_seconds}s, "
+                f"keepalive_timeout: {self.keepalive_timeout_seconds}s)"
+            )
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl_seconds,
+                keepalive_timeout=self.keepalive_timeout_seconds,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = current_loop
+        return self._session
+
+    def _discard_session(self, current_loop: asyncio.AbstractEventLoop):
+        """Cleans up a session (and its multiplexed connections) that can't be used on `current_loop`"""
+        session, session_loop = self._session, self._session_loop
+        multiplexed_connections = list(self._multiplexed_connections.values())
+        self._session = None
+        self._session_loop = None
+        self._multiplexed_connections = {}
+        if session is None:
+            return
+
+        logger.info(f"Replacing ApiClient session ({'closed' if session.closed else 'from another event loop'}, "
+                    f"with {len(multiplexed_connections)} multiplexed connections)")
+        if session_loop is not None and session_loop is not current_loop and session_loop.is_running():
+            # its loop is still going (in another thread) - close everything properly over there
+            asyncio.run_coroutine_threadsafe(self._close_transports(session=session,
+                                                                    multiplexed_connections=multiplexed_connections),
+                                             session_loop)
+            return
+
+        # the session is already closed, or its loop has stopped - either way nothing of it can be awaited from here
+        for multiplexed_connection in multiplexed_connections:
+            multiplexed_connection.detach()
+        if not session.closed:
+            connector = session.connector
+            session.detach()
+            # `connector.close()` is a coroutine for the old loop - `_close()` is its synchronous part, which closes
+            # the pooled transports (or just marks the connector closed, if the loop is closed and took them with it)
+            connector._close()
+
+    @staticmethod
+    async def _close_transports(session: aiohttp.ClientSession,
+                                multiplexed_connections: List[MultiplexedApiConnection]):
+        for multiplexed_connection in multiplexed_connections:
+            await multiplexed_connection.close()
+        await session.close()
+
+    def worker_index(self, routing_key: Optional[str] = None) -> int:
+        """
+        Which API worker serves requests with this routing key (e.g. a chat's context route id) - always the same one,
+        so that worker's chatbot for the route stays warm. Requests without a key go to worker 0.
+        """
+        if routing_key is None or self.api_workers == 1:
+            return 0
+        return zlib.crc32(routing_key.encode("utf-8")) % self.api_workers  # `hash()` differs between processes
+
+    def multiplexed_connection(self, worker_index: int = 0) -> Optional[MultiplexedApiConnection]:
+        """
+        The worker's shared WebSocket connection, when `use_multiplexed_transport` is on - `None` means "use plain
+        HTTP" (it's off, or the connection recently couldn't be opened)
+        """
+        if not self.use_multiplexed_transport or time.monotonic() < self._multiplexed_retry_at.get(worker_index, 0):
+            return None
+        session = self.session
+        if worker_index not in self._multiplexed_connections:
+            self._multiplexed_connections[worker_index] = MultiplexedApiConnection(
+                session=session,
+                endpoint_url=self._endpoint_url(endpoint_name=MULTIPLEXED_ENDPOINT, worker_index=worker_index),
+            )
+        return self._multiplexed_connections[worker_index]
+
+    def _fall_back_to_http(self, worker_index: int, error: MultiplexedConnectionUnavailable):
+        logger.warning(f"Multiplexed connection to API worker {worker_index} unavailable, using HTTP for the next "
+                       f"{self.multiplexed_retry_seconds}s - {error}")
+        self._multiplexed_retry_at[worker_index] = time.monotonic() + self.multiplexed_retry_seconds
+
+    def _endpoint_url(self, endpoint_name: str, worker_index: int = 0) -> str:
+        base_port_number = self.api_port_number if self.api_port_number is not None else PORT_NUMBER
+        return ApiRoute.from_endpoint(
+            host_name=self.api_host_name, endpoint=endpoint_name, port_number=base_port_number + worker_index
+        ).endpoint_url
+
+    async def close(self):
+        for multiplexed_connection in self._multiplexed_connections.values():
+            await multiplexed_connection.close()
+        self._multiplexed_connections = {}
+        if self._session is not None and not self._session.closed:
+            logger.info("Closing ApiClient session...")
+            await self._session.close()
+            logger.info("ApiClient session closed!")
+        self._session = None
+        self._session_loop = None
+
     async def send_request_to_api(
-            self, endpoint_name: str, data: dict = None, method: str = "POST"
+            self, endpoint_name: str, data: dict = None, method: str = "POST", routing_key: str = None
     ) -> dict:
 
         try:
-            endpoint_url = ApiRoute.from_endpoint(
-                host_name=self.api_host_name, endpoint=endpoint_name
-            ).endpoint_url
+            worker_index = self.worker_index(routing_key=routing_key)
+            endpoint_url = self._endpoint_url(endpoint_name=endpoint_name, worker_index=worker_index)
 
             if not data:
                 data = {}
-            logger.debug(f"Sending request to API endpoint: {endpoint_url}")
-            async with aiohttp.ClientSession() as session:
-                if method == "POST":
-                    response = await session.post(endpoint_url, json=data)
-                elif method == "GET":
-                    response = await session.get(endpoint_url, json=data)
-                else:
-                    raise Exception(f"Invalid type: {method}")
+            if method not in ["POST", "GET"]:
+                raise Exception(f"Invalid type: {method}")
+
+            multiplexed_connection = self.multiplexed_connection(worker_index=worker_index)
+            if multiplexed_connection is not None:
+                try:
+                    return json.loads(await multiplexed_connection.request(endpoint_name=endpoint_name,
+                                                                           data=data,
+                                                                           method=method))
+                except MultiplexedConnectionUnavailable as e:
+                    self._fall_back_to_http(worker_index=worker_index, error=e)
 
+            logger.debug(f"Sending request to API endpoint: {endpoint_url}")
+            async with self.session.request(method, endpoint_url, json=data) as response:
                 if response.status == 200:
                     return await response.json()
                 else:
@@ -54,48 +216,77 @@ class ApiClient:
             endpoint_name: str,
             data: dict = dict(),
             callbacks: Union[Callable, Coroutine] = None,
-    ) -> List[str]:
-        endpoint_url = ApiRoute.from_endpoint(
-            host_name=self.api_host_name, endpoint=endpoint_name
-        ).endpoint_url
+            routing_key: str = None,
+    ) -> dict:
+        """
+        Streams a server-sent-event response, running `callbacks` on the text of each `token` event.
+        Returns the data from the `usage` event merged with the data from the `done` event (e.g. `/chat` sends the
+        updated context memory's `memory_message_ids` and `memory_version` there).
+        """
         if not callbacks:
             callbacks = []
 
         if not data:
             data = {}
-        response_tokens = []
+        decoder = ServerSentEventDecoder()
+        stream_data = {}
+        done = False
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(endpoint_url, json=data) as response:
-                    if response.status == 200:
-                        async for line in response.content.iter_any():
-                            await run_callbacks(callbacks, line)
-                            response_tokens.append(line.decode("utf-8"))
-
-                    else:
-                        error_message = await error_message_from_response(response)
-                        logger.error(error_message)
-                        await run_callbacks(callbacks, error_message.encode("utf-8"))
-                        raise Exception(error_message)
+            async for chunk in self._stream_response_body(endpoint_name=endpoint_name,
+                                                          data=data,
+                                                          worker_index=self.worker_index(routing_key=routing_key)):
+                for event in decoder.feed(chunk):
+                    if event.event == TOKEN_EVENT:
+                        await run_callbacks(callbacks, event.data["token"])
+                    elif event.event == USAGE_EVENT:
+                        stream_data.update(event.data)
+                    elif event.event == DONE_EVENT:
+                        stream_data.update(event.data)
+                        done = True
+                    elif event.event == ERROR_EVENT:
+                        raise Exception(f"Server reported an error: {event.data.get('message')}")
+            if not done:
+                raise Exception(f"Stream ended without a `{DONE_EVENT}` event")
         except Exception as e:
             error_msg = f"An error occurred while streaming from the API: {str(e)}"
             logger.exception(error_msg)
-            await run_callbacks(callbacks, error_msg.encode("utf-8"))
+            await run_callbacks(callbacks, error_msg)
             raise
 
-        return response_tokens
+        return stream_data
+
+    async def _stream_response_body(self,
+                                    endpoint_name: str,
+                                    data: dict,
+                                    worker_index: int = 0) -> AsyncIterator[Union[bytes, str]]:
+        multiplexed_connection = self.multiplexed_connection(worker_index=worker_index)
+        if multiplexed_connection is not None:
+            try:
+                async for body in multiplexed_connection.stream(endpoint_name=endpoint_name, data=data):
+                    yield body
+                return
+            except MultiplexedConnectionUnavailable as e:
+                self._fall_back_to_http(worker_index=worker_index, error=e)
+
+        endpoint_url = self._endpoint_url(endpoint_name=endpoint_name, worker_index=worker_index)
+        async with self.session.post(endpoint_url, json=data) as response:
+            if response.status != 200:
+                error_message = await error_message_from_response(response)
+                logger.error(error_message)
+                raise Exception(error_message)
+            async for chunk in response.content.iter_any():
+                yield chunk
 
 
-async def run_callbacks(callbacks: List[Callable], line: bytes):
+async def run_callbacks(callbacks: List[Callable], token: str):
     try:
-        line_str = line.decode("utf-8")
-        logger.trace(f"Received line from server: {line_str}")
+        logger.trace(f"Received token from server: {repr(token)}")
         for callback in callbacks:
             logger.trace(f"Running callback: {callback.__name__}")
             if asyncio.iscoroutinefunction(callback):
-                await callback(line_str)
+                await callback(token)
             else:
-                callback(line_str)
+                callback(token)
     except Exception as e:
         logger.exception(f"An error occurred while running a callback: {str(e)}")
         raise
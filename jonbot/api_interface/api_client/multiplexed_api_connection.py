@@ -0,0 +1,141 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from jonbot.system.environment_variables import API_CLIENT_MULTIPLEXED_MAX_IN_FLIGHT_REQUESTS
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+WEBSOCKET_HEARTBEAT_SECONDS = 30
+
+
+class MultiplexedConnectionUnavailable(Exception):
+    """The request was never sent (so it's safe to send it some other way)"""
+
+
+class MultiplexedApiConnection:
+    """
+    One long-lived WebSocket to the API that every request shares. Request frames carry an id, and the API answers with
+    `{"id", "status", "body"}` frames tagged with that id (see `serve_multiplexed_connection`), so chat streams and
+    small upserts interleave on the one connection instead of each making its own HTTP request.
+
+    At most `max_in_flight_requests` are outstanding at once - further requests wait for a slot.
+    """
+
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 endpoint_url: str,
+                 max_in_flight_requests: int = API_CLIENT_MULTIPLEXED_MAX_IN_FLIGHT_REQUESTS):
+        self._session = session
+        self.endpoint_url = endpoint_url
+        self._in_flight_slots = asyncio.Semaphore(max_in_flight_requests)
+        self._connect_lock = asyncio.Lock()
+        self._send_lock = asyncio.Lock()
+        self._websocket: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._response_frames: Dict[int, asyncio.Queue] = {}
+        self._next_request_id = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._websocket is not None and not self._websocket.closed
+
+    async def request(self, endpoint_name: str, data: dict, method: str = "POST") -> str:
+        return "".join([body async for body in self.stream(endpoint_name=endpoint_name, data=data, method=method)])
+
+    async def stream(self, endpoint_name: str, data: dict, method: str = "POST") -> AsyncIterator[str]:
+        """Yields the response body as it arrives - raises `MultiplexedConnectionUnavailable` before sending, if it can't"""
+        async with self._in_flight_slots:
+            await self._connect()
+            request_id = self._next_request_id
+            self._next_request_id += 1
+            frames = asyncio.Queue()
+            self._response_frames[request_id] = frames
+            finished = False
+            try:
+                try:
+                    async with self._send_lock:
+                        await self._websocket.send_json({"id": request_id,
+                                                         "endpoint": endpoint_name,
+                                                         "method": method,
+                                                         "data": data})
+                except (ConnectionError, RuntimeError) as e:
+                    finished = True
+                    raise MultiplexedConnectionUnavailable(f"Failed to send request on multiplexed connection - {e}")
+
+                error_body = []
+                while not finished:
+                    frame = await frames.get()
+                    if frame is None:
+                        finished = True
+                        raise Exception(f"Multiplexed connection closed during request to {endpoint_name}")
+                    finished = frame.get("end", False)
+                    if frame["status"] != 200:
+                        error_body.append(frame["body"])
+                        if finished:
+                            raise Exception(f"Received non-200 response code: {frame['status']} - {''.join(error_body)}")
+                    elif frame["body"]:
+                        yield frame["body"]
+            finally:
+                self._response_frames.pop(request_id, None)
+                if not finished and self.connected:
+                    await self._cancel(request_id)
+
+    async def close(self):
+        if self._websocket is not None:
+            await self._websocket.close()
+        if self._reader_task is not None:
+            await self._reader_task
+        self._websocket = None
+        self._reader_task = None
+
+    def detach(self):
+        """Lets go of the connection without awaiting anything - for when the event loop it was opened on is gone"""
+        if self._reader_task is not None and not self._reader_task.done():
+            try:
+                self._reader_task.cancel()
+            except RuntimeError:
+                pass  # its event loop is already closed - the task will never run again anyway
+        self._websocket = None
+        self._reader_task = None
+
+    async def _connect(self):
+        if self.connected:
+            return
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                self._websocket = await self._session.ws_connect(self.endpoint_url,
+                                                                 heartbeat=WEBSOCKET_HEARTBEAT_SECONDS,
+                                                                 max_msg_size=0)
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                raise MultiplexedConnectionUnavailable(f"Could not connect to {self.endpoint_url} - {e}")
+            logger.info(f"Opened multiplexed API connection: {self.endpoint_url}")
+            self._reader_task = asyncio.create_task(self._read_frames(self._websocket))
+
+    async def _read_frames(self, websocket: aiohttp.ClientWebSocketResponse):
+        try:
+            async for message in websocket:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    frame = json.loads(message.data)
+                    frames = self._response_frames.get(frame["id"])
+                    if frames is not None:
+                        frames.put_nowait(frame)
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    logger.warning(f"Multiplexed API connection error: {websocket.exception()}")
+                    break
+        finally:
+            logger.info(f"Multiplexed API connection closed ({len(self._response_frames)} requests in flight)")
+            for frames in self._response_frames.values():
+                frames.put_nowait(None)
+
+    async def _cancel(self, request_id: int):
+        try:
+            async with self._send_lock:
+                await self._websocket.send_json({"id": request_id, "cancel": True})
+        except (ConnectionError, RuntimeError) as e:
+            logger.debug(f"Failed to cancel multiplexed request {request_id} - {e}")
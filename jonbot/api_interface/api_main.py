@@ -25,6 +25,12 @@ async def get_or_create_fastapi_app():
         FAST_API_APP = FastAPI()
 
         mongo_database = await get_mongo_database_manager()
+        try:
+            await mongo_database.bootstrap_indexes()
+        except Exception as e:
+            # the API works without the indexes (just slower) - each database still gets them on its first write
+            logger.error(f"Failed to bootstrap database indexes - {e}")
+            logger.exception(e)
         database_operator = get_backend_database_operator(mongo_database=mongo_database)
         controller = get_controller(database_operator=database_operator)
 
@@ -33,17 +39,20 @@ async def get_or_create_fastapi_app():
             database_operations=database_operator,
             controller=controller,
         )
+        FAST_API_APP.add_event_handler("shutdown", controller.close)
+        FAST_API_APP.add_event_handler("shutdown", database_operator.upsert_buffer.close)
 
     return FAST_API_APP
 
 
-async def run_api_async():
+async def run_api_async(worker_index: int = 0):
     """
-    Run the API for jonbot
+    Run the API for jonbot - as worker `worker_index` (of `API_WORKERS`), listening on `PORT_NUMBER + worker_index`.
+    Workers share nothing but the database, so each chat is routed to one worker by its context route (see `ApiClient`)
     """
-    logger.info("Starting API")
+    logger.info(f"Starting API worker {worker_index}")
     fastapi_app = await get_or_create_fastapi_app()
-    config = Config(app=fastapi_app, host=HOST_NAME, port=PORT_NUMBER)
+    config = Config(app=fastapi_app, host=HOST_NAME, port=PORT_NUMBER + worker_index)
     server = Server(config)
     logger.success(
         f"Server: {server} - {server.config} - {server.config.app} - Started on {server.config.host}:{str(server.config.port)}"
@@ -51,9 +60,9 @@ async def run_api_async():
     await server.serve()
 
 
-def run_api_sync():
+def run_api_sync(worker_index: int = 0):
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(run_api_async())
+    loop.run_until_complete(run_api_async(worker_index=worker_index))
 
 
 if __name__ == "__main__":
@@ -9,11 +9,21 @@ from langchain_core.messages import AIMessage
 from starlette.responses import StreamingResponse
 from starlette.websockets import WebSocket
 
+from jonbot.api_interface.helpers.serve_multiplexed_connection import (
+    MULTIPLEXED_ENDPOINT,
+    serve_multiplexed_connection,
+)
+from jonbot.api_interface.helpers.server_sent_events import frame_token_stream
 from jonbot.backend.controller.controller import Controller
+from jonbot.backend.data_layer.models.chatbot_cache_stats import ChatbotCacheStats
+from jonbot.backend.data_layer.models.context_memory_cache_stats import ContextMemoryCacheStats
 from jonbot.backend.data_layer.models.conversation_models import ChatRequest, ImageChatRequest
 from jonbot.backend.data_layer.models.database_request_response_models import UpsertDiscordMessagesRequest, \
-    UpsertResponse, ContextMemoryDocumentRequest, UpsertDiscordChatsRequest
+    UpsertResponse, ContextMemoryDocumentRequest, UpsertDiscordChatsRequest, ScrapeCheckpointsRequest, \
+    ScrapeCheckpointsResponse, UpsertScrapeCheckpointRequest, UpsertMessageReactionsRequest, MessageReactionsRequest, \
+    MessageReactionsResponse
 from jonbot.backend.data_layer.models.health_check_status import HealthCheckResponse
+from jonbot.backend.data_layer.models.upsert_buffer_stats import UpsertBufferStats
 from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
 from jonbot.backend.data_layer.models.voice_to_text_request import VoiceToTextRequest, VoiceToTextResponse
 
@@ -34,13 +44,21 @@ VOICE_TO_TEXT_ENDPOINT = "/voice_to_text"
 
 UPSERT_MESSAGES_ENDPOINT = "/upsert_messages"
 UPSERT_CHATS_ENDPOINT = "/upsert_chats"
+UPSERT_SCRAPE_CHECKPOINT_ENDPOINT = "/upsert_scrape_checkpoint"
+UPSERT_MESSAGE_REACTIONS_ENDPOINT = "/upsert_message_reactions"
 
 GET_CONTEXT_MEMORY_ENDPOINT = "/get_context_memory"
+GET_SCRAPE_CHECKPOINTS_ENDPOINT = "/get_scrape_checkpoints"
+GET_MESSAGE_REACTIONS_ENDPOINT = "/get_message_reactions"
 
 VECTOR_SEARCH_ENDPOINT = "/vector_search"
 
 CHAT_STATELESS_ENDPOINT = "/chat_stateless"
 
+CHATBOT_CACHE_STATS_ENDPOINT = "/chatbot_cache_stats"
+UPSERT_BUFFER_STATS_ENDPOINT = "/upsert_buffer_stats"
+CONTEXT_MEMORY_CACHE_STATS_ENDPOINT = "/context_memory_cache_stats"
+
 
 class StreamingPassthroughToWebsocketHandler(AsyncCallbackHandler):
     def __init__(self, websocket, *args, **kwargs):
@@ -65,6 +83,18 @@ def register_api_routes(
     async def health_check_endpoint():
         return HealthCheckResponse(status="alive")
 
+    @app.get(CHATBOT_CACHE_STATS_ENDPOINT, response_model=ChatbotCacheStats)
+    async def chatbot_cache_stats_endpoint() -> ChatbotCacheStats:
+        return controller.chatbot_cache_stats
+
+    @app.get(UPSERT_BUFFER_STATS_ENDPOINT, response_model=UpsertBufferStats)
+    async def upsert_buffer_stats_endpoint() -> UpsertBufferStats:
+        return database_operations.upsert_buffer_stats
+
+    @app.get(CONTEXT_MEMORY_CACHE_STATS_ENDPOINT, response_model=ContextMemoryCacheStats)
+    async def context_memory_cache_stats_endpoint() -> ContextMemoryCacheStats:
+        return database_operations.context_memory_cache_stats
+
     @app.get(GET_CONTEXT_MEMORY_ENDPOINT, response_model=Optional[ContextMemoryDocument])
     async def get_context_memory_endpoint(
             get_request: ContextMemoryDocumentRequest,
@@ -81,6 +111,18 @@ def register_api_routes(
 
         return response.data
 
+    @app.get(GET_SCRAPE_CHECKPOINTS_ENDPOINT, response_model=ScrapeCheckpointsResponse)
+    async def get_scrape_checkpoints_endpoint(
+            get_request: ScrapeCheckpointsRequest,
+    ) -> ScrapeCheckpointsResponse:
+        return await database_operations.get_scrape_checkpoints(request=get_request)
+
+    @app.get(GET_MESSAGE_REACTIONS_ENDPOINT, response_model=MessageReactionsResponse)
+    async def get_message_reactions_endpoint(
+            get_request: MessageReactionsRequest,
+    ) -> MessageReactionsResponse:
+        return await database_operations.get_message_reactions(request=get_request)
+
     @app.post(VOICE_TO_TEXT_ENDPOINT, response_model=VoiceToTextResponse)
     async def voice_to_text_endpoint(
             voice_to_text_request: VoiceToTextRequest,
@@ -96,8 +138,10 @@ def register_api_routes(
     async def chat_endpoint(chat_request: ChatRequest):
         logger.info(f"Received chat request: {chat_request}")
         return StreamingResponse(
-            controller.get_response_from_chatbot(chat_request=chat_request),
+            frame_token_stream(controller.get_response_from_chatbot(chat_request=chat_request),
+                               done_data=lambda: controller.get_memory_update(chat_request=chat_request)),
             media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
         )
 
     @app.post(IMAGE_CHAT_ENDPOINT)
@@ -120,6 +164,21 @@ def register_api_routes(
             logger.error(f"Failed to upsert chats: {request}")
         return response
 
+    @app.post(UPSERT_SCRAPE_CHECKPOINT_ENDPOINT)
+    async def upsert_scrape_checkpoint_endpoint(
+            request: UpsertScrapeCheckpointRequest,
+    ) -> UpsertResponse:
+        return await database_operations.upsert_scrape_checkpoint(request=request)
+
+    @app.post(UPSERT_MESSAGE_REACTIONS_ENDPOINT)
+    async def upsert_message_reactions_endpoint(
+            request: UpsertMessageReactionsRequest,
+    ) -> UpsertResponse:
+        return await database_operations.upsert_message_reactions(request=request)
+
+    @app.websocket(MULTIPLEXED_ENDPOINT)
+    async def multiplexed_endpoint(websocket: WebSocket):
+        await serve_multiplexed_connection(websocket=websocket, app=app)
 
     @app.websocket(CHAT_STATELESS_ENDPOINT)
     async def chat_stateless_endpoint(websocket: WebSocket):
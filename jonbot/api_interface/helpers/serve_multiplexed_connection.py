@@ -0,0 +1,110 @@
+import asyncio
+import codecs
+import json
+from typing import Dict
+
+from starlette.types import ASGIApp
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from jonbot.system.environment_variables import API_MULTIPLEXED_MAX_CONCURRENT_REQUESTS
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+MULTIPLEXED_ENDPOINT = "/multiplexed"
+
+
+async def serve_multiplexed_connection(websocket: WebSocket,
+                                       app: ASGIApp,
+                                       max_concurrent_requests: int = API_MULTIPLEXED_MAX_CONCURRENT_REQUESTS):
+    """
+    Serves many API requests over one WebSocket. Each request frame (`{"id", "endpoint", "method", "data"}`) is run
+    through `app`'s regular HTTP routes, and the response body is sent back as `{"id", "status", "body"}` frames as it
+    is produced - the last one marked `"end": true` - so concurrent chat streams and upserts interleave on the socket.
+
+    At most `max_concurrent_requests` run at once - past that we stop reading frames, which pushes back on the client.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    request_slots = asyncio.Semaphore(max_concurrent_requests)
+    running_requests: Dict[int, asyncio.Task] = {}
+
+    def request_finished(request_id: int):
+        running_requests.pop(request_id, None)
+        request_slots.release()
+
+    try:
+        while True:
+            frame = await websocket.receive_json()
+            if frame.get("cancel"):
+                task = running_requests.get(frame["id"])
+                if task is not None:
+                    task.cancel()
+                continue
+
+            await request_slots.acquire()
+            task = asyncio.create_task(_run_request(app=app, websocket=websocket, send_lock=send_lock, frame=frame))
+            running_requests[frame["id"]] = task
+            task.add_done_callback(lambda _, request_id=frame["id"]: request_finished(request_id))
+    except WebSocketDisconnect:
+        logger.info(f"Multiplexed connection closed ({len(running_requests)} requests still running)")
+    finally:
+        for task in list(running_requests.values()):
+            task.cancel()
+
+
+async def _run_request(app: ASGIApp, websocket: WebSocket, send_lock: asyncio.Lock, frame: dict):
+    request_id = frame["id"]
+    body = json.dumps(frame.get("data") or {}).encode("utf-8")
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    request_body_sent = False
+    status = None
+    response_finished = False
+
+    async def receive() -> dict:
+        nonlocal request_body_sent
+        if not request_body_sent:
+            request_body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # no disconnect until the connection goes away (and cancels this request)
+
+    async def send(message: dict):
+        nonlocal status, response_finished
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            more_body = message.get("more_body", False)
+            text = utf8_decoder.decode(message.get("body", b""), final=not more_body)
+            if text or not more_body:
+                response_frame = {"id": request_id, "status": status, "body": text}
+                if not more_body:
+                    response_frame["end"] = True
+                    response_finished = True
+                async with send_lock:
+                    await websocket.send_json(response_frame)
+
+    try:
+        await app(_http_scope(websocket=websocket, frame=frame, body=body), receive, send)
+    except Exception as e:
+        logger.exception(f"Multiplexed request {request_id} to {frame.get('endpoint')} failed - {e}")
+        if not response_finished:
+            async with send_lock:
+                await websocket.send_json({"id": request_id, "status": 500, "body": str(e), "end": True})
+
+
+def _http_scope(websocket: WebSocket, frame: dict, body: bytes) -> dict:
+    path = frame["endpoint"]
+    return {"type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": frame.get("method", "POST"),
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode("latin-1"))],
+            "client": websocket.scope.get("client"),
+            "server": websocket.scope.get("server"),
+            "state": dict(websocket.scope.get("state", {}))}
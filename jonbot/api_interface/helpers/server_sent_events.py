@@ -0,0 +1,106 @@
+import codecs
+import json
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Union
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+TOKEN_EVENT = "token"
+ERROR_EVENT = "error"
+USAGE_EVENT = "usage"
+DONE_EVENT = "done"
+
+
+class ServerSentEvent(NamedTuple):
+    event: str
+    data: dict
+
+
+def format_server_sent_event(event: str, data: dict) -> bytes:
+    # json keeps newlines inside tokens escaped, so every event is exactly one `data:` line
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def frame_token_stream(tokens: AsyncIterable[str],
+                             done_data: Callable[[], Awaitable[dict]] = None) -> AsyncIterator[bytes]:
+    """
+    Wraps a chatbot's token stream as server-sent events - a `token` event per token, then `usage` and `done`.
+    If the stream fails part way through, an `error` event is sent before `usage` and `done`.
+    `done_data`, if given, is awaited once the stream has finished cleanly and its result is sent in the `done` event.
+    """
+    token_count = 0
+    character_count = 0
+    failed = False
+    try:
+        async for token in tokens:
+            token_count += 1
+            character_count += len(token)
+            yield format_server_sent_event(TOKEN_EVENT, {"token": token})
+    except Exception as e:
+        failed = True
+        logger.exception(f"Error while streaming chat response: {e}")
+        yield format_server_sent_event(ERROR_EVENT, {"message": f"{type(e).__name__}: {e}"})
+
+    yield format_server_sent_event(USAGE_EVENT, {"streamed_tokens": token_count, "characters": character_count})
+
+    final_data = {}
+    if done_data is not None and not failed:
+        try:
+            final_data = await done_data()
+        except Exception as e:
+            logger.exception(f"Error while building the final chat stream event: {e}")
+    yield format_server_sent_event(DONE_EVENT, final_data)
+
+
+class ServerSentEventDecoder:
+    """
+    Incremental server-sent-event parser - feed it raw chunks in whatever sizes the transport delivers them (events,
+    lines, and multi-byte characters can all be split across chunks) and it returns the events completed so far.
+    Already-decoded text (e.g. from the multiplexed transport) can be fed in too.
+    """
+
+    def __init__(self):
+        self._utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._event_name: Optional[str] = None
+        self._data_lines: List[str] = []
+
+    def feed(self, chunk: Union[bytes, str]) -> List[ServerSentEvent]:
+        if isinstance(chunk, bytes):
+            chunk = self._utf8_decoder.decode(chunk)
+        self._buffer += chunk
+        if "\n" not in self._buffer:
+            return []
+
+        *lines, self._buffer = self._buffer.split("\n")
+        events = []
+        for line in lines:
+            event = self._process_line(line.rstrip("\r"))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _process_line(self, line: str) -> Optional[ServerSentEvent]:
+        if line == "":
+            return self._dispatch()
+        if line.startswith(":"):
+            return None  # comment/keep-alive
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            self._event_name = value
+        elif field == "data":
+            self._data_lines.append(value)
+        return None
+
+    def _dispatch(self) -> Optional[ServerSentEvent]:
+        if not self._data_lines:
+            self._event_name = None
+            return None
+        event = ServerSentEvent(event=self._event_name or "message", data=json.loads("\n".join(self._data_lines)))
+        self._event_name = None
+        self._data_lines = []
+        return event
@@ -1,8 +1,5 @@
-import inspect
-import traceback
-from typing import AsyncIterable, Union
+from typing import AsyncIterable, Union, Optional
 
-from langchain.chat_models import ChatOpenAI
 from langchain.chat_models.base import BaseChatModel
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.runnable import RunnableMap, RunnableSequence
@@ -13,21 +10,22 @@ from jonbot.backend.ai.chatbot.components.memory.conversation_memory.conversatio
 from jonbot.backend.ai.chatbot.components.prompt.prompt_builder import (
     ChatbotPrompt,
 )
+from jonbot.backend.ai.model_registry.model_registry import get_chat_model
 from jonbot.backend.backend_database_operator.backend_database_operator import (
     BackendDatabaseOperations,
 )
 from jonbot.backend.data_layer.models.context_route import ContextRoute
 from jonbot.backend.data_layer.models.conversation_context import ConversationContextDescription
 from jonbot.backend.data_layer.models.conversation_models import ChatRequestConfig, ChatRequest
-from jonbot.frontends.discord_bot.handlers.discord_message_responder import (
-    STOP_STREAMING_TOKEN,
-)
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 # langchain.debug = True
 
 logger = get_jonbot_logger()
 
+AVAILABLE_MODEL_NAMES = ["gpt-4-1106-preview", "gpt-4", "gpt-3.5-turbo-16k"]
+CHATBOT_BASE_SIZE_BYTES = 64 * 1024  # rough footprint of the models, prompt, and chain objects held by each Chatbot
+
 
 class Chatbot:
     memory: ChatbotConversationMemory
@@ -51,6 +49,7 @@ class Chatbot:
         self.conversation_context_description = conversation_context_description
         self.human_user_id = human_user_id
         self.config = config
+        self._config_fingerprint: Optional[str] = None
         self.tags = [self.frontend_bot_nickname,
                      f"user: {self.human_user_id}",
                      *[f"{key} : {value}" for key, value in self.context_route.as_flat_dict.items()],
@@ -60,16 +59,6 @@ class Chatbot:
             database_name=database_name,
             context_route=self.context_route,
         )
-        self._available_models = {"gpt-4-1106-preview": ChatOpenAI(temperature=config.temperature,
-                                                                   model_name="gpt-4-1106-preview",
-                                                                   verbose=True),
-                                  "gpt-4": ChatOpenAI(temperature=config.temperature,
-                                                      model_name="gpt-4",
-                                                      verbose=True),
-                                  "gpt-3.5-turbo-16k": ChatOpenAI(temperature=config.temperature,
-                                                                  model_name="gpt-3.5-turbo-16k",
-                                                                  verbose=True),
-                                  }
 
     @classmethod
     async def from_context_route(
@@ -107,6 +96,26 @@ class Chatbot:
             chat_request_config=chat_request.config,
         )
 
+    @property
+    def estimated_size_bytes(self) -> int:
+        size = CHATBOT_BASE_SIZE_BYTES
+        size += len(self.conversation_context_description.text.encode("utf-8"))
+        if self.config is not None and self.config.config_prompts:
+            size += len(self.config.config_prompts.encode("utf-8"))
+        for message in self.memory.chat_memory.messages:
+            size += len(str(message.content).encode("utf-8"))
+        return size
+
+    async def flush_memory(self):
+        logger.debug(f"Flushing memory for chatbot with context route: {self.context_route.as_flat_dict}")
+        await self.memory.flush()
+
+    @staticmethod
+    def _get_model(model_name: str, temperature: float) -> BaseChatModel:
+        if model_name not in AVAILABLE_MODEL_NAMES:
+            raise ValueError(f"Model `{model_name}` is not available - must be one of: {AVAILABLE_MODEL_NAMES}")
+        return get_chat_model(model_name=model_name, temperature=temperature)
+
     def _build_chain(self) -> RunnableSequence:
         return (
                 RunnableMap(
@@ -124,6 +133,11 @@ class Chatbot:
         )
 
     async def apply_config_and_build_chain(self, config: ChatRequestConfig):
+        config_fingerprint = config.fingerprint
+        if config_fingerprint == self._config_fingerprint:
+            logger.debug(f"Config unchanged (fingerprint: {config_fingerprint}) - reusing existing chain and memory")
+            return
+
         logger.debug(f"Applying config: {config} to chatbot chain...")
         if self.memory is None:
             logger.error(f"Memory not configured!")
@@ -132,14 +146,10 @@ class Chatbot:
         fallbacks = []
 
         if config.model_name == "gpt-4-1106-preview":
-            fallbacks.append(self._available_models["gpt-4"])
-        fallbacks.append(self._available_models["gpt-3.5-turbo-16k"])
+            fallbacks.append(self._get_model(model_name="gpt-4", temperature=config.temperature))
+        fallbacks.append(self._get_model(model_name="gpt-3.5-turbo-16k", temperature=config.temperature))
 
-        self.model = self._available_models[config.model_name]
-
-        if config.temperature != self.model.temperature:
-            self.model.temperature = config.temperature
-            fallbacks = [model for model in fallbacks if model.temperature == config.temperature]
+        self.model = self._get_model(model_name=config.model_name, temperature=config.temperature)
 
         self.model.with_fallbacks(fallbacks)
 
@@ -152,6 +162,8 @@ class Chatbot:
         await self.memory.set_memory_messages(config.memory_messages)
 
         self.chain = self._build_chain()
+        self.config = config
+        self._config_fingerprint = config_fingerprint
 
     async def execute(
             self,
@@ -169,7 +181,6 @@ class Chatbot:
                 logger.trace(f"Yielding token: {repr(token.content)}")
                 response_message += token.content
                 yield token.content
-            yield STOP_STREAMING_TOKEN
 
             logger.debug(f"Successfully executed chain! - Saving context to memory...")
 
@@ -182,15 +193,6 @@ class Chatbot:
 
         except Exception as e:
             logger.exception(e)
-
-            # Extracting traceback details
-            tb = traceback.extract_tb(e.__traceback__)
-            file_name, line_number, func_name, text = tb[-1]  # Getting details of the last (most recent) call
-
-            class_name = self.__class__.__name__
-            current_frame = inspect.currentframe()
-            yield f"ERROR (from {class_name}.{func_name} at line {line_number}) - \n >  {str(e)}\n\n"
-            yield STOP_STREAMING_TOKEN
             raise
 
     def configure(self, config):
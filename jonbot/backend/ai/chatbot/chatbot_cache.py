@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from jonbot.backend.ai.chatbot.chatbot import Chatbot
+from jonbot.backend.data_layer.models.chatbot_cache_stats import ChatbotCacheStats
+from jonbot.system.environment_variables import (
+    CHATBOT_CACHE_MAX_CHATBOTS,
+    CHATBOT_CACHE_IDLE_TTL_SECONDS,
+    CHATBOT_CACHE_MAX_BYTES,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+
+def estimate_chatbot_size_bytes(chatbot: Chatbot) -> int:
+    return chatbot.estimated_size_bytes
+
+
+class ChatbotCache:
+    """
+    Bounded cache of `Chatbot` instances keyed by context route.
+
+    Chatbots are evicted least-recently-used first whenever `max_chatbots` or `max_bytes` is exceeded, and any chatbot
+    that has been idle for longer than `idle_ttl_seconds` is dropped on the next cache access.
+    Evicted chatbots have their context memory flushed to the database so nothing is lost.
+    `get_or_create` builds each missing chatbot once, however many chats for it arrive at the same time.
+    Limits set to 0 (or None) are disabled.
+    """
+
+    def __init__(
+            self,
+            max_chatbots: Optional[int] = CHATBOT_CACHE_MAX_CHATBOTS,
+            idle_ttl_seconds: Optional[float] = CHATBOT_CACHE_IDLE_TTL_SECONDS,
+            max_bytes: Optional[int] = CHATBOT_CACHE_MAX_BYTES,
+            size_estimator: Callable[[Chatbot], int] = estimate_chatbot_size_bytes,
+    ):
+        self.max_chatbots = max_chatbots
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self._size_estimator = size_estimator
+
+        # context key -> (chatbot, last accessed `time.monotonic()`), ordered from least to most recently used
+        self._chatbots: "OrderedDict[str, Tuple[Chatbot, float]]" = OrderedDict()
+        # evictions only hold the lock to pop chatbots - their memory is flushed after it's released
+        self._lock = asyncio.Lock()
+        self._builds: Dict[str, asyncio.Task] = {}
+        self._flushes: Dict[str, asyncio.Task] = {}
+        self._stats = ChatbotCacheStats()
+
+    def __len__(self):
+        return len(self._chatbots)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._chatbots
+
+    @property
+    def stats(self) -> ChatbotCacheStats:
+        return self._stats.copy(update={"resident_chatbots": len(self._chatbots),
+                                        "resident_bytes": self.resident_bytes})
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self._size_estimator(chatbot) for chatbot, _ in self._chatbots.values())
+
+    async def get(self, key: str) -> Optional[Chatbot]:
+        async with self._lock:
+            flushes = self._start_flushes(self._pop_idle())
+            if key not in self._chatbots:
+                self._stats.misses += 1
+                chatbot = None
+            else:
+                chatbot, _ = self._chatbots.pop(key)
+                self._chatbots[key] = (chatbot, time.monotonic())
+                self._stats.hits += 1
+        await self._finish_flushes(flushes)
+        return chatbot
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[Chatbot]]) -> Chatbot:
+        """
+        The cached chatbot for `key`, or one made with `create()` - concurrent misses on the same key share one
+        `create()`, so they all talk to the same chatbot.
+        """
+        while True:
+            chatbot = await self.get(key)
+            if chatbot is not None:
+                return chatbot
+            if key in self._chatbots:
+                # it was built while we were waiting for the lock
+                continue
+            build = self._builds.get(key)
+            if build is None:
+                build = asyncio.create_task(self._build(key=key, create=create))
+                self._builds[key] = build
+            return await asyncio.shield(build)
+
+    async def put(self, key: str, chatbot: Chatbot):
+        async with self._lock:
+            self._chatbots.pop(key, None)
+            self._chatbots[key] = (chatbot, time.monotonic())
+            flushes = self._start_flushes(self._pop_idle() + self._pop_over_budget())
+        await self._finish_flushes(flushes)
+
+    async def clear(self):
+        async with self._lock:
+            evicted = [(key, chatbot) for key, (chatbot, _) in self._chatbots.items()]
+            self._chatbots.clear()
+            flushes = self._start_flushes(evicted)
+        await self._finish_flushes(flushes)
+
+    async def _build(self, key: str, create: Callable[[], Awaitable[Chatbot]]) -> Chatbot:
+        try:
+            flush = self._flushes.get(key)
+            if flush is not None:
+                # an evicted chatbot for this key is still saving its memory - load it once that's done
+                await asyncio.gather(flush, return_exceptions=True)
+            chatbot = await create()
+            await self.put(key, chatbot)
+            return chatbot
+        finally:
+            self._builds.pop(key, None)
+
+    def _pop_idle(self) -> List[Tuple[str, Chatbot]]:
+        if not self.idle_ttl_seconds:
+            return []
+        now = time.monotonic()
+        evicted = []
+        for key, (chatbot, last_accessed) in list(self._chatbots.items()):
+            if now - last_accessed > self.idle_ttl_seconds:
+                del self._chatbots[key]
+                evicted.append((key, chatbot))
+        self._stats.idle_ttl_evictions += len(evicted)
+        return evicted
+
+    def _pop_over_budget(self) -> List[Tuple[str, Chatbot]]:
+        evicted = []
+        while len(self._chatbots) > 1 and self._over_budget():
+            key, (chatbot, _) = self._chatbots.popitem(last=False)
+            evicted.append((key, chatbot))
+        self._stats.lru_evictions += len(evicted)
+        return evicted
+
+    def _over_budget(self) -> bool:
+        if self.max_chatbots and len(self._chatbots) > self.max_chatbots:
+            return True
+        if self.max_bytes and self.resident_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _start_flushes(self, evicted: List[Tuple[str, Chatbot]]) -> List[Tuple[str, asyncio.Task]]:
+        # started under the lock (so a rebuild of the same key can wait for it), awaited after it's released
+        if not evicted:
+            return []
+        self._stats.evictions += len(evicted)
+        logger.debug(f"Evicting {len(evicted)} chatbot(s) from cache: {[key for key, _ in evicted]}")
+        flushes = []
+        for key, chatbot in evicted:
+            flush = asyncio.create_task(chatbot.flush_memory())
+            self._flushes[key] = flush
+            flushes.append((key, flush))
+        return flushes
+
+    async def _finish_flushes(self, flushes: List[Tuple[str, asyncio.Task]]):
+        if not flushes:
+            return
+        results = await asyncio.gather(*[flush for _, flush in flushes], return_exceptions=True)
+        for (key, flush), result in zip(flushes, results):
+            if self._flushes.get(key) is flush:
+                del self._flushes[key]
+            if isinstance(result, Exception):
+                logger.error(f"Failed to flush memory for evicted chatbot: {key} - {result}")
@@ -70,13 +70,19 @@ class ContextMemoryHandler(BaseModel):
             f"Upserting context memory for context route: {self.context_route.dict()}"
         )
         try:
-            await self.database_operations.upsert_context_memory(
-                await self._upsert_request
-            )
+            upsert_request = await self._upsert_request
+            await self.database_operations.upsert_context_memory(upsert_request)
+            self.current_context_memory_document.version = upsert_request.data.version
         except Exception as e:
             logger.exception(e)
             raise
 
+    async def flush(self):
+        if self.current_context_memory_document is None:
+            logger.trace(f"Nothing to flush for context route: {self.context_route.dict()}")
+            return
+        await self._upsert_context_memory()
+
     async def update(self,
                      chat_memory_message_buffer: ChatMemoryMessageBuffer = None,
                      # summary: str = None,
@@ -1,11 +1,13 @@
 from typing import List, Union, Any, Dict
 
 from langchain.memory import ConversationTokenBufferMemory
-from langchain.schema import HumanMessage, AIMessage
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema import BaseMessage, HumanMessage, AIMessage
 
 from jonbot.backend.ai.chatbot.components.memory.conversation_memory.context_memory_handler import (
     ContextMemoryHandler,
 )
+from jonbot.backend.ai.utilities.token_counter import REPLY_PRIMING_TOKENS, count_message_tokens
 from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
 from jonbot.backend.data_layer.models.user_stuff.memory.chat_memory_message_buffer import ChatMemoryMessageBuffer
 from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
@@ -23,6 +25,8 @@ from jonbot.backend.data_layer.models.context_route import ContextRoute
 # class ChatbotConversationMemory(ConversationSummaryBufferMemory):
 class ChatbotConversationMemory(ConversationTokenBufferMemory):
     context_memory_handler: ContextMemoryHandler
+    # tokens in `chat_memory.messages` - kept up to date as messages are added and pruned, rather than re-counted
+    buffer_token_count: int = 0
 
     def __init__(
             self,
@@ -61,9 +65,22 @@ class ChatbotConversationMemory(ConversationTokenBufferMemory):
 
     @property
     def token_count(self) -> int:
-        tokens_in_messages = self.llm.get_num_tokens_from_messages(self.buffer)
         # tokens_in_summary = self.llm.get_num_tokens(self.moving_summary_buffer)
-        return tokens_in_messages  # + tokens_in_summary
+        return self.buffer_token_count + REPLY_PRIMING_TOKENS  # + tokens_in_summary
+
+    def _count_tokens(self, message: BaseMessage) -> int:
+        return count_message_tokens(message, model=self.llm.model_name)
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """Save context from this conversation to buffer, pruning the oldest messages past `max_token_limit`"""
+        number_of_messages = len(self.chat_memory.messages)
+        # skip `ConversationTokenBufferMemory.save_context`, which re-tokenises the whole buffer for every pruned message
+        BaseChatMemory.save_context(self, inputs, outputs)
+        buffer = self.chat_memory.messages
+        for message in buffer[number_of_messages:]:
+            self.buffer_token_count += self._count_tokens(message)
+        while buffer and self.token_count > self.max_token_limit:
+            self.buffer_token_count -= self._count_tokens(buffer.pop(0))
 
     def _build_memory_from_context_memory_document(
             self, document: ContextMemoryDocument
@@ -97,6 +114,7 @@ class ChatbotConversationMemory(ConversationTokenBufferMemory):
                         )
                     messages.append(AIMessage(**message.dict()))
             self.chat_memory.messages = messages
+            self.buffer_token_count = sum(self._count_tokens(message) for message in messages)
         except Exception as e:
             logger.exception(e)
             raise
@@ -124,6 +142,9 @@ class ChatbotConversationMemory(ConversationTokenBufferMemory):
             logger.exception(e)
             raise
 
+    async def flush(self):
+        await self.context_memory_handler.flush()
+
     async def set_memory_messages(self, memory_messages: List[DiscordMessageDocument]):
         chat_history_message_buffer = ChatMemoryMessageBuffer.from_discord_message_documents(
             discord_message_documents=memory_messages)
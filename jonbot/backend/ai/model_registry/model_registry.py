@@ -0,0 +1,70 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from langchain.chat_models import ChatOpenAI
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+ChatModelKey = Tuple[str, float, Optional[int]]
+
+
+class SharedChatOpenAI(ChatOpenAI):
+    """A `ChatOpenAI` that can't be mutated after creation, so it is safe to share between chatbots"""
+
+    class Config:
+        allow_mutation = False
+
+
+class ChatModelRegistry:
+    """
+    Process-wide registry of chat models keyed by (model_name, temperature, max_tokens).
+
+    Every chatbot asking for the same key gets the same model instance (and so the same underlying OpenAI client and
+    connection pool), so creating a chatbot is cheap and open sockets don't grow with the number of chats.
+    """
+
+    def __init__(self):
+        self._models: Dict[ChatModelKey, SharedChatOpenAI] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._models)
+
+    def get(self,
+            model_name: str,
+            temperature: float,
+            max_tokens: Optional[int] = None) -> SharedChatOpenAI:
+        key = (model_name, float(temperature), max_tokens)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if key not in self._models:
+                logger.debug(f"Creating shared chat model for key: {key}")
+                self._models[key] = SharedChatOpenAI(model_name=model_name,
+                                                     temperature=temperature,
+                                                     max_tokens=max_tokens,
+                                                     verbose=True)
+            return self._models[key]
+
+
+CHAT_MODEL_REGISTRY = None
+
+
+def get_or_create_chat_model_registry() -> ChatModelRegistry:
+    global CHAT_MODEL_REGISTRY
+    if CHAT_MODEL_REGISTRY is None:
+        logger.info("Creating ChatModelRegistry...")
+        CHAT_MODEL_REGISTRY = ChatModelRegistry()
+    return CHAT_MODEL_REGISTRY
+
+
+def get_chat_model(model_name: str,
+                   temperature: float,
+                   max_tokens: Optional[int] = None) -> SharedChatOpenAI:
+    return get_or_create_chat_model_registry().get(model_name=model_name,
+                                                   temperature=temperature,
+                                                   max_tokens=max_tokens)
@@ -1,8 +1,8 @@
-import tiktoken
+from jonbot.backend.ai.utilities.token_counter import get_encoding_for_model
 
 
 def get_number_of_tokens_from_string(string: str, model: str) -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.encoding_for_model(model)
+    encoding = get_encoding_for_model(model)
     num_tokens = len(encoding.encode(string))
     return num_tokens
@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+import tiktoken
+from langchain.adapters.openai import convert_message_to_dict
+from langchain.schema import BaseMessage
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+FALLBACK_ENCODING_NAME = "cl100k_base"
+REPLY_PRIMING_TOKENS = 3  # every reply is primed with <im_start>assistant
+TOKEN_COUNT_KEY = "token_count"
+TOKEN_COUNT_MODEL_KEY = "token_count_model"
+
+
+@lru_cache(maxsize=None)
+def get_encoding_for_model(model: str) -> tiktoken.Encoding:
+    """`tiktoken.encoding_for_model`, looked up once per model"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning(f"No tiktoken encoding for model `{model}` - using {FALLBACK_ENCODING_NAME}")
+        return tiktoken.get_encoding(FALLBACK_ENCODING_NAME)
+
+
+@lru_cache(maxsize=None)
+def _chat_message_overheads(model: str) -> Tuple[int, int]:
+    # (tokens per message, tokens per name) - the same accounting as `ChatOpenAI.get_num_tokens_from_messages`
+    if model in ["gpt-3.5-turbo", "gpt-3.5-turbo-0301"]:
+        return 4, -1
+    return 3, 1
+
+
+def count_message_tokens(message: BaseMessage, model: str) -> int:
+    """
+    Tokens `message` takes up in a chat prompt for `model`. The count is cached in the message's `additional_kwargs`
+    (messages are never edited once they're in a memory buffer), so each message is only tokenised once - and the
+    count is saved to the database along with it.
+    """
+    additional_kwargs = message.additional_kwargs
+    if additional_kwargs.get(TOKEN_COUNT_MODEL_KEY) == model and TOKEN_COUNT_KEY in additional_kwargs:
+        return additional_kwargs[TOKEN_COUNT_KEY]
+
+    encoding = get_encoding_for_model(model)
+    tokens_per_message, tokens_per_name = _chat_message_overheads(model)
+    token_count = tokens_per_message
+    for key, value in convert_message_to_dict(message).items():
+        token_count += len(encoding.encode(str(value)))
+        if key == "name":
+            token_count += tokens_per_name
+
+    additional_kwargs[TOKEN_COUNT_KEY] = token_count
+    additional_kwargs[TOKEN_COUNT_MODEL_KEY] = model
+    return token_count
+
+
+def count_messages_tokens(messages: List[BaseMessage], model: str) -> int:
+    return sum(count_message_tokens(message, model) for message in messages) + REPLY_PRIMING_TOKENS
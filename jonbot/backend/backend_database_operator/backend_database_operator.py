@@ -1,8 +1,13 @@
-from typing import Optional
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
+from jonbot.backend.data_layer.database.context_memory_cache import ContextMemoryCache
 from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.database.upsert_buffer import UpsertBuffer
+from jonbot.backend.data_layer.models.context_memory_cache_stats import ContextMemoryCacheStats
 from jonbot.backend.data_layer.models.database_request_response_models import (
     UpsertResponse,
     MessageHistoryRequest,
@@ -10,7 +15,15 @@ from jonbot.backend.data_layer.models.database_request_response_models import (
     UpsertDiscordMessagesRequest,
     ContextMemoryDocumentResponse,
     MessageHistoryResponse, UpsertDiscordChatsRequest,
+    ScrapeCheckpointsRequest,
+    ScrapeCheckpointsResponse,
+    UpsertScrapeCheckpointRequest,
+    UpsertMessageReactionsRequest,
+    MessageReactionsRequest,
+    MessageReactionsResponse,
 )
+from jonbot.backend.data_layer.models.upsert_buffer_stats import UpsertBufferStats
+from jonbot.system.environment_variables import RAW_MESSAGES_COLLECTION_NAME, CONTEXT_ROUTES_COLLECTION_NAME
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
@@ -18,10 +31,26 @@ logger = get_jonbot_logger()
 
 class BackendDatabaseOperations(BaseModel):
     mongo_database: MongoDatabaseManager
+    upsert_buffer: Optional[UpsertBuffer] = None
+    context_memory_cache: Optional[ContextMemoryCache] = None
+    # (database name, route id) -> (lock, number of writes holding or waiting for it)
+    _context_memory_write_locks: Dict[Tuple[str, str], Tuple[asyncio.Lock, int]] = PrivateAttr(default_factory=dict)
 
     class Config:
         arbitrary_types_allowed = True
 
+    @property
+    def upsert_buffer_stats(self) -> UpsertBufferStats:
+        if self.upsert_buffer is None:
+            return UpsertBufferStats()
+        return self.upsert_buffer.stats
+
+    @property
+    def context_memory_cache_stats(self) -> ContextMemoryCacheStats:
+        if self.context_memory_cache is None:
+            return ContextMemoryCacheStats()
+        return self.context_memory_cache.stats
+
     async def upsert_discord_chats(
             self, request: UpsertDiscordChatsRequest
     ) -> UpsertResponse:
@@ -47,12 +76,57 @@ class BackendDatabaseOperations(BaseModel):
             f"Upserting {len(request.data)} messages to database: {request.database_name}"
         )
 
+        if self.upsert_buffer is not None:
+            queued = await self.upsert_buffer.enqueue(database_name=request.database_name,
+                                                      collection_name=CONTEXT_ROUTES_COLLECTION_NAME,
+                                                      entries=self.mongo_database.build_context_route_entries(request))
+            queued = queued and await self.upsert_buffer.enqueue(
+                database_name=request.database_name,
+                collection_name=RAW_MESSAGES_COLLECTION_NAME,
+                entries=self.mongo_database.build_discord_message_entries(request))
+            if not queued:
+                # let the client back off (the scraper stops, without saving a checkpoint past these messages)
+                logger.error(f"Upsert buffer is full - not upserting {len(request.data)} messages to database: "
+                             f"{request.database_name}")
+            return UpsertResponse(success=queued)
+
         success = await self.mongo_database.upsert_discord_messages(request=request)
         if success:
             return UpsertResponse(success=True)
         else:
             return UpsertResponse(success=False)
 
+    async def upsert_scrape_checkpoint(self, request: UpsertScrapeCheckpointRequest) -> UpsertResponse:
+        if self.upsert_buffer is not None:
+            # the checkpoint must never get ahead of the messages it vouches for
+            if not await self.upsert_buffer.flush():
+                logger.error(f"Not saving scrape checkpoint - buffered messages couldn't be written: "
+                             f"{request.data.dict()}")
+                return UpsertResponse(success=False)
+
+        success = await self.mongo_database.upsert_scrape_checkpoint(request=request)
+        if not success:
+            logger.error(f"Error occurred while upserting scrape checkpoint: {request.data.dict()}")
+        return UpsertResponse(success=success)
+
+    async def get_scrape_checkpoints(self, request: ScrapeCheckpointsRequest) -> ScrapeCheckpointsResponse:
+        checkpoints = await self.mongo_database.get_scrape_checkpoints(request=request)
+        logger.info(f"Loaded {len(checkpoints)} scrape checkpoints for server: {request.server_id}")
+        return ScrapeCheckpointsResponse(success=True, data=checkpoints)
+
+    async def upsert_message_reactions(self, request: UpsertMessageReactionsRequest) -> UpsertResponse:
+        if request.backfilled_channel_id is not None:
+            logger.info(f"Backfilling reaction index for channel: {request.backfilled_channel_id} "
+                        f"({len(request.data)} reactions)")
+        success = await self.mongo_database.upsert_message_reactions(request=request)
+        if not success:
+            logger.error(f"Error occurred while upserting {len(request.data)} message reactions")
+        return UpsertResponse(success=success)
+
+    async def get_message_reactions(self, request: MessageReactionsRequest) -> MessageReactionsResponse:
+        backfilled, message_ids = await self.mongo_database.get_message_reactions(request=request)
+        return MessageReactionsResponse(success=True, backfilled=backfilled, message_ids=message_ids)
+
     async def get_message_history_document(
             self, request: MessageHistoryRequest
     ) -> MessageHistoryResponse:
@@ -77,6 +151,13 @@ class BackendDatabaseOperations(BaseModel):
                 "get_context_memory_document should not be called with request type: upsert"
             )
 
+        if self.context_memory_cache is not None:
+            document = self.context_memory_cache.get(database_name=request.database_name,
+                                                     context_route=request.data.context_route)
+            if document is not None:
+                logger.trace(f"Serving context memory from cache for context route: {request.query}")
+                return ContextMemoryDocumentResponse(success=True, data=document)
+
         logger.info(
             f"Retrieving context memory for context route: {request.data.context_route.as_flat_dict}"
         )
@@ -87,15 +168,24 @@ class BackendDatabaseOperations(BaseModel):
             )
             return ContextMemoryDocumentResponse(success=False)
 
+        if self.context_memory_cache is not None:
+            self.context_memory_cache.put(database_name=request.database_name, document=document, new_version=False)
         return ContextMemoryDocumentResponse(success=True, data=document)
 
     async def upsert_context_memory(self, request: ContextMemoryDocumentRequest):
         logger.info(
             f"Updating context memory for context route: {request.data.context_route.dict()}"
         )
-        success = await self.mongo_database.upsert_context_memory(
-            request=request,
-        )
+        # one write per route at a time, so the database gets the versions in the order the cache handed them out
+        async with self._context_memory_write_lock(database_name=request.database_name,
+                                                   route_id=request.data.context_route.route_id):
+            if self.context_memory_cache is not None:
+                # write-through - cache first, so reads that race the database write already see this version
+                request.data.version = self.context_memory_cache.put(database_name=request.database_name,
+                                                                     document=request.data)
+            success = await self.mongo_database.upsert_context_memory(
+                request=request,
+            )
         if success:
             logger.success(
                 f"Successfully updated context memory for context route: {request.data.context_route.dict()}"
@@ -104,8 +194,32 @@ class BackendDatabaseOperations(BaseModel):
             logger.error(
                 f"Error occurred while updating context memory for context route: {request.data.context_route.dict()}"
             )
+            if self.context_memory_cache is not None:
+                # don't keep serving a version the database never got (unless a newer write already replaced it)
+                self.context_memory_cache.invalidate(database_name=request.database_name,
+                                                     context_route=request.data.context_route,
+                                                     version=request.data.version)
+
+    @asynccontextmanager
+    async def _context_memory_write_lock(self, database_name: str, route_id: str):
+        key = (database_name, route_id)
+        lock, writers = self._context_memory_write_locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._context_memory_write_locks[key] = (lock, writers + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, writers = self._context_memory_write_locks[key]
+            if writers == 1:
+                del self._context_memory_write_locks[key]
+            else:
+                self._context_memory_write_locks[key] = (lock, writers - 1)
 
     async def close(self):
+        if self.upsert_buffer is not None:
+            await self.upsert_buffer.close()
         logger.info("Closing database connection...")
         await self.mongo_database.close()
         logger.info("Database connection closed!")
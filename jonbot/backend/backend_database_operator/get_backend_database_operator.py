@@ -1,7 +1,9 @@
 from jonbot.backend.backend_database_operator.backend_database_operator import (
     BackendDatabaseOperations,
 )
+from jonbot.backend.data_layer.database.context_memory_cache import ContextMemoryCache
 from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.database.upsert_buffer import UpsertBuffer
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
@@ -16,6 +18,8 @@ def get_backend_database_operator(
     if BACKEND_DATABASE_OPERATOR is None:
         logger.info("Creating BackendDatabaseOperator")
         BACKEND_DATABASE_OPERATOR = BackendDatabaseOperations(
-            mongo_database=mongo_database
+            mongo_database=mongo_database,
+            upsert_buffer=UpsertBuffer(mongo_database=mongo_database),
+            context_memory_cache=ContextMemoryCache(),
         )
     return BACKEND_DATABASE_OPERATOR
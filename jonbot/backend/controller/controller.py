@@ -1,19 +1,19 @@
-from typing import AsyncIterable, Dict
+from typing import AsyncIterable
 
-from langchain.chat_models import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
 
 from jonbot.backend.ai.audio_transcription.transcribe_audio import transcribe_audio
-from jonbot.backend.ai.chatbot.chatbot import (
-    Chatbot,
-)
+from jonbot.backend.ai.chatbot.chatbot_cache import ChatbotCache
 from jonbot.backend.ai.chatbot.get_chatbot import (
     get_chatbot,
 )
+from jonbot.backend.ai.model_registry.model_registry import get_chat_model
 from jonbot.backend.backend_database_operator.backend_database_operator import (
     BackendDatabaseOperations,
 )
+from jonbot.backend.data_layer.models.chatbot_cache_stats import ChatbotCacheStats
 from jonbot.backend.data_layer.models.conversation_models import ChatRequest, ImageChatRequest
+from jonbot.backend.data_layer.models.database_request_response_models import ContextMemoryDocumentRequest
 from jonbot.backend.data_layer.models.voice_to_text_request import VoiceToTextRequest, VoiceToTextResponse
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
@@ -21,9 +21,15 @@ logger = get_jonbot_logger()
 
 
 class Controller:
-    def __init__(self, database_operations: BackendDatabaseOperations):
+    def __init__(self,
+                 database_operations: BackendDatabaseOperations,
+                 chatbot_cache: ChatbotCache = None):
         self.database_operations = database_operations
-        self.chatbots: Dict[str, Chatbot] = {}
+        self.chatbot_cache = chatbot_cache if chatbot_cache is not None else ChatbotCache()
+
+    @property
+    def chatbot_cache_stats(self) -> ChatbotCacheStats:
+        return self.chatbot_cache.stats
 
     @staticmethod
     async def transcribe_audio(
@@ -40,7 +46,7 @@ class Controller:
         logger.info(f"Received chat stream request: {chat_request}")
         chatbot = await get_chatbot(
             chat_request=chat_request,
-            existing_chatbots=self.chatbots,
+            chatbot_cache=self.chatbot_cache,
             database_operations=self.database_operations,
         )
 
@@ -55,13 +61,24 @@ class Controller:
 
         logger.info(f"Chat stream request complete: {chat_request}")
 
+    async def get_memory_update(self, chat_request: ChatRequest) -> dict:
+        """The ids of the messages in the chat's context memory once it's done - sent inline in the stream's `done`
+        event (the chatbot just wrote the memory, so this is served from the context memory cache)"""
+        response = await self.database_operations.get_context_memory_document(
+            request=ContextMemoryDocumentRequest.build_get_request(context_route=chat_request.context_route,
+                                                                   database_name=chat_request.database_name)
+        )
+        if not response.success:
+            return {}
+        return {"memory_message_ids": response.data.memory_message_ids,
+                "memory_version": response.data.version}
+
     async def analyze_image(self, image_chat_request: ImageChatRequest) -> AIMessage:
         logger.info(f"Received image analysis request: {image_chat_request}")
 
-        chat = ChatOpenAI(model="gpt-4-vision-preview",
-                          max_tokens=1000,
-                          temperature=image_chat_request.config.temperature,
-                          verbose=True)
+        chat = get_chat_model(model_name=image_chat_request.model_name,
+                              max_tokens=1000,
+                              temperature=image_chat_request.config.temperature)
         response = await chat.ainvoke(
             [
                 HumanMessage(
@@ -81,5 +98,7 @@ class Controller:
         logger.info(f"Image analysis request complete, response: {response}")
         return response
 
-
-
+    async def close(self):
+        logger.info("Flushing cached chatbots...")
+        await self.chatbot_cache.clear()
+        logger.info("Cached chatbots flushed!")
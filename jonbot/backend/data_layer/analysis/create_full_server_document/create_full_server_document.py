@@ -7,7 +7,7 @@ from langchain.chat_models import ChatOpenAI
 from langchain.vectorstores.chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 
-from jonbot.backend.data_layer.analysis.get_chats import get_chats
+from jonbot.backend.data_layer.analysis.get_chats import get_chats, CHAT_MESSAGE_DUMP_FIELDS
 from jonbot.backend.data_layer.models.discord_stuff.discord_chat_document import DiscordChatDocument
 from jonbot.backend.data_layer.vector_embeddings.create_vector_store import get_or_create_vectorstore
 
@@ -241,7 +241,8 @@ if __name__ == "__main__":
                                                          database_name=database_name_in
                                                          ))
     chats_out = asyncio.run(get_chats(database_name=database_name_in,
-                                      query={"server_id": server_id_outer}))
+                                      query={"server_id": server_id_outer},
+                                      exclude_fields=CHAT_MESSAGE_DUMP_FIELDS))
     chat_documents = {key: DiscordChatDocument.from_dict(chat_dict) for key, chat_dict in chats_out.items()}
 
     save_directory_outer = Path(
@@ -7,6 +7,7 @@ from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.text_splitter import CharacterTextSplitter
 
+from jonbot.backend.data_layer.analysis.student_interest_prompt_cache import build_student_interest_summaries
 from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
 
 
@@ -323,6 +324,9 @@ async def extract_student_interests(chats: List[Dict[str, Any]],
     with open(organized_topics_md_path, "w", encoding="utf-8") as file:
         file.write(organized_topics_str)
 
+    # the summaries the bot puts in each student's DM prompts
+    await build_student_interest_summaries(student_interests_folder=save_directory)
+
 
 if __name__ == "__main__":
     json_path = Path(
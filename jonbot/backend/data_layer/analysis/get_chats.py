@@ -1,34 +1,59 @@
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List, AsyncIterator
 
 from jonbot import logger
 from jonbot.backend.data_layer.database.get_mongo_database_manager import get_mongo_database_manager
 from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
-from jonbot.system.environment_variables import CHATS_COLLECTION_NAME
+from jonbot.system.environment_variables import CHATS_COLLECTION_NAME, MONGO_CURSOR_BATCH_SIZE
+
+# The raw `str(message)` dumps nested in every chat - pass as `exclude_fields` when the chats don't need them
+CHAT_MESSAGE_DUMP_FIELDS = ["messages.dump",
+                            "couplets.human_message.dump",
+                            "couplets.ai_message.dump"]
+
+
+async def iterate_chats(database_name: str,
+                        mongo_database_manager: MongoDatabaseManager = None,
+                        query: Dict = None,
+                        collection_name: str = CHATS_COLLECTION_NAME,
+                        fields: List[str] = None,
+                        exclude_fields: List[str] = None,
+                        batch_size: int = MONGO_CURSOR_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    if query is None:
+        query = {}
+    if fields is not None and "query" not in fields:
+        fields = [*fields, "query"]
+    if mongo_database_manager is None:
+        mongo_database_manager = await get_mongo_database_manager()
+
+    logger.info(f"Querying collection: {collection_name} in database: {database_name} with query: {query}")
+    async for chat_document in mongo_database_manager.iterate_sorted_documents(database_name=database_name,
+                                                                               collection_name=collection_name,
+                                                                               query=query,
+                                                                               fields=fields,
+                                                                               exclude_fields=exclude_fields,
+                                                                               batch_size=batch_size):
+        yield chat_document
 
 
 async def get_chats(database_name: str,
                     mongo_database_manager: MongoDatabaseManager = None,
                     query: Dict = None,
-                    collection_name: str = CHATS_COLLECTION_NAME) -> Dict[str, Dict[str, Any]]:
+                    collection_name: str = CHATS_COLLECTION_NAME,
+                    fields: List[str] = None,
+                    exclude_fields: List[str] = None) -> Dict[str, Dict[str, Any]]:
     try:
-        if query is None:
-            query = {}
-        if mongo_database_manager is None:
-            mongo_database_manager = await get_mongo_database_manager()
-
-        logger.info(f"Getting collection: {collection_name} in database: {database_name}")
-        collection = mongo_database_manager.get_collection(database_name=database_name,
-                                                           collection_name=collection_name)
-
-        logger.info(f"Querying collection: {collection_name} with query: {query}")
-        chat_documents = await collection.find(query).to_list(length=None)
         chats = {}
-        for chat_document in chat_documents:
+        async for chat_document in iterate_chats(database_name=database_name,
+                                                 mongo_database_manager=mongo_database_manager,
+                                                 query=query,
+                                                 collection_name=collection_name,
+                                                 fields=fields,
+                                                 exclude_fields=exclude_fields):
             chat_context_query = chat_document['query']
             # chats[str(chat_context_query)] = DiscordChatDocument(**chat_document)
             chats[str(chat_context_query)] = chat_document
-        logger.info(f"Found {len(chat_documents)} chat documents in  database: {database_name} with query: {query}")
+        logger.info(f"Found {len(chats)} chat documents in  database: {database_name} with query: {query}")
         return chats
     except Exception as e:
         logger.error(f"Error getting chat documents for with query: {query}")
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from langchain.chat_models import ChatOpenAI
+from langchain.prompts import ChatPromptTemplate
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+STUDENT_INTERESTS_FOLDER_PATH = Path(__file__).parent.parent / "student_interests"
+ORGANIZED_RESULTS_FOLDER_NAME = "organized_results"
+SUMMARIES_FILE_NAME = "student_interest_summaries.json"
+ORGANIZED_INTERESTS_FILE_PREFIX = "student_"
+ORGANIZED_INTERESTS_FILE_SUFFIX = "_interests_organized.md"
+
+
+def create_student_interest_summary_chain():
+    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
+    prompt = ChatPromptTemplate.from_template("Summarize this text: {text}")
+    chain = prompt | llm
+    return chain
+
+
+def get_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_organized_interests(student_interests_folder: Path) -> Dict[str, str]:
+    """Student id -> the organized topics `extract_student_interests` wrote for them"""
+    organized_results_folder = student_interests_folder / ORGANIZED_RESULTS_FOLDER_NAME
+    if not organized_results_folder.is_dir():
+        return {}
+    interests_by_student_id = {}
+    for file_path in organized_results_folder.glob(
+            f"{ORGANIZED_INTERESTS_FILE_PREFIX}*{ORGANIZED_INTERESTS_FILE_SUFFIX}"):
+        student_id = file_path.name[len(ORGANIZED_INTERESTS_FILE_PREFIX):-len(ORGANIZED_INTERESTS_FILE_SUFFIX)]
+        interests_by_student_id[student_id] = file_path.read_text(encoding="utf-8")
+    return interests_by_student_id
+
+
+def load_summaries(summaries_path: Path) -> Dict[str, Dict[str, str]]:
+    if not summaries_path.is_file():
+        return {}
+    with open(summaries_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_summaries(summaries_path: Path, summaries: Dict[str, Dict[str, str]]):
+    summaries_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(summaries_path, "w", encoding="utf-8") as file:
+        json.dump(summaries, file, indent=2)
+
+
+async def build_student_interest_summaries(student_interests_folder: Path) -> Dict[str, Dict[str, str]]:
+    """
+    Summarizes every student's organized interests into `student_interest_summaries.json` (student id ->
+    `{"content_hash", "summary"}`), next to the `organized_results` folder. Students whose interests haven't changed
+    since the last build keep their summary.
+    """
+    interests_by_student_id = read_organized_interests(student_interests_folder)
+    summaries_path = student_interests_folder / SUMMARIES_FILE_NAME
+    summaries = {student_id: summary for student_id, summary in load_summaries(summaries_path).items()
+                 if student_id in interests_by_student_id}
+
+    stale_student_ids = [student_id for student_id, interests in interests_by_student_id.items()
+                         if summaries.get(student_id, {}).get("content_hash") != get_content_hash(interests)]
+    print(f"Summarizing interests for {len(stale_student_ids)} of {len(interests_by_student_id)} students...")
+    if stale_student_ids:
+        results = await create_student_interest_summary_chain().abatch(
+            inputs=[{"text": interests_by_student_id[student_id]} for student_id in stale_student_ids])
+        for student_id, result in zip(stale_student_ids, results):
+            summaries[student_id] = {"content_hash": get_content_hash(interests_by_student_id[student_id]),
+                                     "summary": result.content}
+
+    save_summaries(summaries_path, summaries)
+    return summaries
+
+
+class StudentInterestPromptCache:
+    """
+    The summarized interests of each student, for the prompt of their DMs with the bot - loaded once, then served from
+    memory.
+
+    Summaries are built offline by `extract_student_interests` (see `build_student_interest_summaries`) and keyed by a
+    hash of the interests file they were made from, so a summary of an outdated file is never used. A student without
+    an up-to-date summary gets their organized interests as they are, while a summary is made for them in the
+    background (and saved for next time) - a DM never waits on the model.
+    """
+
+    def __init__(self, student_interests_folder: Union[str, Path] = STUDENT_INTERESTS_FOLDER_PATH):
+        self.student_interests_folder = Path(student_interests_folder)
+        self._summaries_path = self.student_interests_folder / SUMMARIES_FILE_NAME
+        self._interests_by_student_id: Dict[str, str] = {}
+        self._content_hashes_by_student_id: Dict[str, str] = {}
+        self._summaries: Dict[str, Dict[str, str]] = {}
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        self._summary_chain = None
+        self.load()
+
+    def load(self):
+        self._interests_by_student_id = read_organized_interests(self.student_interests_folder)
+        self._content_hashes_by_student_id = {student_id: get_content_hash(interests)
+                                              for student_id, interests in self._interests_by_student_id.items()}
+        self._summaries = load_summaries(self._summaries_path)
+        up_to_date = sum(self._get_summary(student_id) is not None for student_id in self._interests_by_student_id)
+        logger.info(f"Loaded interests for {len(self._interests_by_student_id)} students "
+                    f"({up_to_date} with up-to-date summaries) from {self.student_interests_folder}")
+
+    def get_interests(self, student_id: Union[int, str]) -> Optional[str]:
+        """The student's summarized interests (or their organized interests while that's being made), if they have any"""
+        student_id = str(student_id)
+        interests = self._interests_by_student_id.get(student_id)
+        if interests is None:
+            return None
+
+        summary = self._get_summary(student_id)
+        if summary is not None:
+            return summary
+        if student_id not in self._summarizing:
+            self._summarizing[student_id] = asyncio.create_task(self._summarize(student_id=student_id,
+                                                                                interests=interests))
+        return interests
+
+    def _get_summary(self, student_id: str) -> Optional[str]:
+        summary = self._summaries.get(student_id)
+        if summary is None or summary["content_hash"] != self._content_hashes_by_student_id[student_id]:
+            return None
+        return summary["summary"]
+
+    async def _summarize(self, student_id: str, interests: str):
+        try:
+            logger.debug(f"Summarizing interests for student: {student_id}")
+            if self._summary_chain is None:
+                self._summary_chain = create_student_interest_summary_chain()
+            result = await self._summary_chain.ainvoke({"text": interests})
+            self._summaries[student_id] = {"content_hash": get_content_hash(interests),
+                                           "summary": result.content}
+            await asyncio.to_thread(save_summaries, self._summaries_path, dict(self._summaries))
+        except Exception as e:
+            logger.error(f"Error summarizing interests for student: {student_id}")
+            logger.exception(e)
+        finally:
+            self._summarizing.pop(student_id, None)
+
+
+STUDENT_INTEREST_PROMPT_CACHE = None
+
+
+def get_or_create_student_interest_prompt_cache() -> StudentInterestPromptCache:
+    global STUDENT_INTEREST_PROMPT_CACHE
+    if STUDENT_INTEREST_PROMPT_CACHE is None:
+        logger.info("Creating new StudentInterestPromptCache instance")
+        STUDENT_INTEREST_PROMPT_CACHE = StudentInterestPromptCache()
+    return STUDENT_INTEREST_PROMPT_CACHE
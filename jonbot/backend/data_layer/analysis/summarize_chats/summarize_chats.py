@@ -8,10 +8,10 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.text_splitter import CharacterTextSplitter
 from magic_tree.magic_tree_dictionary import MagicTreeDictionary
 
-from jonbot.backend.data_layer.analysis.get_chats import get_chats
+from jonbot.backend.data_layer.analysis.get_chats import get_chats, CHAT_MESSAGE_DUMP_FIELDS
 from jonbot.backend.data_layer.analysis.summarize_chats.print_results_as_markdown import save_all_results_to_markdown
 from jonbot.backend.data_layer.database.get_mongo_database_manager import get_mongo_database_manager
-from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager, WriteMode
 from jonbot.system.environment_variables import CLASSBOT_SERVER_ID
 from jonbot.system.path_getters import get_default_backup_save_path
 
@@ -406,7 +406,8 @@ async def get_chats_by_index_type(mongo_database_manager: MongoDatabaseManager,
     chats_by_server_id = await get_chats(mongo_database_manager=mongo_database_manager,
                                          database_name=database_name,
                                          collection_name=collection_name,
-                                         query=query)
+                                         query=query,
+                                         exclude_fields=CHAT_MESSAGE_DUMP_FIELDS)
     print(f"Found {len(chats_by_server_id)} total chats...")
     all_category_ids = set([chat["category_id"] for chat in chats_by_server_id.values()])
     print(f"Found {len(all_category_ids)} total category ids...")
@@ -415,7 +416,8 @@ async def get_chats_by_index_type(mongo_database_manager: MongoDatabaseManager,
         chats_by_category_id[category_id] = await get_chats(mongo_database_manager=mongo_database_manager,
                                                             database_name=database_name,
                                                             collection_name=collection_name,
-                                                            query={"category_id": category_id})
+                                                            query={"category_id": category_id},
+                                                            exclude_fields=CHAT_MESSAGE_DUMP_FIELDS)
 
     all_channel_ids = set([chat["channel_id"] for chat in chats_by_server_id.values()])
     print(f"Found {len(all_channel_ids)} total channel ids...")
@@ -424,7 +426,8 @@ async def get_chats_by_index_type(mongo_database_manager: MongoDatabaseManager,
         chats_by_channel_id[channel_id] = await get_chats(mongo_database_manager=mongo_database_manager,
                                                           database_name=database_name,
                                                           collection_name=collection_name,
-                                                          query={"channel_id": channel_id})
+                                                          query={"channel_id": channel_id},
+                                                          exclude_fields=CHAT_MESSAGE_DUMP_FIELDS)
     all_owner_ids = set([chat["owner_id"] for chat in chats_by_server_id.values()])
     print(f"Found {len(all_owner_ids)} total owner ids...")
     chats_by_owner_id = {}
@@ -432,7 +435,8 @@ async def get_chats_by_index_type(mongo_database_manager: MongoDatabaseManager,
         chats_by_owner_id[owner_id] = await get_chats(mongo_database_manager=mongo_database_manager,
                                                       database_name=database_name,
                                                       collection_name=collection_name,
-                                                      query={"owner_id": owner_id})
+                                                      query={"owner_id": owner_id},
+                                                      exclude_fields=CHAT_MESSAGE_DUMP_FIELDS)
     chats_by_index_type = {
         "channel": chats_by_channel_id,
         "category": chats_by_category_id,
@@ -489,7 +493,8 @@ async def run_summary_analysis(subset_size: int = -1,
                                                         collection_name="analysis_global",
                                                         data=all_results[index_type][
                                                             f"{index_name}:{index_id}_topic_trees"],
-                                                        query={"server_id": CLASSBOT_SERVER_ID})
+                                                        query={"server_id": CLASSBOT_SERVER_ID},
+                                                        write_mode=WriteMode.FIRE_AND_FORGET)
 
                 all_results[index_type][
                     f"{index_name}:{index_id}_document"] = await generate_context_document(chats=chats)
@@ -497,7 +502,8 @@ async def run_summary_analysis(subset_size: int = -1,
                                                         collection_name="analysis_document",
                                                         data=all_results[index_type][
                                                             f"{index_name}:{index_id}_document"],
-                                                        query={"server_id": CLASSBOT_SERVER_ID})
+                                                        query={"server_id": CLASSBOT_SERVER_ID},
+                                                        write_mode=WriteMode.FIRE_AND_FORGET)
 
             save_all_results_to_markdown(all_results=all_results,
                                          directory_root=get_default_backup_save_path(
@@ -510,11 +516,13 @@ async def run_summary_analysis(subset_size: int = -1,
             await mongo_database_manager.upsert_one(database_name=database_name,
                                                     collection_name="analysis_global",
                                                     data=all_results[index_type],
-                                                    query={"server_id": CLASSBOT_SERVER_ID})
+                                                    query={"server_id": CLASSBOT_SERVER_ID},
+                                                    write_mode=WriteMode.FIRE_AND_FORGET)
         await mongo_database_manager.upsert_one(database_name=database_name,
                                                 collection_name="analysis_global",
                                                 data=all_results[index_type],
-                                                query={"server_id": CLASSBOT_SERVER_ID})
+                                                query={"server_id": CLASSBOT_SERVER_ID},
+                                                write_mode=WriteMode.FIRE_AND_FORGET)
 
         save_all_results_to_markdown(all_results=all_results,
                                      directory_root=get_default_backup_save_path(
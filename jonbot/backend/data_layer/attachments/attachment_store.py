@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import discord
+
+from jonbot.system.environment_variables import ATTACHMENTS_MAX_CONCURRENT_DOWNLOADS
+from jonbot.system.path_getters import get_attachment_store_folder_path
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+INDEX_FILE_NAME = "attachment_index.jsonl"
+
+
+class AttachmentStore:
+    """
+    Content-addressed attachment storage - each file is saved once, as `<root>/<sha[:2]>/<sha[2:4]>/<sha><suffix>`.
+
+    Discord attachment ids are immutable, so an `attachment id -> file` index (an append-only jsonl file in the
+    store root) lets re-scrapes skip attachments they've already downloaded. Identical files posted as separate
+    attachments are only written to disk once. Downloads run concurrently, at most `max_concurrent_downloads` at a time.
+    """
+
+    def __init__(self,
+                 root_folder: Union[str, Path] = None,
+                 max_concurrent_downloads: int = ATTACHMENTS_MAX_CONCURRENT_DOWNLOADS):
+        self.root_folder = Path(root_folder or get_attachment_store_folder_path())
+        self._download_semaphore = asyncio.Semaphore(max_concurrent_downloads)
+        self._index: Optional[Dict[int, str]] = None
+        self._index_lock = asyncio.Lock()
+        self._in_flight: Dict[int, asyncio.Task] = {}
+
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.content_deduplicated = 0
+        self.bytes_written = 0
+        self.failed = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"downloaded": self.downloaded,
+                "deduplicated": self.deduplicated,
+                "content_deduplicated": self.content_deduplicated,
+                "bytes_written": self.bytes_written,
+                "failed": self.failed,
+                "indexed": len(self._index or {})}
+
+    async def save_attachments(self, attachments: List[discord.Attachment]) -> List[str]:
+        """Saves (or finds) every attachment concurrently, returning the local paths of the ones that succeeded"""
+        paths = await asyncio.gather(*[self.save_attachment(attachment) for attachment in attachments])
+        return [path for path in paths if path is not None]
+
+    async def save_attachment(self, attachment: discord.Attachment) -> Optional[str]:
+        index = await self._load_index()
+        if attachment.id in index:
+            self.deduplicated += 1
+            return index[attachment.id]
+
+        # the same attachment can be requested by several messages/documents at once (e.g. a thread's raw messages
+        # and its chat document), so concurrent requests share one download
+        if attachment.id not in self._in_flight:
+            self._in_flight[attachment.id] = asyncio.create_task(self._download(attachment))
+            self._in_flight[attachment.id].add_done_callback(lambda _: self._in_flight.pop(attachment.id, None))
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(self._in_flight[attachment.id])
+
+    async def _download(self, attachment: discord.Attachment) -> Optional[str]:
+        try:
+            async with self._download_semaphore:
+                content = await attachment.read()
+            file_path = await asyncio.to_thread(self._write_content, content, Path(attachment.filename).suffix)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Failed to save attachment: {attachment.filename}. Error: {e}")
+            return None
+
+        self.downloaded += 1
+        await self._add_to_index(attachment_id=attachment.id, file_path=str(file_path))
+        return str(file_path)
+
+    def _write_content(self, content: bytes, suffix: str) -> Path:
+        content_hash = hashlib.sha256(content).hexdigest()
+        file_path = self.root_folder / content_hash[:2] / content_hash[2:4] / f"{content_hash}{suffix.lower()}"
+        if file_path.exists():
+            self.content_deduplicated += 1
+            return file_path
+
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}.tmp")
+        temporary_path.write_bytes(content)
+        os.replace(temporary_path, file_path)
+        self.bytes_written += len(content)
+        return file_path
+
+    async def _load_index(self) -> Dict[int, str]:
+        if self._index is None:
+            async with self._index_lock:
+                if self._index is None:
+                    self._index = await asyncio.to_thread(self._read_index_file)
+                    logger.debug(f"Loaded {len(self._index)} entries from attachment index: {self._index_path}")
+        return self._index
+
+    async def _add_to_index(self, attachment_id: int, file_path: str):
+        self._index[attachment_id] = file_path
+        async with self._index_lock:
+            await asyncio.to_thread(self._append_to_index_file, attachment_id, file_path)
+
+    @property
+    def _index_path(self) -> Path:
+        return self.root_folder / INDEX_FILE_NAME
+
+    def _read_index_file(self) -> Dict[int, str]:
+        index = {}
+        if not self._index_path.exists():
+            return index
+        with open(self._index_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if Path(entry["path"]).exists():
+                    index[entry["attachment_id"]] = entry["path"]
+        return index
+
+    def _append_to_index_file(self, attachment_id: int, file_path: str):
+        self.root_folder.mkdir(parents=True, exist_ok=True)
+        with open(self._index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps({"attachment_id": attachment_id, "path": file_path}) + "\n")
+
+
+ATTACHMENT_STORE = None
+
+
+def get_or_create_attachment_store() -> AttachmentStore:
+    global ATTACHMENT_STORE
+    if ATTACHMENT_STORE is None:
+        logger.info("Creating new AttachmentStore instance")
+        ATTACHMENT_STORE = AttachmentStore()
+    return ATTACHMENT_STORE
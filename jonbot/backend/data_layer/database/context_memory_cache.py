@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from jonbot.backend.data_layer.models.context_memory_cache_stats import ContextMemoryCacheStats
+from jonbot.backend.data_layer.models.context_route import ContextRoute
+from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
+from jonbot.system.environment_variables import CONTEXT_MEMORY_CACHE_MAX_DOCUMENTS
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+
+class ContextMemoryCache:
+    """
+    Write-through cache of `ContextMemoryDocument`s keyed by (database name, context route).
+
+    Every upsert goes through `put` on its way to the database, so a read after a write is served from memory instead
+    of Mongo. Each write bumps the document's `version`. Documents are stored and handed out as deep copies (the
+    memory buffer's messages get edited in place), so callers can't change the cached copy without writing it back.
+    Chats are routed to API workers by context route, so each worker's cache only ever holds the routes it owns. The
+    least recently used documents are dropped past `max_documents` (0 or None disables the limit).
+    """
+
+    def __init__(self, max_documents: Optional[int] = CONTEXT_MEMORY_CACHE_MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        # (database name, route id) -> document, ordered from least to most recently used
+        self._documents: "OrderedDict[Tuple[str, str], ContextMemoryDocument]" = OrderedDict()
+        self._stats = ContextMemoryCacheStats()
+
+    def __len__(self):
+        return len(self._documents)
+
+    @property
+    def stats(self) -> ContextMemoryCacheStats:
+        return self._stats.copy(update={"resident_documents": len(self._documents)})
+
+    @staticmethod
+    def _key(database_name: str, context_route: ContextRoute) -> Tuple[str, str]:
+        return database_name, context_route.route_id
+
+    def get(self, database_name: str, context_route: ContextRoute) -> Optional[ContextMemoryDocument]:
+        key = self._key(database_name, context_route)
+        document = self._documents.get(key)
+        if document is None:
+            self._stats.misses += 1
+            return None
+        self._documents.move_to_end(key)
+        self._stats.hits += 1
+        return document.copy(deep=True)
+
+    def put(self, database_name: str, document: ContextMemoryDocument, new_version: bool = True) -> int:
+        """
+        Caches a copy of `document` and returns its version. Writes (`new_version=True`) get the next version after
+        both the cached copy and `document`; documents just loaded from the database keep the version they were saved
+        with, and never replace a newer cached copy.
+        """
+        key = self._key(database_name, document.context_route)
+        cached = self._documents.get(key)
+        if new_version:
+            version = max(document.version, cached.version if cached is not None else 0) + 1
+            self._stats.writes += 1
+        elif cached is not None and cached.version >= document.version:
+            self._documents.move_to_end(key)
+            return cached.version
+        else:
+            version = document.version
+
+        self._documents[key] = document.copy(update={"version": version}, deep=True)
+        self._documents.move_to_end(key)
+        self._evict_lru()
+        return version
+
+    def invalidate(self, database_name: str, context_route: ContextRoute, version: Optional[int] = None):
+        """Drops the cached copy - only if it's still at `version`, when one is given"""
+        key = self._key(database_name, context_route)
+        cached = self._documents.get(key)
+        if cached is None or (version is not None and cached.version != version):
+            return
+        del self._documents[key]
+        self._stats.invalidations += 1
+
+    def _evict_lru(self):
+        if not self.max_documents:
+            return
+        while len(self._documents) > self.max_documents:
+            (database_name, route_id), _ = self._documents.popitem(last=False)
+            self._stats.evictions += 1
+            logger.trace(f"Evicted context memory for route: {route_id} in database: {database_name}")
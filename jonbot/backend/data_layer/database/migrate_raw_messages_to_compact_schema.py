@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Any
+
+import bson
+from pydantic import ValidationError
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import OperationFailure
+
+from jonbot.backend.data_layer.database.get_mongo_database_manager import get_mongo_database_manager
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.database.mongo_indexes import LEGACY_INDEX_NAMES
+from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import (
+    DiscordMessageDocument,
+    COMPACT_SCHEMA_VERSION,
+)
+from jonbot.system.environment_variables import (
+    RAW_MESSAGES_COLLECTION_NAME,
+    CONTEXT_ROUTES_COLLECTION_NAME,
+    MONGO_CURSOR_BATCH_SIZE,
+    STORE_MESSAGE_DUMPS,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+# Anything not yet in the compact format, or compact documents that still carry the old fields (re-upserted with
+# `$set` before this migration ran)
+LEGACY_MESSAGES_QUERY = {"$or": [{"schema_version": {"$ne": COMPACT_SCHEMA_VERSION}},
+                                 {"context_route": {"$exists": True}}]}
+
+
+async def migrate_raw_messages_to_compact_schema(database_name: str,
+                                                 mongo_database_manager: MongoDatabaseManager = None,
+                                                 batch_size: int = MONGO_CURSOR_BATCH_SIZE,
+                                                 keep_dumps: bool = STORE_MESSAGE_DUMPS,
+                                                 dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Rewrite every legacy `raw_messages` document in the compact format (see `DiscordMessageDocument.to_compact_document`)
+    and store each distinct context route once in the `context_routes` collection.
+
+    Documents are processed in `_id` order, one batch at a time, so the migration can be stopped and re-run safely.
+    Returns (and logs) the number of migrated documents and the bytes per message before and after.
+    """
+    if mongo_database_manager is None:
+        mongo_database_manager = await get_mongo_database_manager()
+    collection = mongo_database_manager.get_write_collection(database_name=database_name,
+                                                            collection_name=RAW_MESSAGES_COLLECTION_NAME)
+
+    report = {"migrated": 0, "failed": 0, "routes": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = None
+    while True:
+        query = LEGACY_MESSAGES_QUERY if last_id is None else {**LEGACY_MESSAGES_QUERY, "_id": {"$gt": last_id}}
+        documents_in_batch = 0
+        replacements = []
+        route_entries = {}
+        async for document in mongo_database_manager.iterate_sorted_documents(database_name=database_name,
+                                                                              collection_name=RAW_MESSAGES_COLLECTION_NAME,
+                                                                              query=query,
+                                                                              sort_field="_id",
+                                                                              sort_order=ASCENDING,
+                                                                              limit=batch_size,
+                                                                              batch_size=batch_size):
+            documents_in_batch += 1
+            last_id = document["_id"]
+            try:
+                message_document = DiscordMessageDocument(**document)
+            except ValidationError as e:
+                report["failed"] += 1
+                logger.warning(f"Skipping raw message that doesn't validate - _id: {document['_id']} - {e}")
+                continue
+
+            compact_document = message_document.to_compact_document(include_dump=keep_dumps)
+            compact_document["last_updated"] = document.get("last_updated", datetime.now())
+            report["bytes_before"] += len(bson.encode(document))
+            report["bytes_after"] += len(bson.encode({"_id": document["_id"], **compact_document}))
+
+            replacements.append(ReplaceOne({"_id": document["_id"]}, compact_document))
+            context_route = message_document.context_route
+            route_entries[context_route.route_id] = {"query": {"route_id": context_route.route_id},
+                                                     "data": context_route.as_route_document()}
+
+        if documents_in_batch == 0:
+            break
+
+        report["migrated"] += len(replacements)
+        report["routes"] += len(route_entries)
+        if replacements and not dry_run:
+            await mongo_database_manager.upsert_many(database_name=database_name,
+                                                     collection_name=CONTEXT_ROUTES_COLLECTION_NAME,
+                                                     entries=list(route_entries.values()),
+                                                     ordered=False)
+            if not await mongo_database_manager.write(lambda: collection.bulk_write(replacements, ordered=False),
+                                                      description=f"migrate {len(replacements)} raw messages"):
+                raise Exception(f"Failed to write migrated raw messages to database: {database_name}")
+        logger.info(f"Migrated {report['migrated']} raw messages so far...")
+
+    if not dry_run:
+        await _drop_legacy_indexes(collection)
+        await mongo_database_manager.create_indexes(database_name=database_name)
+
+    if report["migrated"]:
+        report["bytes_per_message_before"] = report["bytes_before"] / report["migrated"]
+        report["bytes_per_message_after"] = report["bytes_after"] / report["migrated"]
+        logger.success(f"{'[DRY RUN] ' if dry_run else ''}Migrated {report['migrated']} raw messages "
+                       f"({report['failed']} failed, {report['routes']} route upserts) in database: {database_name} - "
+                       f"{report['bytes_per_message_before']:.0f} -> {report['bytes_per_message_after']:.0f} "
+                       f"bytes per message "
+                       f"({100 * (1 - report['bytes_after'] / report['bytes_before']):.1f}% smaller)")
+    else:
+        logger.info(f"No legacy raw messages to migrate in database: {database_name}")
+    return report
+
+
+async def _drop_legacy_indexes(collection):
+    for index_name in LEGACY_INDEX_NAMES.get(RAW_MESSAGES_COLLECTION_NAME, []):
+        try:
+            await collection.drop_index(index_name)
+            logger.info(f"Dropped legacy index: {index_name}")
+        except OperationFailure:
+            pass  # never created, or already dropped
+
+
+if __name__ == "__main__":
+    database_name_in = "classbot_database"
+    asyncio.run(migrate_raw_messages_to_compact_schema(database_name=database_name_in,
+                                                       dry_run=True))
@@ -1,15 +1,22 @@
+import asyncio
+import time
 import uuid
 from datetime import datetime
-from typing import Union, List, Dict, Optional
+from enum import Enum
+from typing import Union, List, Dict, Optional, AsyncIterator, Awaitable, Callable, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import UpdateOne, DESCENDING
+from pymongo import UpdateOne, DeleteMany, ASCENDING, DESCENDING, WriteConcern
 
+from jonbot.backend.data_layer.database.mongo_indexes import create_collection_indexes, explain_lookups, \
+    MESSAGE_HISTORY_SORT_FIELD
 from jonbot.backend.data_layer.models.conversation_models import MessageHistory, ChatMessage
 from jonbot.backend.data_layer.models.database_request_response_models import UpsertDiscordMessagesRequest, \
-    ContextMemoryDocumentRequest, MessageHistoryRequest, UpsertDiscordChatsRequest
+    ContextMemoryDocumentRequest, MessageHistoryRequest, UpsertDiscordChatsRequest, ScrapeCheckpointsRequest, \
+    UpsertScrapeCheckpointRequest, UpsertMessageReactionsRequest, MessageReactionsRequest
 from jonbot.backend.data_layer.models.discord_stuff.discord_id import DiscordUserID
 from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+from jonbot.backend.data_layer.models.discord_stuff.scrape_checkpoint import ScrapeCheckpoint
 from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
 from jonbot.backend.data_layer.models.user_stuff.user_ids import UserID
 from jonbot.system.environment_variables import (
@@ -18,16 +25,52 @@ from jonbot.system.environment_variables import (
     RAW_MESSAGES_COLLECTION_NAME,
     CONTEXT_MEMORIES_COLLECTION_NAME,
     CHATS_COLLECTION_NAME,
+    CONTEXT_ROUTES_COLLECTION_NAME,
+    SCRAPE_CHECKPOINTS_COLLECTION_NAME,
+    MESSAGE_REACTIONS_COLLECTION_NAME,
+    MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME,
+    MONGO_INDEX_EXPLAIN_REPORT,
+    MONGO_INDEX_RETRY_SECONDS,
+    MONGO_INDEX_MAX_RETRY_SECONDS,
+    MONGO_CURSOR_BATCH_SIZE,
+    MONGO_WRITE_CONCERN_W,
+    MONGO_WRITE_CONCERN_JOURNAL,
 )
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
 
+SYSTEM_DATABASE_NAMES = ["admin", "config", "local"]
+
+# `ChatMessage`s never look at the raw `str(message)` dump, and it's usually the biggest field on the document
+MESSAGE_HISTORY_EXCLUDED_FIELDS = ["dump"]
+
+
+class WriteMode(str, Enum):
+    ACKNOWLEDGED = "acknowledged"  # wait for the server to confirm the write (per `write_concern`)
+    FIRE_AND_FORGET = "fire_and_forget"  # return immediately, confirm the write in the background and log failures
+
+
+def build_projection(fields: List[str] = None, exclude_fields: List[str] = None) -> Optional[Dict[str, int]]:
+    if fields and exclude_fields:
+        raise ValueError("Pass either `fields` or `exclude_fields` - Mongo can't mix inclusion and exclusion projections")
+    if fields:
+        return {field: 1 for field in fields}
+    if exclude_fields:
+        return {field: 0 for field in exclude_fields}
+    return None
+
 
 class MongoDatabaseManager:
     def __init__(self):
         logger.info(f"Initializing MongoDatabaseManager...")
         self._client = AsyncIOMotorClient(MONGO_URI)
+        self._indexed_database_names = set()
+        # database name -> (failed index builds in a row, when `ensure_indexes` may try again)
+        self._index_retries: Dict[str, Tuple[int, float]] = {}
+        self.write_concern = WriteConcern(w=MONGO_WRITE_CONCERN_W, j=MONGO_WRITE_CONCERN_JOURNAL)
+        self._background_writes = set()
+        self.background_write_errors = 0
 
     def get_database(self, database_name: str):
         return self._client[database_name]
@@ -36,40 +79,161 @@ class MongoDatabaseManager:
         database = self.get_database(database_name)
         return database[collection_name]
 
+    async def bootstrap_indexes(self, explain: bool = MONGO_INDEX_EXPLAIN_REPORT) -> Dict[str, dict]:
+        """
+        Create the indexes in `COLLECTION_INDEXES` on every (non-system) database on the server.
+        Databases created later get theirs on their first write (see `ensure_indexes`).
+        """
+        database_names = [database_name for database_name in await self._client.list_database_names()
+                          if database_name not in SYSTEM_DATABASE_NAMES]
+        logger.info(f"Bootstrapping indexes for databases: {database_names}")
+        return {database_name: await self.create_indexes(database_name=database_name, explain=explain)
+                for database_name in database_names}
+
+    async def ensure_indexes(self, database_name: str):
+        if database_name in self._indexed_database_names:
+            return
+        # this runs on every write - don't rebuild a failing database's indexes on each one
+        _, retry_at = self._index_retries.get(database_name, (0, 0.0))
+        if time.monotonic() < retry_at:
+            return
+        await self.create_indexes(database_name=database_name)
+
+    async def create_indexes(self, database_name: str, explain: bool = False) -> dict:
+        self._indexed_database_names.add(database_name)
+        database = self.get_database(database_name)
+        report = {}
+        try:
+            if explain:
+                report["explain_before"] = await explain_lookups(database)
+            report["indexes"] = await create_collection_indexes(database)
+            if explain:
+                report["explain_after"] = await explain_lookups(database)
+        except Exception as e:
+            self._indexed_database_names.discard(database_name)
+            failures, _ = self._index_retries.get(database_name, (0, 0.0))
+            retry_seconds = min(MONGO_INDEX_RETRY_SECONDS * 2 ** failures, MONGO_INDEX_MAX_RETRY_SECONDS)
+            self._index_retries[database_name] = (failures + 1, time.monotonic() + retry_seconds)
+            logger.error(f"Failed to create indexes for database: {database_name} - retrying in "
+                         f"{retry_seconds:.0f}s - {e}")
+            return report
+        self._index_retries.pop(database_name, None)
+
+        for lookup_name, after in report.get("explain_after", {}).items():
+            before = report["explain_before"].get(lookup_name, {})
+            logger.info(f"[{database_name}] `{lookup_name}` lookup - "
+                        f"before: {before.get('stages')} (docs examined: {before.get('documents_examined')}) | "
+                        f"after: {after.get('stages')} via index `{after.get('index_name')}` "
+                        f"(docs examined: {after.get('documents_examined')})")
+        logger.success(f"Indexes ensured for database: {database_name} - {report['indexes']}")
+        return report
+
+    def get_write_collection(self, database_name: str, collection_name: str):
+        return self.get_collection(database_name=database_name,
+                                   collection_name=collection_name).with_options(write_concern=self.write_concern)
+
+    async def write(self,
+                    write_function: Callable[[], Awaitable],
+                    description: str,
+                    write_mode: WriteMode = WriteMode.ACKNOWLEDGED) -> bool:
+        """
+        Run a write either acknowledged (awaited, returns whether it succeeded) or fire-and-forget (scheduled in the
+        background, failures are logged and counted in `background_write_errors`, returns True immediately).
+        """
+        if write_mode == WriteMode.FIRE_AND_FORGET:
+            task = asyncio.create_task(write_function())
+            self._background_writes.add(task)
+            task.add_done_callback(lambda done_task: self._on_background_write_done(done_task, description))
+            return True
+
+        try:
+            await write_function()
+            return True
+        except Exception as e:
+            logger.error(f"Error occurred while writing ({description}). Error: {e}")
+            return False
+
+    def _on_background_write_done(self, task: asyncio.Task, description: str):
+        self._background_writes.discard(task)
+        if task.cancelled():
+            logger.warning(f"Background write cancelled ({description})")
+        elif task.exception() is not None:
+            self.background_write_errors += 1
+            logger.error(f"Background write failed ({description}). Error: {task.exception()}")
+
+    async def drain_background_writes(self):
+        if self._background_writes:
+            logger.info(f"Waiting for {len(self._background_writes)} background writes to finish...")
+            await asyncio.gather(*self._background_writes, return_exceptions=True)
+
     async def upsert_one(self,
                          database_name: str,
                          data: dict,
                          collection_name: str,
-                         query: dict
+                         query: dict,
+                         write_mode: WriteMode = WriteMode.ACKNOWLEDGED,
                          ) -> bool:
 
-        collection = self.get_collection(database_name=database_name, collection_name=collection_name)
-        try:
-            collection.update_one(filter=query, update={"$set": data}, upsert=True)
-            return True
-        except Exception as e:
-            logger.error(f"Error occurred while upserting. Error: {e}")
-            return False
+        await self.ensure_indexes(database_name=database_name)
+        collection = self.get_write_collection(database_name=database_name, collection_name=collection_name)
+        return await self.write(lambda: collection.update_one(filter=query, update={"$set": data}, upsert=True),
+                                description=f"upsert_one into {database_name}.{collection_name}",
+                                write_mode=write_mode)
 
     async def upsert_many(
             self,
             database_name: str,
             entries: List[Dict[str, dict]],
-            collection_name: str
+            collection_name: str,
+            ordered: bool = True,
+            write_mode: WriteMode = WriteMode.ACKNOWLEDGED,
     ) -> bool:
         operations = [
             UpdateOne(entry["query"], {"$set": entry["data"]}, upsert=True)
             for entry in entries
         ]
+        await self.ensure_indexes(database_name=database_name)
+        collection = self.get_write_collection(
+            database_name=database_name, collection_name=collection_name
+        )
+        return await self.write(lambda: collection.bulk_write(operations, ordered=ordered),
+                                description=f"upsert_many ({len(operations)} entries) into "
+                                            f"{database_name}.{collection_name}",
+                                write_mode=write_mode)
+
+    async def iterate_sorted_documents(
+            self,
+            database_name: str,
+            collection_name: str,
+            query: dict,
+            sort_field: str = None,
+            limit: int = None,
+            sort_order: int = DESCENDING,
+            fields: List[str] = None,
+            exclude_fields: List[str] = None,
+            batch_size: int = MONGO_CURSOR_BATCH_SIZE,
+    ) -> AsyncIterator[dict]:
+        """
+        Stream matching documents one cursor batch at a time instead of loading the whole result set into memory.
+
+        `fields` is a whitelist (server-side projection) of the fields to return, `exclude_fields` a blacklist -
+        pass at most one of them (Mongo can't mix inclusion and exclusion projections).
+        """
         collection = self.get_collection(
             database_name=database_name, collection_name=collection_name
         )
-        try:
-            await collection.bulk_write(operations)
-            return True
-        except Exception as e:
-            logger.error(f"Error occurred while upserting. Error: {e}")
-            return False
+        cursor = collection.find(query,
+                                 projection=build_projection(fields=fields, exclude_fields=exclude_fields),
+                                 batch_size=batch_size)
+        if sort_field is not None:
+            cursor = cursor.sort(sort_field, sort_order)
+
+        # Apply the limit if specified
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        async for document in cursor:
+            yield document
 
     async def get_sorted_documents(
             self,
@@ -79,22 +243,18 @@ class MongoDatabaseManager:
             sort_field: str = None,
             limit: int = None,
             sort_order: int = DESCENDING,
+            fields: List[str] = None,
+            exclude_fields: List[str] = None,
     ) -> list:
         try:
-            collection = self.get_collection(
-                database_name=database_name, collection_name=collection_name
-            )
-            if sort_field is not None:
-                cursor = collection.find(query).sort(sort_field, sort_order)
-            else:
-                cursor = collection.find(query)
-
-            # Apply the limit if specified
-            if limit is not None:
-                cursor = cursor.limit(limit)
-
-            documents = await cursor.to_list(length=None)
-            return documents
+            return [document async for document in self.iterate_sorted_documents(database_name=database_name,
+                                                                                  collection_name=collection_name,
+                                                                                  query=query,
+                                                                                  sort_field=sort_field,
+                                                                                  limit=limit,
+                                                                                  sort_order=sort_order,
+                                                                                  fields=fields,
+                                                                                  exclude_fields=exclude_fields)]
         except Exception as e:
             logger.error(
                 f"Error occurred while fetching and sorting documents. Error: {e}"
@@ -118,21 +278,41 @@ class MongoDatabaseManager:
             collection_name=collection_name,
         )
 
-    async def upsert_discord_messages(
-            self, request: UpsertDiscordMessagesRequest
-    ) -> bool:
-
+    @staticmethod
+    def build_discord_message_entries(request: UpsertDiscordMessagesRequest) -> List[Dict[str, dict]]:
         entries = []
         for document, query in zip(request.data, request.query):
-            data = document.dict()
+            data = document.to_compact_document()
             data["last_updated"] = datetime.now()
             entries.append({"data": data, "query": query})
+        return entries
 
-        return await self.upsert_many(
+    @staticmethod
+    def build_context_route_entries(request: UpsertDiscordMessagesRequest) -> List[Dict[str, dict]]:
+        route_documents = {document.context_route.route_id: document.context_route.as_route_document()
+                           for document in request.data}
+        return [{"data": {**route_document, "last_updated": datetime.now()},
+                 "query": {"route_id": route_id}}
+                for route_id, route_document in route_documents.items()]
+
+    async def upsert_discord_messages(
+            self, request: UpsertDiscordMessagesRequest
+    ) -> bool:
+
+        entries = self.build_discord_message_entries(request=request)
+        route_entries = self.build_context_route_entries(request=request)
+
+        routes_success = await self.upsert_many(
+            database_name=request.database_name,
+            entries=route_entries,
+            collection_name=CONTEXT_ROUTES_COLLECTION_NAME,
+        )
+        messages_success = await self.upsert_many(
             database_name=request.database_name,
             entries=entries,
             collection_name=RAW_MESSAGES_COLLECTION_NAME,
         )
+        return routes_success and messages_success
 
     async def upsert_context_memory(
             self, request: ContextMemoryDocumentRequest
@@ -150,24 +330,90 @@ class MongoDatabaseManager:
     async def get_message_history(
             self, request: MessageHistoryRequest
     ) -> MessageHistory:
-        documents = await self.get_sorted_documents(
+        documents = self.iterate_sorted_documents(
             database_name=request.database_name,
             collection_name=RAW_MESSAGES_COLLECTION_NAME,
             query=request.query,
-            sort_field="timestamp.unix_timestamp_utc",
+            sort_field=MESSAGE_HISTORY_SORT_FIELD,
             limit=request.limit_messages,
             sort_order=DESCENDING,
+            exclude_fields=MESSAGE_HISTORY_EXCLUDED_FIELDS,
         )
 
         message_history = MessageHistory()
-        for document in documents:
-            discord_message_document = DiscordMessageDocument(**document)
+        async for document in documents:
+            discord_message_document = DiscordMessageDocument.from_compact_document(
+                document=document, context_route=request.context_route
+            )
             chat_message = ChatMessage.from_discord_message_document(
                 discord_message_document
             )
             message_history.add_message(chat_message)
         return message_history
 
+    async def upsert_scrape_checkpoint(self, request: UpsertScrapeCheckpointRequest) -> bool:
+        return await self.upsert_one(
+            database_name=request.database_name,
+            data=request.data.dict(),
+            collection_name=SCRAPE_CHECKPOINTS_COLLECTION_NAME,
+            query=request.data.query,
+        )
+
+    async def get_scrape_checkpoints(self, request: ScrapeCheckpointsRequest) -> List[ScrapeCheckpoint]:
+        return [ScrapeCheckpoint(**document)
+                async for document in self.iterate_sorted_documents(database_name=request.database_name,
+                                                                     collection_name=SCRAPE_CHECKPOINTS_COLLECTION_NAME,
+                                                                     query=request.query,
+                                                                     exclude_fields=["_id"])]
+
+    async def upsert_message_reactions(self, request: UpsertMessageReactionsRequest) -> bool:
+        operations = []
+        if request.backfilled_channel_id is not None:
+            operations.append(DeleteMany({"channel_id": request.backfilled_channel_id}))
+        for change in request.data:
+            if change.emoji is None:
+                operations.append(DeleteMany(change.query))
+            elif change.count is not None:
+                operations.append(UpdateOne(change.query,
+                                            {"$set": {"count": change.count, "server_id": change.server_id}},
+                                            upsert=True))
+            else:
+                operations.append(UpdateOne(change.query,
+                                            {"$inc": {"count": change.count_change},
+                                             "$set": {"server_id": change.server_id}},
+                                            upsert=True))
+
+        await self.ensure_indexes(database_name=request.database_name)
+        collection = self.get_write_collection(database_name=request.database_name,
+                                               collection_name=MESSAGE_REACTIONS_COLLECTION_NAME)
+        success = True
+        if operations:
+            # ordered - an add and a remove of the same reaction (or a backfill's reset) must apply in order
+            success = await self.write(lambda: collection.bulk_write(operations, ordered=True),
+                                       description=f"upsert_message_reactions ({len(operations)} operations) into "
+                                                   f"{request.database_name}.{MESSAGE_REACTIONS_COLLECTION_NAME}")
+        if success and request.backfilled_channel_id is not None:
+            success = await self.upsert_one(database_name=request.database_name,
+                                            data={"channel_id": request.backfilled_channel_id,
+                                                  "backfilled_at": datetime.now()},
+                                            collection_name=MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME,
+                                            query={"channel_id": request.backfilled_channel_id})
+        return success
+
+    async def get_message_reactions(self, request: MessageReactionsRequest) -> Tuple[bool, List[int]]:
+        """Whether the channel has been backfilled, and the ids of its messages with `request.emoji`, oldest first"""
+        backfills_collection = self.get_collection(request.database_name, MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME)
+        backfilled = await backfills_collection.find_one({"channel_id": request.channel_id}) is not None
+        message_ids = [document["message_id"]
+                       async for document in self.iterate_sorted_documents(
+                database_name=request.database_name,
+                collection_name=MESSAGE_REACTIONS_COLLECTION_NAME,
+                query=request.query,
+                sort_field="message_id",
+                sort_order=ASCENDING,
+                fields=["message_id"])]
+        return backfilled, message_ids
+
     async def get_context_memory(
             self, request: ContextMemoryDocumentRequest
     ) -> Optional[ContextMemoryDocument]:
@@ -231,5 +477,6 @@ class MongoDatabaseManager:
         return user_id
 
     async def close(self):
+        await self.drain_background_writes()
         logger.info("Closing MongoDatabaseManager connection")
         self._client.close()
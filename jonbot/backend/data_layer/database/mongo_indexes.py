@@ -0,0 +1,167 @@
+from typing import Dict, List, Tuple, Any, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from jonbot.system.environment_variables import (
+    RAW_MESSAGES_COLLECTION_NAME,
+    CHATS_COLLECTION_NAME,
+    CONTEXT_MEMORIES_COLLECTION_NAME,
+    USERS_COLLECTION_NAME,
+    CONTEXT_ROUTES_COLLECTION_NAME,
+    SCRAPE_CHECKPOINTS_COLLECTION_NAME,
+    MESSAGE_REACTIONS_COLLECTION_NAME,
+    MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+# The fields of `ContextRoute.as_query`, in equality-match order
+CONTEXT_ROUTE_QUERY_FIELDS = ["frontend", "server_id", "category_id", "channel_id", "thread_id"]
+MESSAGE_HISTORY_QUERY_FIELDS = ["route_id"]
+MESSAGE_HISTORY_SORT_FIELD = "timestamp_utc"
+
+COLLECTION_INDEXES: Dict[str, List[IndexModel]] = {
+    RAW_MESSAGES_COLLECTION_NAME: [
+        # `upsert_discord_messages` keys on `message_id`
+        IndexModel([("message_id", ASCENDING)], name="message_id_unique", unique=True),
+        # `get_message_history` - equality on the (compact document's) route id, sorted newest first
+        IndexModel([(field, ASCENDING) for field in MESSAGE_HISTORY_QUERY_FIELDS] +
+                   [(MESSAGE_HISTORY_SORT_FIELD, DESCENDING)],
+                   name="route_id_timestamp"),
+    ],
+    CONTEXT_ROUTES_COLLECTION_NAME: [
+        IndexModel([("route_id", ASCENDING)], name="route_id_unique", unique=True),
+    ],
+    CHATS_COLLECTION_NAME: [
+        # `upsert_discord_chats` keys on `chat_id`
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+        IndexModel([("server_id", ASCENDING)], name="server_id"),
+    ],
+    CONTEXT_MEMORIES_COLLECTION_NAME: [
+        # `get_context_memory` / `upsert_context_memory` key on `ContextRoute.as_query`
+        IndexModel([(field, ASCENDING) for field in CONTEXT_ROUTE_QUERY_FIELDS],
+                   name="context_route_unique", unique=True),
+    ],
+    SCRAPE_CHECKPOINTS_COLLECTION_NAME: [
+        # `upsert_scrape_checkpoint` keys on `channel_id`, `get_scrape_checkpoints` loads a whole server
+        IndexModel([("channel_id", ASCENDING)], name="channel_id_unique", unique=True),
+        IndexModel([("server_id", ASCENDING)], name="server_id"),
+    ],
+    MESSAGE_REACTIONS_COLLECTION_NAME: [
+        # `get_message_reactions` - equality on (channel, emoji), oldest message first (and the upserts' key)
+        IndexModel([("channel_id", ASCENDING), ("emoji", ASCENDING), ("message_id", ASCENDING)],
+                   name="channel_id_emoji_message_id_unique", unique=True),
+        # dropping every emoji on a deleted message
+        IndexModel([("channel_id", ASCENDING), ("message_id", ASCENDING)], name="channel_id_message_id"),
+    ],
+    MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME: [
+        IndexModel([("channel_id", ASCENDING)], name="channel_id_unique", unique=True),
+    ],
+    USERS_COLLECTION_NAME: [
+        # `get_user` looks users up by their (embedded) `discord_id`
+        IndexModel([("discord_id", ASCENDING)], name="discord_id"),
+    ],
+}
+
+# Indexes replaced by a later storage format - dropped by the migration that retires the old format
+LEGACY_INDEX_NAMES: Dict[str, List[str]] = {
+    RAW_MESSAGES_COLLECTION_NAME: ["context_route_timestamp"],
+}
+
+# (collection name, query fields, sort field) for the lookups we want `explain()` plans for
+EXPLAINED_LOOKUPS: Dict[str, Tuple[str, List[str], Optional[str]]] = {
+    "message_history": (RAW_MESSAGES_COLLECTION_NAME, MESSAGE_HISTORY_QUERY_FIELDS, MESSAGE_HISTORY_SORT_FIELD),
+    "context_memory": (CONTEXT_MEMORIES_COLLECTION_NAME, CONTEXT_ROUTE_QUERY_FIELDS, None),
+}
+
+
+async def create_collection_indexes(database) -> Dict[str, List[str]]:
+    """
+    Idempotently create every index in `COLLECTION_INDEXES` on the given (motor) database.
+
+    If a unique index can't be built because the collection already holds duplicates, the same keys are indexed
+    without the uniqueness constraint so lookups are still covered.
+    """
+    created_indexes = {}
+    for collection_name, index_models in COLLECTION_INDEXES.items():
+        collection = database[collection_name]
+        created_indexes[collection_name] = []
+        for index_model in index_models:
+            index_document = index_model.document
+            try:
+                created_indexes[collection_name].extend(await collection.create_indexes([index_model]))
+            except OperationFailure as e:
+                if not index_document.get("unique"):
+                    logger.error(f"Failed to create index {index_document['name']} on "
+                                 f"{database.name}.{collection_name} - {e}")
+                    continue
+                logger.warning(f"Could not create unique index {index_document['name']} on "
+                               f"{database.name}.{collection_name} (existing duplicates?) - "
+                               f"falling back to a non-unique index. Error: {e}")
+                try:
+                    await collection.create_index(list(index_document["key"].items()),
+                                                  name=f"{index_document['name']}_non_unique")
+                except OperationFailure as fallback_error:
+                    # e.g. the same keys are already indexed under another name - lookups are covered either way
+                    logger.error(f"Failed to create fallback index {index_document['name']}_non_unique on "
+                                 f"{database.name}.{collection_name} - {fallback_error}")
+                    continue
+                created_indexes[collection_name].append(f"{index_document['name']}_non_unique")
+    return created_indexes
+
+
+def summarize_explain_plan(explain_result: dict) -> Dict[str, Any]:
+    query_planner = explain_result.get("queryPlanner", {})
+    winning_plan = query_planner.get("winningPlan", {})
+    winning_plan = winning_plan.get("queryPlan", winning_plan)  # slot-based execution engine nests the plan
+
+    stages = []
+    stage = winning_plan
+    while stage:
+        stages.append(stage.get("stage"))
+        if "inputStages" in stage:
+            stage = stage["inputStages"][0]
+        else:
+            stage = stage.get("inputStage")
+
+    execution_stats = explain_result.get("executionStats", {})
+    return {
+        "stages": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "index_name": next(_index_names(winning_plan), None),
+        "keys_examined": execution_stats.get("totalKeysExamined"),
+        "documents_examined": execution_stats.get("totalDocsExamined"),
+    }
+
+
+def _index_names(stage: dict):
+    if not stage:
+        return
+    if "indexName" in stage:
+        yield stage["indexName"]
+    for input_stage in stage.get("inputStages", []):
+        yield from _index_names(input_stage)
+    yield from _index_names(stage.get("inputStage"))
+
+
+async def explain_lookups(database) -> Dict[str, Dict[str, Any]]:
+    """
+    Run `explain()` on the message history and context memory lookups (as issued by `MongoDatabaseManager`),
+    using the context route of an existing document when there is one.
+    """
+    report = {}
+    for lookup_name, (collection_name, query_fields, sort_field) in EXPLAINED_LOOKUPS.items():
+        collection = database[collection_name]
+        sample_document = await collection.find_one({}, projection=query_fields) or {}
+        query = {field: sample_document.get(field) for field in query_fields}
+        cursor = collection.find(query)
+        if sort_field is not None:
+            cursor = cursor.sort(sort_field, DESCENDING)
+        cursor = cursor.limit(1)
+        try:
+            report[lookup_name] = summarize_explain_plan(await cursor.explain())
+        except Exception as e:
+            logger.warning(f"Could not explain `{lookup_name}` lookup on {database.name}.{collection_name} - {e}")
+    return report
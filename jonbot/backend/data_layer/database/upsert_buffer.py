@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.models.upsert_buffer_stats import UpsertBufferStats
+from jonbot.system.environment_variables import (
+    UPSERT_BUFFER_MAX_BATCH_SIZE,
+    UPSERT_BUFFER_FLUSH_INTERVAL_SECONDS,
+    UPSERT_BUFFER_MAX_QUEUE_DEPTH,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+
+def _query_key(query: dict) -> str:
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+class UpsertBuffer:
+    """
+    Write-behind buffer for `upsert_many` entries.
+
+    Entries are grouped per (database, collection) and written with one unordered `bulk_write` per group, either every
+    `flush_interval_seconds` or as soon as `max_batch_size` entries are waiting. Entries for the same query that
+    arrive within one window are coalesced into a single upsert (later `$set` data wins, same as two upserts would).
+    Entries whose write fails go back in the queue (under any newer entries for the same query) and are retried on the
+    next flush, and `flush()` returns False so callers that need the data in the database can tell. Past
+    `max_queue_depth` queued entries, `enqueue` refuses new ones (and returns False) until flushes catch up, so a
+    database outage pushes back on the callers instead of growing the queue forever. `close()` does a final flush so
+    nothing queued is lost on shutdown.
+    """
+
+    def __init__(
+            self,
+            mongo_database: MongoDatabaseManager,
+            max_batch_size: int = UPSERT_BUFFER_MAX_BATCH_SIZE,
+            flush_interval_seconds: float = UPSERT_BUFFER_FLUSH_INTERVAL_SECONDS,
+            max_queue_depth: int = UPSERT_BUFFER_MAX_QUEUE_DEPTH,
+    ):
+        self._mongo_database = mongo_database
+        self.max_batch_size = max_batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_queue_depth = max_queue_depth
+
+        # (database name, collection name) -> query key -> entry, oldest first
+        self._pending: Dict[Tuple[str, str], "OrderedDict[str, Dict[str, dict]]"] = {}
+        self._flush_lock = asyncio.Lock()
+        self._batch_full: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self._stats = UpsertBufferStats()
+        self._total_flush_latency_ms = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(entries) for entries in self._pending.values())
+
+    @property
+    def stats(self) -> UpsertBufferStats:
+        return self._stats.copy(update={"queue_depth": self.queue_depth})
+
+    async def enqueue(self,
+                      database_name: str,
+                      collection_name: str,
+                      entries: List[Dict[str, dict]]) -> bool:
+        """Queues `entries` - returns False (without queueing any of them) if the queue is full"""
+        if self._closed:
+            raise RuntimeError("Cannot enqueue upserts on a closed UpsertBuffer")
+        self._ensure_flush_task()
+
+        if self.queue_depth + len(entries) > self.max_queue_depth:
+            self._stats.rejected += len(entries)
+            logger.error(f"Refusing {len(entries)} upserts into {database_name}.{collection_name} - "
+                         f"{self.queue_depth} are already queued (max: {self.max_queue_depth})")
+            return False
+
+        pending = self._pending.setdefault((database_name, collection_name), OrderedDict())
+        for entry in entries:
+            key = _query_key(entry["query"])
+            if key in pending:
+                pending[key]["data"].update(entry["data"])
+                self._stats.coalesced += 1
+            else:
+                pending[key] = {"query": entry["query"], "data": dict(entry["data"])}
+        self._stats.enqueued += len(entries)
+
+        if self.queue_depth >= self.max_batch_size:
+            self._batch_full.set()
+        return True
+
+    async def flush(self) -> bool:
+        """Writes everything queued - returns False if any of it couldn't be written (it stays queued for a retry)"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return True
+
+            tik = time.perf_counter()
+            results = await asyncio.gather(*[
+                self._mongo_database.upsert_many(database_name=database_name,
+                                                 collection_name=collection_name,
+                                                 entries=list(entries.values()),
+                                                 ordered=False)
+                for (database_name, collection_name), entries in pending.items()
+            ], return_exceptions=True)
+            flush_latency_ms = (time.perf_counter() - tik) * 1000
+
+            success = True
+            for ((database_name, collection_name), entries), result in zip(pending.items(), results):
+                if result is True:
+                    self._stats.flushed += len(entries)
+                else:
+                    success = False
+                    self._stats.failed += len(entries)
+                    self._stats.failed_flushes += 1
+                    logger.error(f"Failed to flush {len(entries)} buffered upserts to "
+                                 f"{database_name}.{collection_name} - re-queueing them for the next flush - {result}")
+                    self._requeue(group=(database_name, collection_name), entries=entries)
+
+            self._stats.flushes += 1
+            self._total_flush_latency_ms += flush_latency_ms
+            self._stats.last_flush_latency_ms = flush_latency_ms
+            self._stats.max_flush_latency_ms = max(self._stats.max_flush_latency_ms, flush_latency_ms)
+            self._stats.mean_flush_latency_ms = self._total_flush_latency_ms / self._stats.flushes
+            logger.trace(f"Flushed {sum(len(entries) for entries in pending.values())} buffered upserts "
+                         f"in {flush_latency_ms:.2f} ms")
+            return success
+
+    def _requeue(self, group: Tuple[str, str], entries: "OrderedDict[str, Dict[str, dict]]"):
+        # the failed entries are older than anything queued since, so newer data for the same query wins
+        newer_entries = self._pending.get(group, OrderedDict())
+        requeued = OrderedDict()
+        for key, entry in entries.items():
+            data = dict(entry["data"])
+            if key in newer_entries:
+                data.update(newer_entries[key]["data"])
+            requeued[key] = {"query": entry["query"], "data": data}
+        for key, entry in newer_entries.items():
+            if key not in requeued:
+                requeued[key] = entry
+        self._pending[group] = requeued
+        self._stats.requeued += len(entries)
+
+    async def close(self):
+        if self._closed:
+            return
+        logger.info(f"Closing UpsertBuffer - flushing {self.queue_depth} queued upserts")
+        self._closed = True
+        if self._flush_task is not None:
+            self._batch_full.set()
+            await self._flush_task
+        if not await self.flush():
+            logger.error(f"UpsertBuffer closed with {self.queue_depth} upserts that couldn't be written")
+
+    def _ensure_flush_task(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._batch_full = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run_flush_loop())
+
+    async def _run_flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            await self.flush()
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class ChatbotCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    lru_evictions: int = 0
+    idle_ttl_evictions: int = 0
+    resident_chatbots: int = 0
+    resident_bytes: int = 0
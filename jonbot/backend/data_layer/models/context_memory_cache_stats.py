@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class ContextMemoryCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    resident_documents: int = 0
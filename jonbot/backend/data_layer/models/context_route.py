@@ -165,6 +165,21 @@ class ContextRoute(BaseModel):
         }
         return query
 
+    @property
+    def route_id(self) -> str:
+        """Stable id for this route (names can change, ids don't) - used to reference a shared route document"""
+        return "/".join(str(value) for value in self.as_query.values())
+
+    def as_route_document(self) -> dict:
+        return {
+            "route_id": self.route_id,
+            "context_route": self.dict(),
+            "context_route_full_path": self.full_path,
+            "context_route_friendly_path": self.friendly_path,
+            **self.as_query,
+            **self.as_flat_dict,
+        }
+
     @property
     def as_tree_path(self) -> List[Union[str, int]]:
         return [value for key, value in self.as_flat_dict.items() if key.endswith("_id")]
@@ -201,6 +216,8 @@ class ContextRoute(BaseModel):
             parent=frontend,
             id=0,
         )
+        category = SubContextComponent.create_dummy(dummy_text=dummy_text,
+                                                    parent=str(server))
         channel = SubContextComponent(
             type=SubContextComponentTypes.CHANNEL.value,
             name=dummy_text,
@@ -216,6 +233,7 @@ class ContextRoute(BaseModel):
         return cls(
             frontend=frontend,
             server=server,
+            category=category,
             channel=channel,
             thread=thread,
         )
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import uuid
 from typing import Union, Optional, List, Literal, Tuple
 
@@ -69,7 +71,7 @@ class ChatMessage(BaseModel):
                 type="bot" if message_document.is_bot else "human",
             ),
             timestamp=message_document.timestamp,
-            context_route=message_document.context_route_object,
+            context_route=message_document.context_route,
             original_message_document=message_document,
         )
 
@@ -98,8 +100,23 @@ class ChatRequestConfig(BaseModel):
     config_prompts: Optional[str] = None
     memory_messages: Optional[List[DiscordMessageDocument]] = None
 
+    @property
+    def memory_message_ids(self) -> List[int]:
+        if not self.memory_messages:
+            return []
+        return [message.message_id for message in self.memory_messages]
 
-
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the parts of the config that go into building a chatbot's chain and memory"""
+        config_prompts_hash = hashlib.sha256((self.config_prompts or "").encode("utf-8")).hexdigest()
+        fingerprint_dict = {
+            "model_name": self.model_name,
+            "temperature": self.temperature,
+            "config_prompts_hash": config_prompts_hash,
+            "memory_message_ids": self.memory_message_ids,
+        }
+        return hashlib.sha256(json.dumps(fingerprint_dict, sort_keys=True).encode("utf-8")).hexdigest()
 
     @classmethod
     def from_kwargs(cls, **kwargs):
@@ -1,4 +1,4 @@
-from typing import Literal, List, Dict, Any
+from typing import Literal, List, Dict, Any, Optional
 
 from pydantic import BaseModel
 
@@ -6,6 +6,8 @@ from jonbot.backend.data_layer.models.context_route import ContextRoute
 from jonbot.backend.data_layer.models.conversation_models import ChatRequest
 from jonbot.backend.data_layer.models.discord_stuff.discord_chat_document import DiscordChatDocument
 from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+from jonbot.backend.data_layer.models.discord_stuff.message_reaction import MessageReactionChange
+from jonbot.backend.data_layer.models.discord_stuff.scrape_checkpoint import ScrapeCheckpoint
 from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
@@ -31,7 +33,7 @@ class MessageHistoryRequest(BaseModel):
 
     @property
     def query(self):
-        return self.context_route.as_query
+        return {"route_id": self.context_route.route_id}
 
 
 class ContextMemoryDocumentResponse(BaseModel):
@@ -100,5 +102,48 @@ class UpsertDiscordMessagesRequest(BaseModel):
         return cls(data=documents, query=query, database_name=database_name)
 
 
+class ScrapeCheckpointsRequest(BaseModel):
+    server_id: int
+    database_name: str
+
+    @property
+    def query(self):
+        return {"server_id": self.server_id}
+
+
+class ScrapeCheckpointsResponse(BaseModel):
+    success: bool
+    data: List[ScrapeCheckpoint] = []
+
+
+class UpsertScrapeCheckpointRequest(BaseModel):
+    data: ScrapeCheckpoint
+    database_name: str
+
+
+class UpsertMessageReactionsRequest(BaseModel):
+    data: List[MessageReactionChange]
+    database_name: str
+    # set when `data` is the complete backfill of this channel - replaces everything indexed for it so far
+    backfilled_channel_id: Optional[int] = None
+
+
+class MessageReactionsRequest(BaseModel):
+    channel_id: int
+    emoji: str
+    database_name: str
+
+    @property
+    def query(self):
+        return {"channel_id": self.channel_id, "emoji": self.emoji, "count": {"$gt": 0}}
+
+
+class MessageReactionsResponse(BaseModel):
+    success: bool
+    # False until the channel's history has been backfilled into the index (until then `message_ids` is incomplete)
+    backfilled: bool = False
+    message_ids: List[int] = []
+
+
 class UpsertResponse(BaseModel):
     success: bool
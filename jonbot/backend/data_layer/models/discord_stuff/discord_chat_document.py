@@ -1,3 +1,4 @@
+import asyncio
 from typing import List, Optional, Dict, Any
 
 import discord
@@ -47,12 +48,13 @@ class DiscordChatDocument(BaseModel):
     async def build(cls,
                     chat_id: int,
                     parent_message: discord.Message,
-                    messages: List[discord.Message]):
+                    messages: List[discord.Message],
+                    download_attachments: bool = True):
 
-        message_documents = [
-            await DiscordMessageDocument.from_discord_message(message)
+        message_documents = await asyncio.gather(*[
+            DiscordMessageDocument.from_discord_message(message, download_attachments=download_attachments)
             for message in messages
-        ]
+        ])
         cls._validate_messages(message_documents=message_documents)
 
         speakers = await cls.get_unique_speakers(messages)
@@ -1,16 +1,48 @@
-from pathlib import Path
-from typing import List, Optional, Union
+from typing import List, Optional, Union, Dict, Any
 
 import discord
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
+from jonbot.backend.data_layer.attachments.attachment_store import get_or_create_attachment_store
 from jonbot.backend.data_layer.models.context_route import ContextRoute
 from jonbot.backend.data_layer.models.conversation_context import ConversationContextDescription
 from jonbot.backend.data_layer.models.timestamp_model import Timestamp
+from jonbot.system.environment_variables import STORE_MESSAGE_DUMPS
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
-from jonbot.system.path_getters import get_new_attachments_folder_path
+
+COMPACT_SCHEMA_VERSION = 2
+
+# Fields stored as-is in the compact format - the route lives in the `context_routes` collection (by `route_id`),
+# and timestamps are stored as single epoch floats
+COMPACT_MESSAGE_FIELDS = [
+    "message_id",
+    "content",
+    "reference_dict",
+    "author",
+    "author_id",
+    "server_id",
+    "channel_id",
+    "thread_id",
+    "is_bot",
+    "in_thread",
+    "mentions",
+    "jump_url",
+    "reactions",
+    "attachment_urls",
+    "attachment_local_paths",
+    "parent_message_id",
+    "parent_message_jump_url",
+    "context_description",
+]
+
+# timestamp field -> the epoch float it's stored as in the compact format
+COMPACT_TIMESTAMP_FIELDS = {
+    "timestamp": "timestamp_utc",
+    "edited_timestamp": "edited_timestamp_utc",
+    "received_timestamp": "received_timestamp_utc",
+}
 
 
 class DiscordMessageDocument(BaseModel):
@@ -32,7 +64,7 @@ class DiscordMessageDocument(BaseModel):
     received_timestamp: Timestamp
     mentions: List[str]
     jump_url: str
-    dump: str
+    dump: str = ""
     reactions: List[str]
     attachment_urls: List[str]
     attachment_local_paths: List[str]
@@ -44,8 +76,28 @@ class DiscordMessageDocument(BaseModel):
     context_route_as_friendly_dict: str
     query: dict
 
+    # documents read with `from_compact_document` build their `Timestamp`s on first access - these are the epoch
+    # floats of the ones that haven't been built yet
+    _unbuilt_timestamps_utc: Dict[str, Optional[float]] = PrivateAttr(default_factory=dict)
+
+    def __getattr__(self, name: str):
+        # only called for attributes that aren't set - i.e. timestamps that haven't been built yet
+        if name not in COMPACT_TIMESTAMP_FIELDS or name not in self._unbuilt_timestamps_utc:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        unix_timestamp_utc = self._unbuilt_timestamps_utc.pop(name)
+        # `edited_timestamp` is "" for messages that were never edited
+        timestamp = Timestamp.from_unix_timestamp_utc(unix_timestamp_utc) if unix_timestamp_utc is not None else ""
+        self.__dict__[name] = timestamp
+        return timestamp
+
+    def _iter(self, *args, **kwargs):
+        # `dict()`/`json()`/`copy()` read the fields straight out of `__dict__`, so build any missing timestamps first
+        for name in list(self._unbuilt_timestamps_utc):
+            getattr(self, name)
+        return super()._iter(*args, **kwargs)
+
     @classmethod
-    async def from_discord_message(cls, message: discord.Message):
+    async def from_discord_message(cls, message: discord.Message, download_attachments: bool = True):
         context_route = ContextRoute.from_discord_message(message)
         discord_message_document = cls(
             content=message.content,
@@ -79,30 +131,46 @@ class DiscordMessageDocument(BaseModel):
             query={"message_id": message.id},
             **context_route.as_flat_dict,
         )
-        await discord_message_document._add_attachments_to_message(message)
+        if download_attachments and message.attachments:
+            await discord_message_document._add_attachments_to_message(message)
         return discord_message_document
 
-    async def _add_attachments_to_message(
-            self,
-            message: discord.Message,
-            attachment_local_path: Optional[
-                Union[str, Path]
-            ] = get_new_attachments_folder_path(),
-    ):
-        """Save attachments from a message and add their paths to the message data.
+    def to_compact_document(self, include_dump: bool = STORE_MESSAGE_DUMPS) -> Dict[str, Any]:
+        document = {field: getattr(self, field) for field in COMPACT_MESSAGE_FIELDS}
+        document.update(
+            schema_version=COMPACT_SCHEMA_VERSION,
+            route_id=self.context_route.route_id,
+            timestamp_utc=self.timestamp.utc,
+            edited_timestamp_utc=self.edited_timestamp.utc if isinstance(self.edited_timestamp, Timestamp) else None,
+            received_timestamp_utc=self.received_timestamp.utc,
+        )
+        if include_dump and self.dump:
+            document["dump"] = self.dump
+        return document
 
-        Args:
-            message (discord.Message): Message to save attachments from.
-            message_data (dict): Data of the message to add attachments to.
-        """
-        attachments_folder = Path(attachment_local_path)
-        attachments_folder.mkdir(parents=True, exist_ok=True)
-        for attachment in message.attachments:
-            try:
-                file_path = attachments_folder / f"{message.id}_{attachment.filename}"
-                await attachment.save(file_path)
-                self.attachment_local_paths.append(str(file_path))
-            except Exception as e:
-                logger.warning(
-                    f"Failed to save attachment: {attachment.filename}. Error: {e}"
-                )
+    @classmethod
+    def from_compact_document(cls, document: Dict[str, Any], context_route: ContextRoute):
+        # compact documents are only ever written by `to_compact_document`, so skip re-validating them on the read path
+        # (and only build the `Timestamp`s that get used - see `__getattr__`)
+        discord_message_document = cls.construct(
+            _fields_set=set(cls.__fields__),
+            **{field: document.get(field) for field in COMPACT_MESSAGE_FIELDS},
+            dump=document.get("dump", ""),
+            server_name=context_route.server.name,
+            channel_name=context_route.channel.name,
+            thread_name=context_route.thread.name,
+            context_route=context_route,
+            context_route_full_path=context_route.full_path,
+            context_route_as_friendly_dict=context_route.friendly_path,
+            query={"message_id": document["message_id"]},
+        )
+        discord_message_document._unbuilt_timestamps_utc = {
+            field: document.get(compact_field) for field, compact_field in COMPACT_TIMESTAMP_FIELDS.items()
+        }
+        return discord_message_document
+
+    async def _add_attachments_to_message(self, message: discord.Message):
+        """Save attachments from a message (to the content-addressed `AttachmentStore`) and add their local paths."""
+        self.attachment_local_paths.extend(
+            await get_or_create_attachment_store().save_attachments(message.attachments)
+        )
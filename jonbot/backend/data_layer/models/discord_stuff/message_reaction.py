@@ -0,0 +1,24 @@
+from typing import Optional, Dict, Any
+
+from pydantic import BaseModel
+
+
+class MessageReactionChange(BaseModel):
+    """
+    A change to the reaction index - users adding (`count_change` > 0) or removing (< 0) one emoji on one message, or
+    `count` to set the emoji's count outright (backfills, emoji clears). `emoji=None` drops every emoji on the message
+    (message deleted, all reactions cleared).
+    """
+    server_id: Optional[int] = None
+    channel_id: int  # the thread's id, for threads
+    message_id: int
+    emoji: Optional[str] = None
+    count_change: int = 0
+    count: Optional[int] = None
+
+    @property
+    def query(self) -> Dict[str, Any]:
+        query = {"channel_id": self.channel_id, "message_id": self.message_id}
+        if self.emoji is not None:
+            query["emoji"] = self.emoji
+        return query
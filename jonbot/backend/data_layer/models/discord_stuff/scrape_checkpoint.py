@@ -0,0 +1,18 @@
+from typing import Optional, Dict, Any
+
+from pydantic import BaseModel
+
+from jonbot.backend.data_layer.models.timestamp_model import Timestamp
+
+
+class ScrapeCheckpoint(BaseModel):
+    """The newest message saved by a server scrape, for one channel or thread - the next scrape resumes `after` it"""
+    server_id: int
+    channel_id: int  # the thread's id, for threads
+    parent_channel_id: Optional[int] = None
+    last_message_id: int
+    updated_at: Timestamp
+
+    @property
+    def query(self) -> Dict[str, Any]:
+        return {"channel_id": self.channel_id}
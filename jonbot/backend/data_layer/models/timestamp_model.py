@@ -39,6 +39,10 @@ class Timestamp(BaseModel):
             is_leap_year=calendar.isleap(date_time_local.year),
         )
 
+    @classmethod
+    def from_unix_timestamp_utc(cls, unix_timestamp_utc: float):
+        return cls.from_datetime(datetime.fromtimestamp(unix_timestamp_utc, tz=timezone.utc))
+
     @classmethod
     def now(cls):
         return cls.from_datetime(datetime.now())
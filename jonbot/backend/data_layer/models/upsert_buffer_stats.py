@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+
+class UpsertBufferStats(BaseModel):
+    queue_depth: int = 0
+    enqueued: int = 0
+    coalesced: int = 0
+    flushed: int = 0
+    failed: int = 0
+    requeued: int = 0
+    rejected: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    last_flush_latency_ms: float = 0.0
+    max_flush_latency_ms: float = 0.0
+    mean_flush_latency_ms: float = 0.0
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -24,6 +24,8 @@ class ContextMemoryDocument(BaseModel):
     # message_uuids: List[str] = None
     # summary: str = ""
     tokens_count: int = 0
+    # bumped on every write, so readers can tell which of two snapshots of the same route is newer
+    version: int = 0
 
     @classmethod
     def build_empty(cls,
@@ -40,6 +42,14 @@ class ContextMemoryDocument(BaseModel):
             **context_route.as_flat_dict,
         )
 
+    @property
+    def memory_message_ids(self) -> List[int]:
+        if not self.chat_memory_message_buffer or not self.chat_memory_message_buffer.message_buffer:
+            return []
+        return [memory_message.additional_kwargs["message_id"]
+                for memory_message in self.chat_memory_message_buffer.message_buffer
+                if "message_id" in memory_message.additional_kwargs]
+
     def update(
             self,
             chat_memory_message_buffer: ChatMemoryMessageBuffer,
@@ -8,7 +8,7 @@ from langchain.embeddings import OpenAIEmbeddings
 from langchain.schema import Document
 from langchain.vectorstores import Chroma
 
-from jonbot.backend.data_layer.analysis.get_chats import get_chats
+from jonbot.backend.data_layer.analysis.get_chats import get_chats, CHAT_MESSAGE_DUMP_FIELDS
 from jonbot.backend.data_layer.models.discord_stuff.discord_chat_document import DiscordChatDocument
 from jonbot.backend.data_layer.visualize_data.plot_vector_clusters_3d import visualize_clusters_3d
 
@@ -194,7 +194,8 @@ async def get_or_create_vectorstore(chroma_persistence_directory: str,
                               collection_name=chroma_collection_name)
     else:
         chats_out = await get_chats(database_name=database_name,
-                                    query={"server_id": server_id})
+                                    query={"server_id": server_id},
+                                    exclude_fields=CHAT_MESSAGE_DUMP_FIELDS)
         chat_documents = {key: DiscordChatDocument.from_dict(chat_dict) for key, chat_dict in chats_out.items()}
         vector_store, document_tree_dict, word_counts = await create_vector_store(chats=chat_documents,
                                                                                   collection_name=chroma_collection_name,
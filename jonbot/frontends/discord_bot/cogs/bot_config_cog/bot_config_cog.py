@@ -1,38 +1,190 @@
 import asyncio
-from copy import deepcopy
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 import discord
 
 from jonbot import logger
 from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
-from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
+from jonbot.backend.data_layer.models.discord_stuff.message_reaction import MessageReactionChange
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.bot_config_cache import (
+    BotConfigCache,
+    BOT_CONFIG_PROMPTS,
+    PINNED_MESSAGES,
+    MEMORY_MESSAGES,
+)
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.channel_memory_messages import ChannelMemoryMessages
 from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.get_pinned_messages_in_channel import get_pinned_messages
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.memory_emoji_reconciler import MemoryEmojiReconciler
 from jonbot.frontends.discord_bot.handlers.should_process_message import BOT_CONFIG_CHANNEL_NAME, \
     allowed_to_reply_to_message
+from jonbot.system.environment_variables import REACTION_INDEX_MAX_CONCURRENT_FETCHES
 
 if TYPE_CHECKING:
     from jonbot.frontends.discord_bot.discord_bot import MyDiscordBot
+    from jonbot.frontends.discord_bot.operations.discord_database_operations import DiscordDatabaseOperations
 
 
 class BotConfigCog(discord.Cog):
-    def __init__(self, bot: "MyDiscordBot"):
+    def __init__(self,
+                 bot: "MyDiscordBot",
+                 database_operations: Optional["DiscordDatabaseOperations"] = None,
+                 max_concurrent_fetches: int = REACTION_INDEX_MAX_CONCURRENT_FETCHES):
         super().__init__()
         self.bot = bot
+        # keeps the reaction index - without it, emoji lookups scan the last 100 messages of the channel instead
+        self._database_operations = database_operations
 
         self._bot_config_emoji = "🤖"
         self._memory_emoji = "💭"
         self._remove_memory_emoji = "❌"
+        self._indexed_emojis = [self._bot_config_emoji, self._memory_emoji]
+        # channel id -> its running reaction index backfill
+        self._reaction_index_backfills: Dict[int, asyncio.Task] = {}
+        # channel id -> reaction events that arrived during its backfill (and whether the backfill had already read
+        # their message), and the oldest message it has paged to
+        self._backfill_held_changes: Dict[int, List[Tuple[MessageReactionChange, bool]]] = {}
+        self._backfill_oldest_paged_message_ids: Dict[int, Optional[int]] = {}
+        # a channel can have any number of indexed messages - fetch them a few at a time, across every lookup
+        self._fetch_slots = asyncio.Semaphore(max_concurrent_fetches)
+
+        self.config_cache = BotConfigCache()
+        self.memory_emoji_reconciler = MemoryEmojiReconciler(bot=bot,
+                                                             load_tagged_message_ids=self._load_memory_emoji_message_ids,
+                                                             memory_emoji=self._memory_emoji,
+                                                             remove_memory_emoji=self._remove_memory_emoji)
+
+    @property
+    def config_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        return self.config_cache.stats
+
+    def _invalidate_bot_config_prompts(self, channel: Optional[discord.abc.GuildChannel]):
+        """Drops the cached prompts of every guild/category that `channel` feeds, if it's a `bot-config` channel"""
+        if channel is None or getattr(channel, "guild", None) is None:
+            return
+        if BOT_CONFIG_CHANNEL_NAME not in (channel.name or ""):
+            return
+        guild_id = channel.guild.id
+        category_id = channel.category.id if channel.category else None
+        # top-level `bot-config` channels feed every category in the guild
+        self.config_cache.invalidate_where(kind=BOT_CONFIG_PROMPTS,
+                                           matches=lambda key: key[0] == guild_id and (category_id is None
+                                                                                       or key[1] == category_id))
+
+    def _is_memory_message(self, channel_id: int, message_id: int) -> bool:
+        memory_messages = self.bot.memory_messages_by_channel_id.get(channel_id)
+        return memory_messages is not None and message_id in memory_messages
 
     @discord.Cog.listener()
     async def on_guild_channel_pins_update(self, channel: discord.TextChannel, last_pin: discord.Message):
         logger.debug(f"Received pin update for channel: {channel}")
-        self.bot.pinned_messages_by_channel_id[channel.id] = await get_pinned_messages(channel=channel)
+        self.config_cache.invalidate(kind=PINNED_MESSAGES, key=channel.id)
+        self._invalidate_bot_config_prompts(channel=channel)
+
+    @discord.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        channel = self.bot.get_channel(payload.channel_id)
+        self._invalidate_bot_config_prompts(channel=channel)
+        if payload.data.get("pinned"):
+            self.config_cache.invalidate(kind=PINNED_MESSAGES, key=payload.channel_id)
+        if self._is_memory_message(channel_id=payload.channel_id, message_id=payload.message_id):
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+
+    @discord.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        await self._index_reaction_changes([MessageReactionChange(server_id=payload.guild_id,
+                                                                  channel_id=payload.channel_id,
+                                                                  message_id=payload.message_id)])
+        channel = self.bot.get_channel(payload.channel_id)
+        self._invalidate_bot_config_prompts(channel=channel)
+        # the deleted message may have been pinned
+        self.config_cache.invalidate(kind=PINNED_MESSAGES, key=payload.channel_id)
+        if self._is_memory_message(channel_id=payload.channel_id, message_id=payload.message_id):
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+
+    @discord.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        self._invalidate_bot_config_prompts(channel=channel)
+
+    @discord.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self._invalidate_bot_config_prompts(channel=channel)
+
+    @discord.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        self._invalidate_bot_config_prompts(channel=before)
+        self._invalidate_bot_config_prompts(channel=after)
+
+    @discord.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        emoji = str(payload.emoji)
+        await self._index_reaction_changes([MessageReactionChange(server_id=payload.guild_id,
+                                                                  channel_id=payload.channel_id,
+                                                                  message_id=payload.message_id,
+                                                                  emoji=emoji,
+                                                                  count_change=-1)])
+        if emoji == self._bot_config_emoji:
+            self._invalidate_bot_config_prompts(channel=self.bot.get_channel(payload.channel_id))
+        elif emoji == self._memory_emoji:
+            if self.memory_emoji_reconciler.claim_removal(channel_id=payload.channel_id,
+                                                          message_id=payload.message_id,
+                                                          user_id=payload.user_id):
+                # the reconciler untagged it because it's out of memory - no need to reload the whole channel
+                memory_messages = self.bot.memory_messages_by_channel_id.get(payload.channel_id)
+                if memory_messages is not None:
+                    memory_messages.remove(payload.message_id)
+                return
+            # other users' 💭 may still be on the message - reload the channel's memory messages on its next chat
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+            if self.bot.user is not None and payload.user_id == self.bot.user.id:
+                self.memory_emoji_reconciler.note_reaction(channel_id=payload.channel_id,
+                                                           message_id=payload.message_id,
+                                                           tagged=False)
+
+    @discord.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        await self._index_reaction_changes([MessageReactionChange(server_id=payload.guild_id,
+                                                                  channel_id=payload.channel_id,
+                                                                  message_id=payload.message_id)])
+        self._invalidate_bot_config_prompts(channel=self.bot.get_channel(payload.channel_id))
+        self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+        self.memory_emoji_reconciler.note_reaction(channel_id=payload.channel_id,
+                                                   message_id=payload.message_id,
+                                                   tagged=False)
+
+    @discord.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        emoji = str(payload.emoji)
+        await self._index_reaction_changes([MessageReactionChange(server_id=payload.guild_id,
+                                                                  channel_id=payload.channel_id,
+                                                                  message_id=payload.message_id,
+                                                                  emoji=emoji,
+                                                                  count=0)])
+        if emoji == self._bot_config_emoji:
+            self._invalidate_bot_config_prompts(channel=self.bot.get_channel(payload.channel_id))
+        elif emoji == self._memory_emoji:
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+            self.memory_emoji_reconciler.note_reaction(channel_id=payload.channel_id,
+                                                       message_id=payload.message_id,
+                                                       tagged=False)
 
     @discord.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         try:
             logger.debug(f"Received reaction: {payload}")
+            await self._index_reaction_changes([MessageReactionChange(server_id=payload.guild_id,
+                                                                      channel_id=payload.channel_id,
+                                                                      message_id=payload.message_id,
+                                                                      emoji=str(payload.emoji),
+                                                                      count_change=1)])
+            if self.memory_emoji_reconciler.claim_addition(channel_id=payload.channel_id,
+                                                           message_id=payload.message_id,
+                                                           emoji=str(payload.emoji),
+                                                           user_id=payload.user_id):
+                # the reconciler tagged it (and adds its own ❌) - nothing to fetch
+                if str(payload.emoji) == self._memory_emoji:
+                    await self._add_reconciled_memory_message(channel_id=payload.channel_id,
+                                                              message_id=payload.message_id)
+                return
             user = self.bot.get_user(payload.user_id)
             guild = self.bot.get_guild(payload.guild_id)
             channel = self.bot.get_channel(payload.channel_id)
@@ -47,18 +199,21 @@ class BotConfigCog(discord.Cog):
 
             if guild is not None:
                 if emoji == self._bot_config_emoji and BOT_CONFIG_CHANNEL_NAME in channel.name:
-                    logger.debug(f"Reaction was in bot-config channel, updating config messages")
-                    self.bot.config_messages_by_guild_id[payload.guild_id] = await self.get_bot_config_channel_prompts(
-                        channel=channel)
+                    logger.debug(f"Reaction was in bot-config channel, invalidating cached config messages")
+                    self._invalidate_bot_config_prompts(channel=channel)
 
             if emoji == self._memory_emoji:
                 logger.debug(f"User reacted with memory emoji - adding memory message to channel ({channel}) list")
-                if payload.channel_id not in self.bot.memory_messages_by_channel_id.keys():
-                    self.bot.memory_messages_by_channel_id[payload.channel_id] = []
-
-                if message not in self.bot.memory_messages_by_channel_id[payload.channel_id]:
-                    message_document = await DiscordMessageDocument.from_discord_message(message=message)
-                    self.bot.memory_messages_by_channel_id[payload.channel_id].append(message_document)
+                self.memory_emoji_reconciler.note_reaction(channel_id=payload.channel_id,
+                                                           message_id=payload.message_id,
+                                                           tagged=True)
+                if (MEMORY_MESSAGES, payload.channel_id) not in self.config_cache:
+                    # not loaded yet (or loading) - make sure the next chat scans the channel with this reaction in it
+                    self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=payload.channel_id)
+                memory_messages = self.bot.memory_messages_by_channel_id.setdefault(payload.channel_id,
+                                                                                    ChannelMemoryMessages())
+                if message.id not in memory_messages:
+                    memory_messages.add(await DiscordMessageDocument.from_discord_message(message=message))
 
                 if not user == self.bot.user:
                     logger.debug("Emoji was added by a user, so botto will add their own reaction")
@@ -74,35 +229,32 @@ class BotConfigCog(discord.Cog):
                 await message.remove_reaction(self._remove_memory_emoji, user)
                 await message.remove_reaction(self._memory_emoji, user)
 
-                if not payload.channel_id in self.bot.memory_messages_by_channel_id.keys():
-                    self.bot.memory_messages_by_channel_id[payload.channel_id] = []
-                for message in self.bot.memory_messages_by_channel_id[payload.channel_id]:
-                    if message.message_id == payload.message_id:
-                        for message in self.bot.memory_messages_by_channel_id[payload.channel_id]:
-                            if message.message_id == payload.message_id:
-                                if isinstance(message, discord.Message):
-                                    message_document = await DiscordMessageDocument.from_discord_message(
-                                        message=message)
-                                elif isinstance(message, DiscordMessageDocument):
-                                    message_document = deepcopy(message.dict())
-                                else:
-                                    raise ValueError(f"Message type not recognized: {message}")
-                                self.bot.memory_messages_by_channel_id[payload.channel_id].remove(message_document)
-                                break
-                        try:
-                            self.bot.memory_messages_by_channel_id[payload.channel_id].remove(message_document)
-                        except ValueError:
-                            logger.error(f"Message not found in memory messages: {message_document}")
-                            raise
-                        break
+                memory_messages = self.bot.memory_messages_by_channel_id.get(payload.channel_id)
+                if memory_messages is None or not memory_messages.remove(payload.message_id):
+                    logger.debug(f"Message {payload.message_id} was not in channel {channel}'s memory messages")
         except Exception as e:
             logger.error(f"Error handling reaction` add: {e}")
             logger.exception(e)
             raise
 
+    async def _add_reconciled_memory_message(self, channel_id: int, message_id: int):
+        memory_messages = self.bot.memory_messages_by_channel_id.get(channel_id)
+        if (MEMORY_MESSAGES, channel_id) not in self.config_cache or memory_messages is None:
+            # not loaded yet (or loading) - make sure the next chat scans the channel with this reaction in it
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=channel_id)
+            return
+        if message_id in memory_messages:
+            return
+        cached_message = self.bot.get_message(message_id)
+        if cached_message is None:
+            # not worth a fetch - the channel's next chat reloads its memory messages instead
+            self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=channel_id)
+            return
+        memory_messages.add(await DiscordMessageDocument.from_discord_message(message=cached_message))
+
     async def get_memory_messages(self,
                                   channel: discord.channel,
-                                  memory_emoji: str = "💭") -> List[DiscordMessageDocument]:
+                                  memory_emoji: str = "💭") -> ChannelMemoryMessages:
 
         memory_messages = await self.look_for_emoji_reaction_in_channel(channel=channel,
                                                                         emoji=memory_emoji)
@@ -112,24 +264,32 @@ class BotConfigCog(discord.Cog):
             logger.trace(f"Channel: {channel} - No memory messages found")
         else:
             logger.trace(f"Channel: {channel} - Found {len(documents)} memory messages")
-        return documents
+        return ChannelMemoryMessages(documents=documents)
 
     async def gather_config_messages(self,
-                                     channel: discord.channel, ):
+                                     channel: discord.channel, ) -> str:
+        """
+        Returns the `bot-config` prompts for a chat in `channel`, and makes sure the channel's memory messages are in
+        `bot.memory_messages_by_channel_id`. Both come from `config_cache`, so usually without any Discord API calls.
+        """
         try:
             logger.info(f"Getting config messages")
 
+            bot_config_prompts = ""
             if hasattr(channel, "guild") and channel.guild is not None:
-                self.bot.config_messages_by_guild_id[channel.guild.id] = await self.get_bot_config_channel_prompts(
-                    channel=channel)
-            self.bot.pinned_messages_by_channel_id[channel.id] = await get_pinned_messages(channel=channel)
-            self.bot.memory_messages_by_channel_id[channel.id] = await self.get_memory_messages(channel=channel)
+                bot_config_prompts = await self.get_bot_config_channel_prompts(channel=channel)
+            self.bot.memory_messages_by_channel_id[channel.id] = await self.config_cache.get_or_load(
+                kind=MEMORY_MESSAGES,
+                key=channel.id,
+                load=lambda: self.get_memory_messages(channel=channel))
 
         except Exception as e:
             logger.error(f"Error getting config messages")
             logger.exception(e)
             raise
         logger.success(f"Finished gathering config messages")
+        logger.trace(f"Config cache stats: {self.config_cache.stats}")
+        return bot_config_prompts
 
     async def get_bot_config_channel_prompts(self,
                                              channel: discord.TextChannel,
@@ -139,30 +299,13 @@ class BotConfigCog(discord.Cog):
         logger.debug("Getting extra prompts from bot-config channel")
 
         try:
-            guild = channel.guild
-            parent_category = channel.category
-
-            category_channels = []
-            top_level_channels = []
-            for guild_channel in guild.channels:
-                if guild_channel.category == parent_category:
-                    category_channels.append(guild_channel)
-                elif not guild_channel.category:
-                    top_level_channels.append(guild_channel)
-
-            bot_config_prompts = ""
-            for prompt_type in ["top", "category"]:
-                channels = []
-                if prompt_type == "top":
-                    channels = top_level_channels
-                    bot_config_prompts += "# Top-Level `bot-config` prompts: \n"
-                elif prompt_type == "category":
-                    channels = category_channels
-                    bot_config_prompts += "# Category-Level `bot-config` prompts: \n"
-
-                for _channel in channels:
-                    bot_config_prompts = await self._get_channel_config_messages(_channel, bot_config_channel_name,
-                                                                                 bot_config_prompts, selected_emoji)
+            # every channel in a category shares the same `bot-config` channels
+            bot_config_prompts = await self.config_cache.get_or_load(
+                kind=BOT_CONFIG_PROMPTS,
+                key=(channel.guild.id, channel.category.id if channel.category else None),
+                load=lambda: self._load_bot_config_channel_prompts(channel=channel,
+                                                                   bot_config_channel_name=bot_config_channel_name,
+                                                                   selected_emoji=selected_emoji))
 
             bot_config_prompts = await self._get_parent_channel_pins(bot_config_prompts, channel)
 
@@ -173,6 +316,36 @@ class BotConfigCog(discord.Cog):
             logger.exception(e)
             raise
 
+    async def _load_bot_config_channel_prompts(self,
+                                               channel: discord.TextChannel,
+                                               bot_config_channel_name: str,
+                                               selected_emoji: str) -> str:
+        guild = channel.guild
+        parent_category = channel.category
+
+        category_channels = []
+        top_level_channels = []
+        for guild_channel in guild.channels:
+            if guild_channel.category == parent_category:
+                category_channels.append(guild_channel)
+            elif not guild_channel.category:
+                top_level_channels.append(guild_channel)
+
+        bot_config_prompts = ""
+        for prompt_type in ["top", "category"]:
+            channels = []
+            if prompt_type == "top":
+                channels = top_level_channels
+                bot_config_prompts += "# Top-Level `bot-config` prompts: \n"
+            elif prompt_type == "category":
+                channels = category_channels
+                bot_config_prompts += "# Category-Level `bot-config` prompts: \n"
+
+            for _channel in channels:
+                bot_config_prompts = await self._get_channel_config_messages(_channel, bot_config_channel_name,
+                                                                             bot_config_prompts, selected_emoji)
+        return bot_config_prompts
+
     async def _get_channel_config_messages(self, _channel, bot_config_channel_name, bot_config_prompts, selected_emoji):
         if bot_config_channel_name in _channel.name:
             logger.debug(f"Found bot-config channel - {_channel}")
@@ -194,65 +367,173 @@ class BotConfigCog(discord.Cog):
     async def _get_parent_channel_pins(self, bot_config_prompts, channel):
         if hasattr(channel, "parent"):
             if str(channel.parent.type) != "forum":
-                channel_pinned_messages = await get_pinned_messages(channel=channel.parent)
+                channel_pinned_messages = await self.config_cache.get_or_load(
+                    kind=PINNED_MESSAGES,
+                    key=channel.parent.id,
+                    load=lambda: get_pinned_messages(channel=channel.parent))
                 if len(channel_pinned_messages) > 0:
                     channel_pinned_messages_str = "\n".join(channel_pinned_messages)
                     bot_config_prompts += f" # Parent Channel Pinned Messages - \n {channel_pinned_messages_str}\n\n"
         return bot_config_prompts
 
-    async def update_memory_emojis(self,
-                                   context_memory_document: ContextMemoryDocument,
-                                   message: discord.Message):
-
-        memory_message_ids = []
-        if context_memory_document.chat_memory_message_buffer:
-            if context_memory_document.chat_memory_message_buffer.message_buffer:
-
-                for memory_message in context_memory_document.chat_memory_message_buffer.message_buffer:
-                    if "message_id" in memory_message.additional_kwargs.keys():
-                        memory_message_ids.append(memory_message.additional_kwargs["message_id"])
-
-        async def update_message_inner_function(channel: discord.TextChannel, message_id: int):
-
-            message = await channel.fetch_message(message_id)
-            if "💭" not in message.reactions:
-                logger.trace(f"Adding memory emoji to message id: {message.id}")
-                await message.add_reaction("💭")
-
-        current_message_ids = await self._clear_channel_memory_messages_that_arent_in_memory(memory_message_ids,
-                                                                                             message)
+    def update_memory_emojis(self,
+                             memory_message_ids: List[int],
+                             message: discord.Message) -> asyncio.Task:
+        """Tags the channel's messages that are in its memory with 💭 (and untags the rest) in the background"""
+        return self.memory_emoji_reconciler.update(channel=message.channel, memory_message_ids=memory_message_ids)
+
+    async def _load_memory_emoji_message_ids(self, channel: discord.TextChannel) -> List[int]:
+        if self._database_operations is not None:
+            try:
+                message_ids = await self._get_indexed_message_ids(channel=channel, emoji=self._memory_emoji)
+                if message_ids is not None:
+                    return message_ids
+            except Exception as e:
+                logger.error(f"Reaction index lookup failed for channel: {channel.name} - scanning its history instead")
+                logger.exception(e)
+        messages = await self._scan_channel_history_for_emoji(channel=channel, emoji=self._memory_emoji)
+        return [message.id for message in messages]
 
-        emoji_tasks = [
-            asyncio.create_task(update_message_inner_function(channel=message.channel, message_id=memory_message_id))
-            for memory_message_id in memory_message_ids if memory_message_id not in current_message_ids
-        ]
-
-        await asyncio.gather(*emoji_tasks)
-        logger.success(f"Finished updating memory emojis")
+    async def look_for_emoji_reaction_in_channel(self,
+                                                 channel: discord.TextChannel,
+                                                 emoji: str,
+                                                 self_only: bool = False) -> List[discord.Message]:
+        """
+        Messages in `channel` with an `emoji` reaction, newest first. Looked up in the reaction index (so older
+        messages are found too) - or by scanning the last 100 messages when there's no index for this emoji, or the
+        channel's history is still being backfilled into it in the background.
+        """
+        if self._database_operations is None or self_only or emoji not in self._indexed_emojis:
+            return await self._scan_channel_history_for_emoji(channel=channel, emoji=emoji, self_only=self_only)
 
-    async def _clear_channel_memory_messages_that_arent_in_memory(self, memory_message_ids: List[int],
-                                                                  message: discord.Message):
         try:
-            current_memory_messages = await self.look_for_emoji_reaction_in_channel(channel=message.channel,
-                                                                                    emoji="💭")
-            current_message_ids = [message.id for message in current_memory_messages]
-            for current_message_id in current_message_ids:
-                if current_message_id not in memory_message_ids:
-                    logger.trace(f"Removing memory emoji from message id: {current_message_id}")
-                    await message.remove_reaction("💭", self.bot.user)
-                    await message.remove_reaction("💭", message.author)
-                    await message.remove_reaction("❌", self.bot.user)
-                    await message.remove_reaction("❌", message.author)
+            message_ids = await self._get_indexed_message_ids(channel=channel, emoji=emoji)
         except Exception as e:
-            logger.error(f"Error clearing memory messages that aren't in memory")
+            logger.error(f"Reaction index lookup failed for channel: {channel.name} - scanning its history instead")
+            logger.exception(e)
+            return await self._scan_channel_history_for_emoji(channel=channel, emoji=emoji)
+        if message_ids is None:
+            return await self._scan_channel_history_for_emoji(channel=channel, emoji=emoji)
+        return await self._fetch_indexed_messages(channel=channel, message_ids=message_ids)
+
+    async def _get_indexed_message_ids(self, channel: discord.TextChannel, emoji: str) -> Optional[List[int]]:
+        """The indexed message ids (newest first) - None while the channel hasn't been backfilled into the index"""
+        response = await self._database_operations.get_message_reactions(channel_id=channel.id, emoji=emoji)
+        if response.backfilled:
+            return list(reversed(response.message_ids))
+
+        if channel.id not in self._reaction_index_backfills:
+            # scanning a whole channel can take minutes - never make a chat wait for it
+            backfill = asyncio.create_task(self._backfill_reaction_index(channel))
+            self._reaction_index_backfills[channel.id] = backfill
+            backfill.add_done_callback(lambda _: self._reaction_index_backfills.pop(channel.id, None))
+        return None
+
+    async def _backfill_reaction_index(self, channel: discord.TextChannel):
+        """
+        Indexes the reactions on the channel's whole history. The backfill replaces whatever the index had for the
+        channel, so reaction events that arrive while it runs are held back (see `_index_reaction_changes`) and
+        replayed on top of it - except for messages it hadn't paged to yet, whose counts it reads after the event.
+        """
+        logger.info(f"Backfilling reaction index for channel: {channel.name}")
+        self._backfill_held_changes[channel.id] = []
+        self._backfill_oldest_paged_message_ids[channel.id] = None
+        changes = []
+        replayed_changes = []
+        held_before_snapshot = 0
+        success = False
+        try:
+            before = None
+            while True:
+                page = [message async for message in channel.history(limit=100, before=before)]
+                if not page:
+                    break
+                # every event for this message or a newer one from now on happened after its counts were read
+                self._backfill_oldest_paged_message_ids[channel.id] = page[-1].id
+                for message in page:
+                    for reaction in message.reactions:
+                        emoji = str(reaction.emoji)
+                        if emoji not in self._indexed_emojis:
+                            continue
+                        changes.append(MessageReactionChange(server_id=channel.guild.id if channel.guild else None,
+                                                             channel_id=channel.id,
+                                                             message_id=message.id,
+                                                             emoji=emoji,
+                                                             count=reaction.count))
+                if len(page) < 100:
+                    break
+                before = page[-1]
+
+            held_before_snapshot = len(self._backfill_held_changes[channel.id])
+            replayed_changes = [change for change, already_read in
+                                self._backfill_held_changes[channel.id][:held_before_snapshot] if already_read]
+            await self._database_operations.upsert_message_reactions(changes=changes + replayed_changes,
+                                                                     backfilled_channel_id=channel.id)
+            success = True
+        except discord.Forbidden:
+            logger.debug(f"Bot does not have permission to read messages in channel: {channel.name}")
+        except Exception as e:
+            logger.error(f"Error backfilling reaction index for channel: {channel.name}")
+            logger.exception(e)
+        finally:
+            held_changes = self._backfill_held_changes.pop(channel.id)
+            self._backfill_oldest_paged_message_ids.pop(channel.id)
+            # events that arrived while the snapshot was being written go on top of it - and without a snapshot,
+            # every held event still has to reach the index
+            await self._index_reaction_changes([change for change, _ in
+                                                held_changes[held_before_snapshot if success else 0:]])
+        if not success:
+            return
+        logger.success(f"Backfilled {len(changes)} reactions (and replayed {len(replayed_changes)} reaction events) "
+                       f"for channel: {channel.name}")
+
+        # what was loaded from the 100-message scan in the meantime may be missing older messages
+        self._invalidate_bot_config_prompts(channel=channel)
+        self.config_cache.invalidate(kind=MEMORY_MESSAGES, key=channel.id)
+
+    async def _fetch_indexed_messages(self, channel: discord.TextChannel, message_ids: List[int]) -> List[
+        discord.Message]:
+        async def fetch_message(message_id: int) -> Optional[discord.Message]:
+            try:
+                async with self._fetch_slots:
+                    return await channel.fetch_message(message_id)
+            except discord.NotFound:
+                logger.debug(f"Indexed message {message_id} no longer exists - dropping it from the reaction index")
+                await self._index_reaction_changes([MessageReactionChange(channel_id=channel.id,
+                                                                          message_id=message_id)])
+                return None
+
+        messages = await asyncio.gather(*[fetch_message(message_id) for message_id in message_ids])
+        return [message for message in messages if message is not None]
+
+    async def _index_reaction_changes(self, changes: List[MessageReactionChange]):
+        if self._database_operations is None:
+            return
+        changes = [change for change in changes if change.emoji is None or change.emoji in self._indexed_emojis]
+        changes = [change for change in changes if not self._hold_for_backfill(change)]
+        if not changes:
+            return
+        try:
+            await self._database_operations.upsert_message_reactions(changes=changes)
+        except Exception as e:
+            # the reaction itself still gets handled - a channel that misses updates can be re-backfilled
+            logger.error(f"Error updating reaction index: {e}")
             logger.exception(e)
-            raise
-        return current_message_ids
 
-    async def look_for_emoji_reaction_in_channel(self,
-                                                 channel: discord.TextChannel,
-                                                 emoji: str,
-                                                 self_only: bool = False) -> List[discord.Message]:
+    def _hold_for_backfill(self, change: MessageReactionChange) -> bool:
+        """Whether `change` is held back to be replayed after its channel's running backfill (or left to it)"""
+        if change.channel_id not in self._backfill_held_changes:
+            return False
+        oldest_paged_message_id = self._backfill_oldest_paged_message_ids[change.channel_id]
+        # if the backfill hasn't read this message yet, the counts it reads will already include the change
+        already_read = oldest_paged_message_id is not None and change.message_id >= oldest_paged_message_id
+        self._backfill_held_changes[change.channel_id].append((change, already_read))
+        return True
+
+    async def _scan_channel_history_for_emoji(self,
+                                              channel: discord.TextChannel,
+                                              emoji: str,
+                                              self_only: bool = False) -> List[discord.Message]:
         try:
             messages = []
             async for msg in channel.history(limit=100):
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+BOT_CONFIG_PROMPTS = "bot_config_prompts"  # keyed by (guild id, category id)
+PINNED_MESSAGES = "pinned_messages"  # keyed by channel id
+MEMORY_MESSAGES = "memory_messages"  # keyed by channel id
+
+
+class _KindStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.loads = 0
+        self.total_refresh_seconds = 0.0
+
+
+class BotConfigCache:
+    """
+    Event-invalidated cache of the config gathered from Discord for each chat - `bot-config` prompts per guild and
+    category, and pinned messages and 💭 memory messages per channel.
+
+    Nothing expires on a timer: entries stay until a Discord event that could change them (pins updated, a 🤖/💭
+    reaction, a message edited or deleted, a channel created/moved/renamed) invalidates them, and the next request
+    reloads them. Concurrent requests for the same missing entry share one load, and a load that was invalidated
+    while in flight isn't cached (or shared with requests that come after the invalidation). Stats count hits and
+    misses per kind, and estimate the Discord round-trips saved as hits x mean refresh time.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Hashable], Any] = {}
+        self._loading: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        # bumped by every invalidation, so a load that started before one doesn't get cached
+        self._generations: Dict[Tuple[str, Hashable], int] = {}
+        self._stats: Dict[str, _KindStats] = {}
+
+    def _kind_stats(self, kind: str) -> _KindStats:
+        return self._stats.setdefault(kind, _KindStats())
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for kind, kind_stats in self._stats.items():
+            mean_refresh_ms = kind_stats.total_refresh_seconds / kind_stats.loads * 1000 if kind_stats.loads else 0.0
+            lookups = kind_stats.hits + kind_stats.misses
+            stats[kind] = {"hits": kind_stats.hits,
+                           "misses": kind_stats.misses,
+                           "invalidations": kind_stats.invalidations,
+                           "loads": kind_stats.loads,
+                           "hit_rate": kind_stats.hits / lookups if lookups else 0.0,
+                           "mean_refresh_ms": mean_refresh_ms,
+                           "estimated_saved_ms": kind_stats.hits * mean_refresh_ms}
+        return stats
+
+    def __contains__(self, kind_and_key: Tuple[str, Hashable]) -> bool:
+        return kind_and_key in self._entries
+
+    async def get_or_load(self, kind: str, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        entry_key = (kind, key)
+        kind_stats = self._kind_stats(kind)
+        if entry_key in self._entries:
+            kind_stats.hits += 1
+            return self._entries[entry_key]
+
+        kind_stats.misses += 1
+        task = self._loading.get(entry_key)
+        if task is None:
+            task = asyncio.create_task(self._load(entry_key=entry_key, load=load))
+            self._loading[entry_key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, entry_key: Tuple[str, Hashable], load: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generations.get(entry_key, 0)
+        tik = time.perf_counter()
+        try:
+            value = await load()
+        finally:
+            # an invalidation may have already replaced this load with a fresh one
+            if self._loading.get(entry_key) is asyncio.current_task():
+                del self._loading[entry_key]
+        kind_stats = self._kind_stats(entry_key[0])
+        kind_stats.loads += 1
+        kind_stats.total_refresh_seconds += time.perf_counter() - tik
+
+        if self._generations.get(entry_key, 0) == generation:
+            self._entries[entry_key] = value
+        else:
+            logger.trace(f"Not caching {entry_key} - it was invalidated while loading")
+        return value
+
+    def invalidate(self, kind: str, key: Hashable):
+        entry_key = (kind, key)
+        self._generations[entry_key] = self._generations.get(entry_key, 0) + 1
+        # callers after this start a fresh load, rather than joining one that may have read the old state
+        self._loading.pop(entry_key, None)
+        if entry_key in self._entries:
+            del self._entries[entry_key]
+            self._kind_stats(kind).invalidations += 1
+            logger.trace(f"Invalidated {kind} cache entry: {key}")
+
+    def invalidate_where(self, kind: str, matches: Callable[[Hashable], bool]):
+        keys = {key for entry_kind, key in [*self._entries, *self._loading] if entry_kind == kind and matches(key)}
+        for key in keys:
+            self.invalidate(kind=kind, key=key)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+
+
+class ChannelMemoryMessages:
+    """
+    The 💭 memory messages of one channel, keyed by message id - so adding and removing one is O(1) and a message
+    that's reacted to twice is only sent with each chat request once. `documents` is always newest first, however the
+    messages came in (a channel scan, the reaction index, or reaction events).
+    """
+
+    def __init__(self, documents: Iterable[DiscordMessageDocument] = ()):
+        self._documents_by_id: "OrderedDict[int, DiscordMessageDocument]" = OrderedDict()
+        # the newest-first list, rebuilt after the next add/remove
+        self._sorted_documents: Optional[List[DiscordMessageDocument]] = None
+        for document in documents:
+            self.add(document)
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self._documents_by_id
+
+    def __len__(self) -> int:
+        return len(self._documents_by_id)
+
+    @property
+    def message_ids(self) -> List[int]:
+        return [document.message_id for document in self.documents]
+
+    @property
+    def documents(self) -> List[DiscordMessageDocument]:
+        if self._sorted_documents is None:
+            self._sorted_documents = sorted(self._documents_by_id.values(),
+                                            key=lambda document: document.message_id,
+                                            reverse=True)
+        return list(self._sorted_documents)
+
+    def add(self, document: DiscordMessageDocument) -> bool:
+        """Returns False if the message was already there"""
+        if document.message_id in self._documents_by_id:
+            return False
+        self._documents_by_id[document.message_id] = document
+        self._sorted_documents = None
+        return True
+
+    def remove(self, message_id: int) -> bool:
+        """Returns False if the message wasn't there"""
+        if self._documents_by_id.pop(message_id, None) is None:
+            return False
+        self._sorted_documents = None
+        return True
@@ -0,0 +1,220 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import discord
+
+from jonbot.frontends.discord_bot.utilities.rate_limiter import TokenBucketRateLimiter
+from jonbot.system.environment_variables import (
+    DISCORD_REACTIONS_PER_SECOND_PER_CHANNEL,
+    DISCORD_REACTIONS_BURST_PER_CHANNEL,
+    DISCORD_REACTIONS_PER_SECOND_GLOBAL,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+# how long to wait for the gateway event of one of our own reaction changes before forgetting about it
+OWN_CHANGE_EVENT_TIMEOUT_SECONDS = 60
+
+
+class MemoryEmojiReconciler:
+    """
+    Keeps the 💭 reactions in each channel in step with the ids in its context memory, in the background.
+
+    Each channel remembers which of its messages are tagged with 💭 (loaded once, then kept up to date from its own
+    changes and `note_reaction`), so an update only diffs that set against the memory ids and adds/removes the
+    reactions that differ - on partial messages, without fetching anything. One worker per channel applies the
+    changes newest message first, each one waiting for the channel's (and the bot's) reaction budget. Updates that
+    come in while it's working replace the target it's working towards, so only the latest memory gets applied.
+
+    The reaction events of its own changes are claimed by `BotConfigCog` (see `claim_addition`/`claim_removal`), so
+    they don't cost a fetch or a reload of the channel's memory messages.
+    """
+
+    def __init__(self,
+                 bot: discord.Client,
+                 load_tagged_message_ids: Callable[[discord.abc.Messageable], Awaitable[Iterable[int]]],
+                 memory_emoji: str = "💭",
+                 remove_memory_emoji: str = "❌",
+                 reactions_per_second_per_channel: float = DISCORD_REACTIONS_PER_SECOND_PER_CHANNEL,
+                 burst_per_channel: int = DISCORD_REACTIONS_BURST_PER_CHANNEL,
+                 reactions_per_second_global: float = DISCORD_REACTIONS_PER_SECOND_GLOBAL):
+        self.bot = bot
+        self._load_tagged_message_ids = load_tagged_message_ids
+        self._memory_emoji = memory_emoji
+        self._remove_memory_emoji = remove_memory_emoji
+        self.reactions_per_second_per_channel = reactions_per_second_per_channel
+        self.burst_per_channel = burst_per_channel
+        self._global_limiter = TokenBucketRateLimiter(rate_per_second=reactions_per_second_global,
+                                                      burst=max(1, int(reactions_per_second_global)))
+        self._channel_limiters: Dict[int, TokenBucketRateLimiter] = {}
+
+        self._tagged_message_ids: Dict[int, Set[int]] = {}
+        self._target_message_ids: Dict[int, Set[int]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # (channel id, message id, emoji) -> when we added that reaction, until its `on_raw_reaction_add` comes in
+        self._own_additions: Dict[Tuple[int, int, str], float] = {}
+        # (channel id, message id, user id) -> when we removed that 💭, until its `on_raw_reaction_remove` comes in
+        self._own_removals: Dict[Tuple[int, int, int], float] = {}
+        self._stats = {"updates": 0,
+                       "superseded_updates": 0,
+                       "reactions_added": 0,
+                       "reactions_removed": 0,
+                       "failed_changes": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def update(self, channel: discord.abc.Messageable, memory_message_ids: Iterable[int]) -> asyncio.Task:
+        """Makes `memory_message_ids` the channel's 💭 messages - returns the channel's worker, without waiting for it"""
+        self._stats["updates"] += 1
+        if channel.id in self._target_message_ids:
+            self._stats["superseded_updates"] += 1
+        self._target_message_ids[channel.id] = set(memory_message_ids)
+
+        worker = self._workers.get(channel.id)
+        if worker is None or worker.done():
+            worker = asyncio.create_task(self._reconcile(channel))
+            self._workers[channel.id] = worker
+        return worker
+
+    def note_reaction(self, channel_id: int, message_id: int, tagged: bool):
+        """Records a 💭 that was added or removed outside of the reconciler (e.g. by a user)"""
+        tagged_message_ids = self._tagged_message_ids.get(channel_id)
+        if tagged_message_ids is None:
+            return
+        if tagged:
+            tagged_message_ids.add(message_id)
+        else:
+            tagged_message_ids.discard(message_id)
+
+    def claim_addition(self, channel_id: int, message_id: int, emoji: str, user_id: int) -> bool:
+        """Whether an added reaction was one of the reconciler's own (each addition can only be claimed once)"""
+        if self.bot.user is None or user_id != self.bot.user.id:
+            return False
+        return self._claim(self._own_additions, (channel_id, message_id, emoji))
+
+    def claim_removal(self, channel_id: int, message_id: int, user_id: int) -> bool:
+        """Whether a removed 💭 was one of the reconciler's own removals (each removal can only be claimed once)"""
+        return self._claim(self._own_removals, (channel_id, message_id, user_id))
+
+    @staticmethod
+    def _claim(own_changes: Dict[Tuple, float], key: Tuple) -> bool:
+        changed_at = own_changes.pop(key, None)
+        return changed_at is not None and time.monotonic() - changed_at < OWN_CHANGE_EVENT_TIMEOUT_SECONDS
+
+    @staticmethod
+    def _expect_event(own_changes: Dict[Tuple, float], key: Tuple):
+        now = time.monotonic()
+        # changes that don't send an event (e.g. removing a reaction that isn't there) mustn't be held forever
+        for stale_key, changed_at in list(own_changes.items()):
+            if now - changed_at >= OWN_CHANGE_EVENT_TIMEOUT_SECONDS:
+                del own_changes[stale_key]
+        own_changes[key] = now
+
+    async def _reconcile(self, channel: discord.abc.Messageable):
+        try:
+            tagged_message_ids = self._tagged_message_ids.get(channel.id)
+            if tagged_message_ids is None:
+                tagged_message_ids = set(await self._load_tagged_message_ids(channel))
+                self._tagged_message_ids[channel.id] = tagged_message_ids
+
+            while True:
+                target_message_ids = self._target_message_ids[channel.id]
+                message_id = self._next_message_id(target_message_ids - tagged_message_ids)
+                if message_id is not None:
+                    if await self._apply(channel=channel, message_id=message_id, tag=True):
+                        tagged_message_ids.add(message_id)
+                    else:
+                        target_message_ids.discard(message_id)
+                    continue
+
+                message_id = self._next_message_id(tagged_message_ids - target_message_ids)
+                if message_id is not None:
+                    await self._apply(channel=channel, message_id=message_id, tag=False)
+                    tagged_message_ids.discard(message_id)
+                    continue
+
+                del self._target_message_ids[channel.id]
+                logger.trace(f"Memory emojis in channel {channel.id} match its memory")
+                return
+        except Exception as e:
+            self._target_message_ids.pop(channel.id, None)
+            # reload the channel's 💭 messages next time, in case the failure left them out of step
+            self._tagged_message_ids.pop(channel.id, None)
+            logger.error(f"Error reconciling memory emojis in channel: {channel.id}")
+            logger.exception(e)
+        finally:
+            self._workers.pop(channel.id, None)
+
+    @staticmethod
+    def _next_message_id(message_ids: Set[int]) -> Optional[int]:
+        # newest first - those are the ones people are looking at
+        return max(message_ids) if message_ids else None
+
+    async def _apply(self, channel: discord.abc.Messageable, message_id: int, tag: bool) -> bool:
+        partial_message = channel.get_partial_message(message_id)
+        try:
+            if tag:
+                await self._add_reaction(channel_id=channel.id, partial_message=partial_message,
+                                         emoji=self._memory_emoji)
+                try:
+                    # so people can take the message out of memory
+                    await self._add_reaction(channel_id=channel.id, partial_message=partial_message,
+                                             emoji=self._remove_memory_emoji)
+                except discord.HTTPException as e:
+                    logger.warning(f"Couldn't add remove memory emoji on message {message_id}: {e}")
+                return True
+
+            await self._remove_reactions(channel_id=channel.id, partial_message=partial_message, member=self.bot.user)
+            # the author's own 💭 too, if we still have their message (needs the Manage Messages permission)
+            cached_message = self.bot.get_message(message_id)
+            if cached_message is not None and cached_message.author != self.bot.user:
+                try:
+                    await self._remove_reactions(channel_id=channel.id,
+                                                 partial_message=partial_message,
+                                                 member=cached_message.author)
+                except discord.Forbidden:
+                    logger.debug(f"Not allowed to remove {cached_message.author}'s memory emoji on message {message_id}")
+            return True
+        except discord.NotFound:
+            logger.debug(f"Memory message {message_id} no longer exists - skipping its memory emoji")
+        except discord.HTTPException as e:
+            logger.warning(f"Couldn't {'add' if tag else 'remove'} memory emoji on message {message_id}: {e}")
+        self._stats["failed_changes"] += 1
+        return False
+
+    async def _add_reaction(self, channel_id: int, partial_message: discord.PartialMessage, emoji: str):
+        await self._acquire(channel_id)
+        key = (channel_id, partial_message.id, emoji)
+        self._expect_event(self._own_additions, key)
+        try:
+            await partial_message.add_reaction(emoji)
+        except discord.HTTPException:
+            self._own_additions.pop(key, None)
+            raise
+        self._stats["reactions_added"] += 1
+
+    async def _remove_reactions(self, channel_id: int, partial_message: discord.PartialMessage, member):
+        key = (channel_id, partial_message.id, member.id)
+        for emoji in [self._memory_emoji, self._remove_memory_emoji]:
+            await self._acquire(channel_id)
+            if emoji == self._memory_emoji:
+                self._expect_event(self._own_removals, key)
+            try:
+                await partial_message.remove_reaction(emoji, member)
+            except discord.HTTPException:
+                if emoji == self._memory_emoji:
+                    self._own_removals.pop(key, None)
+                raise
+            self._stats["reactions_removed"] += 1
+
+    async def _acquire(self, channel_id: int):
+        if channel_id not in self._channel_limiters:
+            self._channel_limiters[channel_id] = TokenBucketRateLimiter(
+                rate_per_second=self.reactions_per_second_per_channel,
+                burst=self.burst_per_channel)
+        await self._channel_limiters[channel_id].acquire()
+        await self._global_limiter.acquire()
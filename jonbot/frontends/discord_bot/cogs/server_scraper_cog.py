@@ -1,116 +1,114 @@
 import asyncio
 import logging
-from typing import List
+from typing import List, AsyncIterator, Dict, Optional, Set, Union
 
 import discord
 from discord import Forbidden
 from discord.ext import commands
 
 from jonbot.backend.data_layer.models.discord_stuff.discord_chat_document import DiscordChatDocument
+from jonbot.backend.data_layer.models.discord_stuff.scrape_checkpoint import ScrapeCheckpoint
+from jonbot.backend.data_layer.models.timestamp_model import Timestamp
 from jonbot.frontends.discord_bot.operations.discord_database_operations import (
     DiscordDatabaseOperations,
 )
+from jonbot.frontends.discord_bot.utilities.rate_limiter import TokenBucketRateLimiter
+from jonbot.system.environment_variables import (
+    SCRAPER_MAX_CONCURRENT_SCRAPES,
+    SCRAPER_HISTORY_REQUESTS_PER_SECOND,
+    SCRAPER_PROGRESS_UPDATE_INTERVAL_SECONDS,
+    SCRAPER_UPSERT_BATCH_SIZE,
+    SCRAPER_DOWNLOAD_ATTACHMENTS,
+)
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
 
 logging.getLogger("discord").setLevel(logging.INFO)
 
+DISCORD_HISTORY_PAGE_SIZE = 100  # messages per `channel.history` request
+EMBED_DESCRIPTION_MAX_LENGTH = 4096
+
 
 class ServerScraperCog(commands.Cog):
     """A cog for scraping server data and storing it in a MongoDB database."""
 
-    def __init__(self, database_operations: DiscordDatabaseOperations):
+    def __init__(self,
+                 database_operations: DiscordDatabaseOperations,
+                 max_concurrent_scrapes: int = SCRAPER_MAX_CONCURRENT_SCRAPES,
+                 history_requests_per_second: float = SCRAPER_HISTORY_REQUESTS_PER_SECOND,
+                 progress_update_interval_seconds: float = SCRAPER_PROGRESS_UPDATE_INTERVAL_SECONDS,
+                 upsert_batch_size: int = SCRAPER_UPSERT_BATCH_SIZE,
+                 download_attachments: bool = SCRAPER_DOWNLOAD_ATTACHMENTS):
         self._database_operations = database_operations
+        self._max_concurrent_scrapes = max_concurrent_scrapes
+        self._history_rate_limiter = TokenBucketRateLimiter(rate_per_second=history_requests_per_second,
+                                                            burst=max_concurrent_scrapes)
+        self._progress_update_interval_seconds = progress_update_interval_seconds
+        self._upsert_batch_size = upsert_batch_size
+        self._download_attachments = download_attachments
 
     @commands.slash_command(
         name="scrape_server",
         description="Scrape all messages from all channels and threads in the server.",
     )
+    @discord.option(
+        name="full_rescrape",
+        description="Ignore the saved checkpoints and re-scrape every channel from the beginning",
+        input_type=bool,
+        required=False,
+    )
     @commands.has_permissions(administrator=True)
-    async def scrape_server(self, ctx: discord.ApplicationContext):
+    async def scrape_server(self, ctx: discord.ApplicationContext, full_rescrape: bool = False):
         logger.info(f"Received scrape_server command in server: {ctx.guild.name}")
 
         channels = await ctx.guild.fetch_channels()
-        await self._scrape(channels=list(channels), ctx=ctx)
+        await self._scrape(channels=list(channels), ctx=ctx, full_rescrape=full_rescrape)
 
     @commands.slash_command(
         name="scrape_local",
         description="Scrape all messages from invoking thread/channel only.",
     )
+    @discord.option(
+        name="full_rescrape",
+        description="Ignore the saved checkpoints and re-scrape the channel from the beginning",
+        input_type=bool,
+        required=False,
+    )
     @commands.has_permissions(administrator=True)
     async def scrape_messages_from_channel(
             self,
             ctx: discord.ApplicationContext,
+            full_rescrape: bool = False,
     ):
         logger.info(f"Received scrape_local command from channel:  {ctx.channel.name}")
 
         channels = [ctx.channel]
-        await self._scrape(channels=channels, ctx=ctx)
-
-    async def _scrape(self, channels: List[discord.abc.Messageable], ctx: discord.ApplicationContext):
-        upsert_tasks = []
-        reply_embed_title = f"Scraping server: {ctx.guild.name}"
-        reply_embed_description = ""
-        reply_embed = discord.Embed(
-            title=f"Scraping server: {ctx.guild.name}",
-            description=reply_embed_description
-        )
-        reply_message = await ctx.send(
-            embed=reply_embed
-        )
-
-        total_server_messages = 0
-        all_messages = []
-        try:
-            filtered_channels = filter(lambda ch: isinstance(ch, discord.TextChannel), channels)
-            for channel in filtered_channels:
-                logger.info(f"Scraping channel:  {ctx.channel.name}")
-
-                channel_message_count_string = ""
-                total_channel_messages = 0
-                channel_thread_message_count = 0
+        await self._scrape(channels=channels, ctx=ctx, full_rescrape=full_rescrape)
 
-                channel_messages = await self._get_message_list_from_channel(
-                    channel=channel
-                )
-                all_messages.extend(channel_messages)
-                total_channel_messages += len(channel_messages)
+    async def _scrape(self,
+                      channels: List[discord.abc.Messageable],
+                      ctx: discord.ApplicationContext,
+                      full_rescrape: bool = False):
+        progress = ScrapeProgress(title=f"Scraping server: {ctx.guild.name}")
+        reply_message = await ctx.send(embed=progress.to_embed())
+        progress_task = asyncio.create_task(self._report_progress(progress=progress, reply_message=reply_message))
 
-                chat_documents = []
-                for message in channel_messages:
-                    if message.thread is not None:
-                        thread_messages = await self._get_message_list_from_channel(channel=message.thread)
-                        all_messages.extend(thread_messages)
-                        channel_thread_message_count += len(thread_messages)
-                        chat_documents.append(await DiscordChatDocument.build(chat_id=message.thread.id,
-                                                                              parent_message=message,
-                                                                              messages=thread_messages))
-                total_channel_messages += channel_thread_message_count
-                total_server_messages += total_channel_messages
-
-                channel_message_count_string += (f"Channel: {channel}\n"
-                                                 f"{len(channel_messages)} top level messages\n"
-                                                 f"{len(chat_documents)} chats with {channel_thread_message_count} messages\n"
-                                                 f"Total: {len(channel_messages) + channel_thread_message_count}\n"
-                                                 f"-----------------------------\n")
-                reply_embed_description = await self._update_reply_message_embed(
-                    channel_message_count_string=channel_message_count_string,
-                    total_server_messages_count=total_server_messages,
-                    embed_title=reply_embed_title,
-                    embed_message=reply_embed_description,
-                    reply_message=reply_message,
-                    done=False)
-                logger.info(
-                    f"Upserting {len(channel_messages)} channel messages and {len(chat_documents)} chat documents to database...")
-
-                if len(channel_messages) > 0:
-                    upsert_tasks.append(
-                        asyncio.create_task(self._send_messages_to_database(messages_to_upsert=channel_messages)))
-
-                if len(chat_documents) > 0:
-                    upsert_tasks.append(
-                        asyncio.create_task(self._send_chats_to_database(chat_documents=chat_documents)))
+        # Bounds how many channel/thread histories are being walked at once, across the whole scrape
+        semaphore = asyncio.Semaphore(self._max_concurrent_scrapes)
+        try:
+            checkpoints = {}
+            if not full_rescrape:
+                checkpoints = await self._database_operations.get_scrape_checkpoints(server_id=ctx.guild.id)
+                logger.info(f"Resuming from {len(checkpoints)} channel/thread checkpoints")
+            text_channels = [channel for channel in channels if isinstance(channel, discord.TextChannel)]
+            logger.info(f"Scraping {len(text_channels)} channels with up to {self._max_concurrent_scrapes} "
+                        f"concurrent history requests...")
+            await asyncio.gather(*[self._scrape_channel(channel=channel,
+                                                        semaphore=semaphore,
+                                                        progress=progress,
+                                                        checkpoints=checkpoints)
+                                   for channel in text_channels])
 
         except Exception as e:
             await ctx.send(
@@ -123,53 +121,153 @@ class ServerScraperCog(commands.Cog):
             logger.exception(e)
             raise e
         finally:
-            logger.info(f"Awaiting {len(upsert_tasks)} tasks to upsert messages to database...")
-            await asyncio.gather(*upsert_tasks)
-
-            reply_embed_description = await self._update_reply_message_embed(
-                channel_message_count_string="",
-                total_server_messages_count=total_server_messages,
-                embed_title=reply_embed_title,
-                embed_message=reply_embed_description,
-                reply_message=reply_message,
-                done=True)
-            if not len(all_messages) == total_server_messages:
-                raise ValueError("Total messages scraped does not match total messages upserted!")
+            progress.done = True
+            progress_task.cancel()
+            await reply_message.edit(embed=progress.to_embed())
 
+        if progress.upserted_messages != progress.scraped_messages:
+            logger.warning(f"Only {progress.upserted_messages} of the {progress.scraped_messages} scraped messages "
+                           f"were acknowledged by the database")
         logger.success(f"Finished scraping server: {ctx.guild.name}!\n "
-                       f"{reply_embed_description}"
+                       f"{progress.to_embed().description}"
                        )
 
-    async def _update_reply_message_embed(self,
-                                          embed_title: str,
-                                          embed_message: str,
-                                          reply_message: discord.Message,
-                                          channel_message_count_string: str,
-                                          total_server_messages_count: int,
-                                          done: bool) -> str:
-        total_server_messages_string = "======================\nTotal Server Messages:"
-        scraping_next_channel_string = "\n\nScraping next channel..."
-        new_embed_description = embed_message.split(total_server_messages_string)[0]
-        new_embed_description += channel_message_count_string
-
-        new_embed_description += f"{total_server_messages_string} {total_server_messages_count}"
-        if done:
-            new_embed_description += "\n\nDone!"
-        else:
-            new_embed_description += scraping_next_channel_string
-
-        await reply_message.edit(embed=discord.Embed(
-            title=embed_title,
-            description=new_embed_description
-        ))
-        return new_embed_description
+    async def _scrape_channel(self,
+                              channel: discord.TextChannel,
+                              semaphore: asyncio.Semaphore,
+                              progress: "ScrapeProgress",
+                              checkpoints: Dict[int, ScrapeCheckpoint]):
+        logger.info(f"Scraping channel:  {channel.name}")
+        checkpoint = checkpoints.get(channel.id)
+        channel_message_count = 0
+        thread_tasks = {}
+
+        def queue_thread_scrape(parent_message: discord.Message):
+            # thread scrapes queue on the same semaphore, and are only awaited once this channel's slot is released
+            thread_tasks[parent_message.thread.id] = asyncio.create_task(
+                self._scrape_thread(parent_message=parent_message,
+                                    semaphore=semaphore,
+                                    progress=progress,
+                                    checkpoint=checkpoints.get(parent_message.thread.id)))
+
+        async with semaphore:
+            async for message_batch in self._iterate_message_batches(
+                    channel=channel,
+                    after_message_id=checkpoint.last_message_id if checkpoint is not None else None):
+                progress.scraped_messages += len(message_batch)
+                channel_message_count += len(message_batch)
+                for message in message_batch:
+                    if message.thread is not None:
+                        queue_thread_scrape(parent_message=message)
+                if await self._send_messages_to_database(messages_to_upsert=message_batch):
+                    progress.upserted_messages += len(message_batch)
+                await self._save_checkpoint(channel=channel, last_message_id=message_batch[-1].id)
+
+            if checkpoint is not None:
+                # Threads under messages from before the checkpoint won't show up in the history walk above
+                async for parent_message in self._iterate_updated_thread_parents(channel=channel,
+                                                                                 checkpoints=checkpoints,
+                                                                                 exclude_thread_ids=set(thread_tasks)):
+                    queue_thread_scrape(parent_message=parent_message)
+
+        thread_message_counts = await asyncio.gather(*thread_tasks.values())
+
+        chat_count = len([count for count in thread_message_counts if count > 0])
+        progress.add_channel_summary(f"Channel: {channel}\n"
+                                     f"{channel_message_count} {'new ' if checkpoint else ''}top level messages\n"
+                                     f"{chat_count} chats with {sum(thread_message_counts)} messages\n"
+                                     f"Total: {channel_message_count + sum(thread_message_counts)}\n"
+                                     f"-----------------------------\n")
+
+    async def _scrape_thread(self,
+                             parent_message: discord.Message,
+                             semaphore: asyncio.Semaphore,
+                             progress: "ScrapeProgress",
+                             checkpoint: Optional[ScrapeCheckpoint] = None) -> int:
+        thread = parent_message.thread
+        if checkpoint is not None and thread.last_message_id is not None \
+                and thread.last_message_id <= checkpoint.last_message_id:
+            progress.unchanged_threads += 1
+            return 0
+
+        # The chat document is built from the whole thread, so (unlike channels) a thread is re-read in full and
+        # held until it's done - only the messages after the checkpoint are new raw messages though
+        thread_messages = []
+        new_message_count = 0
+        async with semaphore:
+            async for message_batch in self._iterate_message_batches(channel=thread):
+                thread_messages.extend(message_batch)
+                new_messages = [message for message in message_batch
+                                if checkpoint is None or message.id > checkpoint.last_message_id]
+                if len(new_messages) == 0:
+                    continue
+                progress.scraped_messages += len(new_messages)
+                new_message_count += len(new_messages)
+                if await self._send_messages_to_database(messages_to_upsert=new_messages):
+                    progress.upserted_messages += len(new_messages)
+
+        if new_message_count == 0:
+            return 0
+
+        chat_document = await DiscordChatDocument.build(chat_id=thread.id,
+                                                        parent_message=parent_message,
+                                                        messages=thread_messages,
+                                                        download_attachments=self._download_attachments)
+        await self._send_chats_to_database(chat_documents=[chat_document])
+        await self._save_checkpoint(channel=thread, last_message_id=thread_messages[-1].id)
+        progress.chats += 1
+        return new_message_count
+
+    async def _iterate_updated_thread_parents(self,
+                                              channel: discord.TextChannel,
+                                              checkpoints: Dict[int, ScrapeCheckpoint],
+                                              exclude_thread_ids: Set[int]) -> AsyncIterator[discord.Message]:
+        """The starter messages of the channel's threads that have messages newer than their checkpoint"""
+        await self._history_rate_limiter.acquire()
+        threads = list(channel.threads)
+        try:
+            async for thread in channel.archived_threads(limit=None):
+                threads.append(thread)
+        except Forbidden:
+            logger.warning(f"Missing permissions to list archived threads in channel: {channel}")
+
+        for thread in threads:
+            if thread.id in exclude_thread_ids or thread.last_message_id is None:
+                continue
+            checkpoint = checkpoints.get(thread.id)
+            if checkpoint is not None and thread.last_message_id <= checkpoint.last_message_id:
+                continue
+            try:
+                await self._history_rate_limiter.acquire()
+                # a thread started from a message shares that message's id
+                yield await channel.fetch_message(thread.id)
+            except discord.NotFound:
+                logger.warning(f"Skipping thread: {thread} - its starter message was deleted")
+
+    async def _save_checkpoint(self, channel: Union[discord.TextChannel, discord.Thread], last_message_id: int):
+        await self._database_operations.upsert_scrape_checkpoint(
+            checkpoint=ScrapeCheckpoint(server_id=channel.guild.id,
+                                        channel_id=channel.id,
+                                        parent_channel_id=channel.parent_id if isinstance(channel,
+                                                                                          discord.Thread) else None,
+                                        last_message_id=last_message_id,
+                                        updated_at=Timestamp.now()))
+
+    async def _report_progress(self, progress: "ScrapeProgress", reply_message: discord.Message):
+        while True:
+            await asyncio.sleep(self._progress_update_interval_seconds)
+            try:
+                await reply_message.edit(embed=progress.to_embed())
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to update scrape progress embed - {e}")
 
     async def _send_messages_to_database(
             self, messages_to_upsert: List[discord.Message]
     ) -> bool:
         logger.info(f"Sending {len(messages_to_upsert)} messages to database...")
         return await self._database_operations.upsert_messages(
-            messages=messages_to_upsert
+            messages=messages_to_upsert,
+            download_attachments=self._download_attachments,
         )
 
     async def _send_chats_to_database(
@@ -180,17 +278,77 @@ class ServerScraperCog(commands.Cog):
             chat_documents=chat_documents
         )
 
-    async def _get_message_list_from_channel(
-            self, channel: discord.abc.Messageable
-    ) -> List[discord.Message]:
-        channel_messages = []
+    async def _iterate_message_batches(
+            self, channel: discord.abc.Messageable, after_message_id: int = None
+    ) -> AsyncIterator[List[discord.Message]]:
+        """
+        Page through a channel's history (oldest first, starting after `after_message_id` if given), yielding
+        batches of at most `self._upsert_batch_size`
+        """
+        message_batch = []
+        last_message = discord.Object(id=after_message_id) if after_message_id is not None else None
+        message_count = 0
         try:
             logger.info(f"Scraping channel: {channel}")
-            async for message in channel.history(limit=None, oldest_first=True):
-                channel_messages.append(message)
-            logger.info(f"Scraped {len(channel_messages)} messages from channel: {channel}")
+            while True:
+                try:
+                    await self._history_rate_limiter.acquire()
+                    async for message in channel.history(limit=None, oldest_first=True, after=last_message):
+                        message_batch.append(message)
+                        last_message = message
+                        message_count += 1
+                        if len(message_batch) >= self._upsert_batch_size:
+                            yield message_batch
+                            message_batch = []
+                        if message_count % DISCORD_HISTORY_PAGE_SIZE == 0:
+                            await self._history_rate_limiter.acquire()  # the next iteration fetches the next page
+                    break
+                except Forbidden:
+                    raise
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        raise
+                    retry_after = float(e.response.headers.get("Retry-After", 1.0))
+                    logger.warning(f"Rate limited while scraping channel: {channel} - retrying in {retry_after}s")
+                    self._history_rate_limiter.pause(retry_after)
+            logger.info(f"Scraped {message_count} messages from channel: {channel}")
 
         except Forbidden:
             logger.warning(f"Missing permissions to scrape channel: {channel}")
 
-        return channel_messages
+        if message_batch:
+            yield message_batch
+
+
+class ScrapeProgress:
+    """Running totals for a scrape, rendered into the (periodically edited) reply embed"""
+
+    def __init__(self, title: str):
+        self.title = title
+        self.scraped_messages = 0
+        self.upserted_messages = 0
+        self.chats = 0
+        self.unchanged_threads = 0
+        self.done = False
+        self._channel_summaries: List[str] = []
+
+    def add_channel_summary(self, channel_summary: str):
+        self._channel_summaries.append(channel_summary)
+
+    def to_embed(self) -> discord.Embed:
+        totals = (f"======================\n"
+                  f"Total Server Messages: {self.scraped_messages} "
+                  f"({self.upserted_messages} saved, {self.chats} chats, "
+                  f"{self.unchanged_threads} unchanged threads skipped)")
+        totals += "\n\nDone!" if self.done else "\n\nScraping..."
+
+        # embed descriptions are capped, so the oldest channel summaries are dropped first
+        channel_summaries = []
+        length = len(totals)
+        for channel_summary in reversed(self._channel_summaries):
+            length += len(channel_summary)
+            if length > EMBED_DESCRIPTION_MAX_LENGTH:
+                break
+            channel_summaries.insert(0, channel_summary)
+
+        return discord.Embed(title=self.title, description="".join(channel_summaries) + totals)
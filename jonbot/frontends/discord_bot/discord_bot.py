@@ -1,17 +1,20 @@
+import asyncio
 import traceback
 from pathlib import Path
-from typing import List, Union, Dict
+from typing import Coroutine, List, Set, Union, Dict
 
 import discord
 from discord.ext import commands
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
 
 from jonbot.api_interface.api_client.api_client import ApiClient
 from jonbot.api_interface.api_client.get_or_create_api_client import (
     get_or_create_api_client,
 )
 from jonbot.api_interface.api_routes import CHAT_ENDPOINT, VOICE_TO_TEXT_ENDPOINT, IMAGE_CHAT_ENDPOINT
+from jonbot.backend.data_layer.analysis.student_interest_prompt_cache import (
+    StudentInterestPromptCache,
+    get_or_create_student_interest_prompt_cache,
+)
 from jonbot.backend.data_layer.models.conversation_models import ChatRequest, ChatRequestConfig, ImageChatRequest
 from jonbot.backend.data_layer.models.discord_stuff.environment_config.discord_environment import (
     DiscordEnvironmentConfig,
@@ -19,6 +22,7 @@ from jonbot.backend.data_layer.models.discord_stuff.environment_config.discord_e
 from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
 from jonbot.backend.data_layer.models.voice_to_text_request import VoiceToTextRequest
 from jonbot.frontends.discord_bot.cogs.bot_config_cog.bot_config_cog import BotConfigCog
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.channel_memory_messages import ChannelMemoryMessages
 from jonbot.frontends.discord_bot.cogs.chat_cog import ChatCog
 from jonbot.frontends.discord_bot.cogs.daily_message_cog import DailyMessageCog
 from jonbot.frontends.discord_bot.cogs.dm_cog import DMCog
@@ -27,11 +31,12 @@ from jonbot.frontends.discord_bot.cogs.experimental.pycord_pages_example_cog imp
 from jonbot.frontends.discord_bot.cogs.image_generation_cog import ImageGeneratorCog
 from jonbot.frontends.discord_bot.cogs.server_scraper_cog import ServerScraperCog
 from jonbot.frontends.discord_bot.cogs.vector_search_cog import VectorSearchCog
+from jonbot.frontends.discord_bot.handlers.chat_request_scheduler import ChatRequestScheduler
 from jonbot.frontends.discord_bot.handlers.discord_message_responder import (
     DiscordMessageResponder,
 )
 from jonbot.frontends.discord_bot.handlers.should_process_message import (
-    should_reply, ERROR_MESSAGE_REPLY_PREFIX_TEXT,
+    should_reply, ERROR_MESSAGE_REPLY_PREFIX_TEXT, bot_mentioned_in_message,
 )
 from jonbot.frontends.discord_bot.operations.discord_database_operations import (
     DiscordDatabaseOperations,
@@ -75,32 +80,17 @@ The course promotes interdisciplinary collaboration and introduces modern techni
 """
 
 
-def create_simple_summary_chain():
-    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo-16k")
-    prompt = ChatPromptTemplate.from_template("Summarize this text: {text}")
-    chain = prompt | llm
-    return chain
-
-
-def get_private_message_prompts(user_id: int) -> str:
-    student_interests_base_path = Path(
-        __file__).parent.parent.parent / "backend" / "data_layer" / "student_interests" / "organized_results"
-    file_name = f"student_{user_id}_interests_organized.md"
-    student_topics_file_path = student_interests_base_path / file_name
-    dm_config = f"{BASE_CLASSBOT_PROMPT}\n\n"
-    if not student_topics_file_path.is_file():
+def get_private_message_prompts(user_id: int, student_interest_prompts: StudentInterestPromptCache) -> str:
+    interests = student_interest_prompts.get_interests(student_id=user_id)
+    if interests is None:
         logger.error(f"Cannot find topics file for this user: {user_id}...")
         return ""
 
-    with open(student_topics_file_path, "r") as file:
-        content = file.read()
-        chain = create_simple_summary_chain()
-        summarized_text = chain.invoke({"text": content})
-        dm_config += (f"\n\nThis student has expressed interests in these topics: "
-                      f"\n\n {summarized_text} "
-                      f"\n\n Check in with them about how they are doing,"
-                      f" how the class has been going for them")
-        return dm_config
+    return (f"{BASE_CLASSBOT_PROMPT}\n\n"
+            f"\n\nThis student has expressed interests in these topics: "
+            f"\n\n {interests} "
+            f"\n\n Check in with them about how they are doing,"
+            f" how the class has been going for them")
 
 
 class MyDiscordBot(commands.Bot):
@@ -111,9 +101,7 @@ class MyDiscordBot(commands.Bot):
             **kwargs,
     ):
         super().__init__(**kwargs)
-        self.config_messages_by_guild_id = {}
-        self.pinned_messages_by_channel_id = {}
-        self.memory_messages_by_channel_id = {}
+        self.memory_messages_by_channel_id: Dict[int, ChannelMemoryMessages] = {}
         self.local_message_prefix = ""
         if environment_config.IS_LOCAL:
             self.local_message_prefix = (
@@ -125,12 +113,17 @@ class MyDiscordBot(commands.Bot):
         self._database_operations = DiscordDatabaseOperations(
             api_client=api_client, database_name=self._database_name
         )
+        self._chat_request_scheduler = ChatRequestScheduler()
+        # channel id -> newest context memory version whose emojis have been applied
+        self._memory_versions_by_channel_id: Dict[int, int] = {}
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._student_interest_prompts = get_or_create_student_interest_prompt_cache()
 
         self._chat_cog = ChatCog(bot=self)
         self._dm_cog = DMCog(bot=self)
         self._dump_chat_cog = DumpChatCog(bot=self)
         self._server_scraping_cog = ServerScraperCog(database_operations=self._database_operations)
-        self._bot_config_cog = BotConfigCog(bot=self)
+        self._bot_config_cog = BotConfigCog(bot=self, database_operations=self._database_operations)
         self._vector_search_cog = VectorSearchCog(bot=self,
                                                   database_name=self._database_name,
                                                   persistence_directory=f"{environment_config.BOT_NICK_NAME}_vector_store_persistence", )
@@ -162,6 +155,11 @@ class MyDiscordBot(commands.Bot):
 
         print_pretty_startup_message_in_terminal(self.user.name)
 
+    async def close(self):
+        logger.info(f"Shutting down bot: {self.user}")
+        await self._api_client.close()
+        await super().close()
+
     @discord.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         if not message.system_content == message.content:
@@ -263,27 +261,36 @@ class MyDiscordBot(commands.Bot):
             message: discord.Message,
             respond_to_this_text: str,
     ) -> List[discord.Message]:
+        scheduler_slot_acquired = False
         try:
+            config_prompts = ""
             if hasattr(message.channel, "category"):
                 if not message.channel.category.id in [1176532527977082931, 1176526146842665031]:
-                    await self._bot_config_cog.gather_config_messages(channel=message.channel)
+                    config_prompts = await self._bot_config_cog.gather_config_messages(channel=message.channel)
 
             message_responder = DiscordMessageResponder(message_prefix=self.local_message_prefix,
                                                         bot_name=self.user.name, )
             await message_responder.initialize(message=message)
             reply_messages = await message_responder.get_reply_messages()
 
-            config_prompts = []
-            if hasattr(message, "guild") and message.guild is not None:
-                config_prompts = self.config_messages_by_guild_id.get(message.guild.id, {})
+            await self._chat_request_scheduler.acquire(
+                channel_id=message.channel.id,
+                user_id=message.author.id,
+                high_priority=str(message.channel.type).lower() == "private" or bot_mentioned_in_message(
+                    message=message, bot_id=self.user.id, bot_user_name=self.user.name),
+                on_queue_position_changed=message_responder.show_queue_position,
+            )
+            scheduler_slot_acquired = True
 
             if str(message.channel.type).lower() == "private":
                 if "classbot" in self._database_name or "jonbot" in self._database_name:
-                    config_prompts = get_private_message_prompts(message.author.id)
+                    config_prompts = get_private_message_prompts(
+                        user_id=message.author.id,
+                        student_interest_prompts=self._student_interest_prompts)
 
-            memory_messages = self.memory_messages_by_channel_id.get(message.channel.id, [])
+            memory_messages = self.memory_messages_by_channel_id.get(message.channel.id, ChannelMemoryMessages())
             config = ChatRequestConfig(config_prompts=config_prompts if len(config_prompts) > 0 else "",
-                                       memory_messages=memory_messages)
+                                       memory_messages=memory_messages.documents)
 
             if not "classbot" in self._database_name:
                 config.model_name = "gpt-4-1106-preview"
@@ -314,19 +321,21 @@ class MyDiscordBot(commands.Bot):
                         response = await self._api_client.send_request_to_api(
                             endpoint_name=IMAGE_CHAT_ENDPOINT,
                             data=chat_request.dict(),
+                            routing_key=chat_request.context_route.route_id,
                         )
                         await message.reply(content=response["content"])
                         await message_responder.shutdown()
-                        await self._update_memory_emojis(message=message)
 
                         return await message_responder.get_reply_messages()
 
 
+            memory_update = None
             try:
-                response_tokens = await self._api_client.send_request_to_api_streaming(
+                memory_update = await self._api_client.send_request_to_api_streaming(
                     endpoint_name=CHAT_ENDPOINT,
                     data=chat_request.dict(),
                     callbacks=[callback],
+                    routing_key=chat_request.context_route.route_id,
                 )
             except Exception as e:
                 await message_responder.add_token_to_queue(
@@ -335,7 +344,9 @@ class MyDiscordBot(commands.Bot):
 
 
             await message_responder.shutdown()
-            await self._update_memory_emojis(message=message)
+            if memory_update is not None:
+                # the memory emojis can catch up after the reply is done
+                self._run_in_background(self._update_memory_emojis(message=message, memory_update=memory_update))
 
             return await message_responder.get_reply_messages()
 
@@ -344,6 +355,9 @@ class MyDiscordBot(commands.Bot):
         except Exception as e:
             logger.exception(f"Error occurred while handling text message: {str(e)}")
             raise
+        finally:
+            if scheduler_slot_acquired:
+                self._chat_request_scheduler.release()
 
 
     async def handle_audio_message(self, message: discord.Message) -> Dict[str, Union[str, List[discord.Message]]]:
@@ -414,18 +428,36 @@ class MyDiscordBot(commands.Bot):
         return {"transcription_text": transcription_text,
                 "transcriptions_messages": transcriptions_messages}
 
-    async def _update_memory_emojis(self, message: discord.Message):
+    async def _update_memory_emojis(self, message: discord.Message, memory_update: dict):
         try:
             logger.debug(f"Updating memory emojis for message: {message.content}")
-            response = await self._database_operations.get_context_memory_document(message=message)
-            context_memory_document = ContextMemoryDocument(**response)
-
-            await self._bot_config_cog.update_memory_emojis(context_memory_document=context_memory_document,
-                                                            message=message)
+            if "memory_message_ids" not in memory_update:
+                # the API couldn't send the memory with the reply - fetch it instead
+                response = await self._database_operations.get_context_memory_document(message=message)
+                if not response:
+                    return
+                context_memory_document = ContextMemoryDocument(**response)
+                memory_update = {"memory_message_ids": context_memory_document.memory_message_ids,
+                                 "memory_version": context_memory_document.version}
+
+            memory_version = memory_update.get("memory_version", 0)
+            if memory_version < self._memory_versions_by_channel_id.get(message.channel.id, 0):
+                logger.debug(f"Skipping stale memory emoji update (version {memory_version}) for message: {message.id}")
+                return
+            self._memory_versions_by_channel_id[message.channel.id] = memory_version
+
+            self._bot_config_cog.update_memory_emojis(memory_message_ids=memory_update["memory_message_ids"],
+                                                      message=message)
         except Exception as e:
             logger.error(f"Error updating memory emojis for message: {message.content}")
             logger.exception(e)
-            raise
+
+    def _run_in_background(self, coroutine: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        # hold on to the task until it's done, so it doesn't get garbage collected mid-run
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
     async def send_error_response(self, exception: Exception, message: discord.Message):
         home_path_str = str(Path().home())
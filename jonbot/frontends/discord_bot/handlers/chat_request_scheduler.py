@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from jonbot.system.environment_variables import CHAT_SCHEDULER_MAX_CONCURRENT_REQUESTS
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+HIGH_PRIORITY = 0
+NORMAL_PRIORITY = 1
+
+QueuePositionCallback = Callable[[Optional[int]], None]
+
+
+class _ScheduledChatRequest:
+    def __init__(self, channel_id: int, user_id: int, priority: int, on_queue_position_changed: QueuePositionCallback):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.priority = priority
+        self.on_queue_position_changed = on_queue_position_changed
+        self.granted = asyncio.get_running_loop().create_future()
+        self.queue_position: Optional[int] = None
+        self.enqueued_at = time.perf_counter()
+
+
+class ChatRequestScheduler:
+    """
+    Caps how many chat requests are streaming at once, queueing the rest fairly.
+
+    Waiting requests are served high priority (DMs, mentions) first, then round-robin across channels, and within a
+    channel round-robin across users - so one busy channel (or one chatty user) can't starve everyone else.
+    Callers get told their (1-based) place in line whenever it changes, and `None` once they're let through.
+    """
+
+    def __init__(self, max_concurrent_requests: int = CHAT_SCHEDULER_MAX_CONCURRENT_REQUESTS):
+        self.max_concurrent_requests = max_concurrent_requests
+        self._in_flight = 0
+        # priority -> channel id -> user id -> that user's waiting requests (the OrderedDicts are rotated round-robin)
+        self._queues: Dict[int, "OrderedDict[int, OrderedDict[int, Deque[_ScheduledChatRequest]]]"] = {
+            HIGH_PRIORITY: OrderedDict(),
+            NORMAL_PRIORITY: OrderedDict(),
+        }
+        self._queued = 0
+        self.granted = 0
+        self.max_queue_depth = 0
+        self._total_wait_seconds = 0.0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {"in_flight": self._in_flight,
+                "queued": self._queued,
+                "granted": self.granted,
+                "max_queue_depth": self.max_queue_depth,
+                "mean_wait_ms": self._total_wait_seconds / self.granted * 1000 if self.granted else 0.0}
+
+    async def acquire(self,
+                      channel_id: int,
+                      user_id: int,
+                      high_priority: bool = False,
+                      on_queue_position_changed: QueuePositionCallback = None):
+        """Wait for a slot - every successful `acquire` must be paired with a `release`"""
+        request = _ScheduledChatRequest(channel_id=channel_id,
+                                        user_id=user_id,
+                                        priority=HIGH_PRIORITY if high_priority else NORMAL_PRIORITY,
+                                        on_queue_position_changed=on_queue_position_changed)
+        self._enqueue(request)
+        self._dispatch()
+        try:
+            await request.granted
+        except asyncio.CancelledError:
+            if request.granted.done() and not request.granted.cancelled():
+                self.release()
+            else:
+                self._remove(request)
+                self._update_queue_positions()
+            raise
+
+    def release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _enqueue(self, request: _ScheduledChatRequest):
+        channels = self._queues[request.priority]
+        users = channels.setdefault(request.channel_id, OrderedDict())
+        users.setdefault(request.user_id, deque()).append(request)
+        self._queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queued)
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrent_requests and self._queued > 0:
+            request = self._pop_next(self._queues)
+            self._queued -= 1
+            self._in_flight += 1
+            self.granted += 1
+            self._total_wait_seconds += time.perf_counter() - request.enqueued_at
+            request.granted.set_result(True)
+            if request.queue_position is not None:
+                self._notify(request, None)
+        self._update_queue_positions()
+
+    @staticmethod
+    def _pop_next(queues) -> _ScheduledChatRequest:
+        for priority in (HIGH_PRIORITY, NORMAL_PRIORITY):
+            channels = queues[priority]
+            if not channels:
+                continue
+            channel_id, users = next(iter(channels.items()))
+            user_id, requests = next(iter(users.items()))
+            request = requests.popleft()
+
+            # rotate this user, then this channel, to the back of the line
+            if requests:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            if users:
+                channels.move_to_end(channel_id)
+            else:
+                del channels[channel_id]
+            return request
+        raise IndexError("No chat requests are waiting")
+
+    def _update_queue_positions(self):
+        for position, request in enumerate(self._dispatch_order(), start=1):
+            if request.queue_position != position:
+                self._notify(request, position)
+
+    def _dispatch_order(self) -> List[_ScheduledChatRequest]:
+        # replay `_pop_next` on a copy of the queues
+        queues = {priority: OrderedDict((channel_id, OrderedDict((user_id, deque(requests))
+                                                                 for user_id, requests in users.items()))
+                                        for channel_id, users in channels.items())
+                  for priority, channels in self._queues.items()}
+        return [self._pop_next(queues) for _ in range(self._queued)]
+
+    def _remove(self, request: _ScheduledChatRequest):
+        channels = self._queues[request.priority]
+        users = channels.get(request.channel_id, {})
+        requests = users.get(request.user_id)
+        if requests is None or request not in requests:
+            return
+        requests.remove(request)
+        self._queued -= 1
+        if not requests:
+            del users[request.user_id]
+        if not users:
+            del channels[request.channel_id]
+
+    @staticmethod
+    def _notify(request: _ScheduledChatRequest, position: Optional[int]):
+        request.queue_position = position
+        if request.on_queue_position_changed is None:
+            return
+        try:
+            request.on_queue_position_changed(position)
+        except Exception as e:
+            logger.warning(f"Failed to report queue position {position} for chat request - {e}")
@@ -2,22 +2,26 @@ import asyncio
 import tempfile
 import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import discord
 
 from jonbot.frontends.discord_bot.handlers.should_process_message import (
     RESPONSE_INCOMING_TEXT,
 )
+from jonbot.frontends.discord_bot.utilities.edit_rate_budget import EditRateBudget, get_or_create_edit_rate_budget
+from jonbot.system.environment_variables import RESPONDER_EDIT_INTERVAL_SECONDS
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
 
-STOP_STREAMING_TOKEN = "STOP_STREAMING"
-
 
 class DiscordMessageResponder:
-    def __init__(self, message_prefix: str = "", bot_name: str = None):
+    def __init__(self,
+                 message_prefix: str = "",
+                 bot_name: str = None,
+                 edit_interval_seconds: float = RESPONDER_EDIT_INTERVAL_SECONDS,
+                 edit_rate_budget: EditRateBudget = None):
         self.message_prefix: str = message_prefix
         self._bot_name = bot_name
         self.message_content: str = ""
@@ -28,7 +32,17 @@ class DiscordMessageResponder:
         self.comfy_message_length: int = int(self.max_message_length * 0.8)
         self.done: bool = False
 
-        self._token_queue = asyncio.Queue()
+        # Streamed tokens are buffered here, and the render loop wakes up when `_tokens_available` is set
+        self._pending_tokens: List[str] = []
+        self._tokens_available = asyncio.Event()
+        self._edit_interval_seconds = edit_interval_seconds
+        self._edit_rate_budget = edit_rate_budget or get_or_create_edit_rate_budget()
+        self._last_render_time = 0.0
+        self._edit_budget_reserved = False
+        self.edit_count: int = 0
+        self._placeholder_text: str = RESPONSE_INCOMING_TEXT
+        self._shown_placeholder_text: str = RESPONSE_INCOMING_TEXT
+        self._placeholder_task: Optional[asyncio.Task] = None
         self.loop_task = None
         self._previous_timestamp = time.perf_counter()
 
@@ -42,52 +56,71 @@ class DiscordMessageResponder:
             initial_message_content: str = RESPONSE_INCOMING_TEXT,
     ):
         logger.info(f"initializing reply to message: `{message.id}`")
+        self._placeholder_text = self._shown_placeholder_text = initial_message_content
         self._reply_message = await message.reply(initial_message_content)
         logger.debug(f"initialized reply to message: `{message.id}`")
         self.loop_task = asyncio.create_task(
             self._run_token_queue_loop()
         )  # Start the queue loop
 
+    def show_queue_position(self, position: Optional[int]):
+        """Show the reply's place in the chat request queue in the placeholder (`None` once it's being answered)"""
+        self._placeholder_text = RESPONSE_INCOMING_TEXT if position is None \
+            else f"{RESPONSE_INCOMING_TEXT} (#{position} in line)"
+        if self._placeholder_task is None or self._placeholder_task.done():
+            self._placeholder_task = asyncio.create_task(self._render_placeholder())
+
+    async def _render_placeholder(self):
+        # only the latest position matters, and the placeholder is left alone once the real reply starts streaming
+        while self._shown_placeholder_text != self._placeholder_text and self.message_content == "":
+            placeholder_text = self._placeholder_text
+            await self._edit_rate_budget.acquire(channel_id=self._reply_message.channel.id)
+            if self.message_content != "":
+                # the reply started streaming while we waited for the budget
+                break
+            await self._reply_message.edit(content=placeholder_text)
+            self.edit_count += 1
+            self._shown_placeholder_text = placeholder_text
+
     async def add_token_to_queue(self, token: str):
         logger.trace(
-            f"FRONTEND - adding token to queue: {repr(token)}, token_queue size: {self._token_queue.qsize()}"
+            f"FRONTEND - adding token to queue: {repr(token)}, pending tokens: {len(self._pending_tokens)}"
         )
-        await self._token_queue.put(token)
+        self._pending_tokens.append(token)
+        self._tokens_available.set()
+
+    async def _run_token_queue_loop(self):
+        """
+        Render buffered tokens into the reply - at most one edit per `edit_interval_seconds` (and within the shared
+        edit budget), with everything that arrived in the meantime coalesced into that edit
+        """
+        while True:
+            await self._tokens_available.wait()
 
-    async def _run_token_queue_loop(self, base_delay: float = 0.5, chunk_size: int = 20):
-        chunk = []
-        delay = base_delay
+            wait_seconds = self._last_render_time + self._edit_interval_seconds - time.perf_counter()
+            if wait_seconds > 0 and not self.done:
+                await asyncio.sleep(wait_seconds)
+
+            # reserve the next edit before draining, so the edit shows every token that arrived while we waited for it
+            # (and don't spend the budget when there's nothing to render, e.g. the wake-up on shutdown)
+            if any(self._pending_tokens):
+                await self._edit_rate_budget.acquire(channel_id=self._reply_message.channel.id)
+                self._edit_budget_reserved = True
+
+            self._tokens_available.clear()
+            chunk = "".join(self._pending_tokens)
+            self._pending_tokens = []
+            self._last_render_time = time.perf_counter()
+            if chunk:
+                logger.trace(f"FRONTEND - rendering {len(chunk)} characters into reply message")
+                await self.add_text_to_reply_message(chunk)
+
+            if self.done and not self._pending_tokens:
+                break
 
-        while True:
-            await asyncio.sleep(delay)
-            delay *= 1.2
-            if self._token_queue.empty():
-                logger.trace(
-                    f"FRONTEND - token_queue is empty, waiting {delay:.2f} seconds"
-                )
-                await asyncio.sleep(base_delay)
-                if self.done:
-                    logger.trace(
-                        f"FRONTEND - self.done is True and token_queue is empty, breaking token_queue_loop!"
-                    )
-                    break
-            else:
-                delay = base_delay
-                while not self._token_queue.empty():
-                    token = await self._token_queue.get()
-                    chunk.append(token)
-                    logger.trace(
-                        f"FRONTEND - de-queueing  token: {repr(token)} (token_queue size: {self._token_queue.qsize()})"
-                    )
-                if len(chunk) > chunk_size:
-                    await self.add_text_to_reply_message("".join(chunk))
-                    chunk = []
-
-        logger.trace(f"Appending final chunk to reply message {chunk}...")
-        await self.add_text_to_reply_message("".join(chunk))
         if len(self._reply_messages) > 1:
             await self._send_full_text_as_attachment()
-        logger.info(f"queue loop finished")
+        logger.info(f"queue loop finished - {self.edit_count} edits")
 
     async def add_text_to_reply_message(self, chunk: str, show_delta_t: bool = False):
         start_string_to_remove = f"{self._bot_name}:"
@@ -96,12 +129,6 @@ class DiscordMessageResponder:
             chunk = chunk.replace(f"{self._bot_name}:", "")
 
         self._full_message_content += chunk
-        stop_now = False
-        if STOP_STREAMING_TOKEN in chunk:
-            logger.debug(f"Recieved `{STOP_STREAMING_TOKEN}`, stopping stream...")
-            stop_now = True
-            chunk = chunk.replace(STOP_STREAMING_TOKEN, "")
-
         if not chunk == "":
             logger.trace(f"FRONTEND - updating discord reply with chunk: {repr(chunk)}")
 
@@ -112,11 +139,15 @@ class DiscordMessageResponder:
                 await self.handle_message_length_overflow(input_chunk=chunk)
             else:
                 self.message_content += chunk
-                await self._reply_message.edit(content=self.message_content)
+                await self._edit_reply_message(content=self.message_content)
 
-        if stop_now:
-            logger.debug(f"Stopping stream (setting `self.done` to True)...")
-            self.done = True
+    async def _edit_reply_message(self, **kwargs):
+        if self._edit_budget_reserved:
+            self._edit_budget_reserved = False
+        else:
+            await self._edit_rate_budget.acquire(channel_id=self._reply_message.channel.id)
+        await self._reply_message.edit(**kwargs)
+        self.edit_count += 1
 
     async def handle_message_length_overflow(self, input_chunk: str):
         chunks = []
@@ -133,7 +164,7 @@ class DiscordMessageResponder:
                     new_message_initial_content, mention_author=False
                 )
                 self.message_content += f"\n\n `continued in next message:`\n {new_message.jump_url}"
-                await self._reply_message.edit(content=self.message_content)
+                await self._edit_reply_message(content=self.message_content)
                 self.message_content = new_message_initial_content
                 await self._add_reply_message_to_list()
                 self._reply_message = new_message
@@ -160,6 +191,7 @@ class DiscordMessageResponder:
 
     async def shutdown(self):
         self.done = True
+        self._tokens_available.set()  # wake the render loop up to flush whatever is left, and finish
         logger.debug(f"Message Responder shutting down...")
         if self.loop_task:
             await self.loop_task
@@ -181,7 +213,7 @@ class DiscordMessageResponder:
             file = discord.File(temp_filepath)
 
             # send the file
-            await self._reply_message.edit(files=[file])
+            await self._edit_reply_message(files=[file])
 
         except Exception as e:
             # Handle any error that might occur
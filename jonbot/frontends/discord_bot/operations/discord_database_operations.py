@@ -1,14 +1,20 @@
-from typing import List
+import asyncio
+from typing import List, Dict, Optional
 
 import discord
 
 from jonbot.api_interface.api_client.api_client import ApiClient
-from jonbot.api_interface.api_routes import UPSERT_MESSAGES_ENDPOINT, GET_CONTEXT_MEMORY_ENDPOINT, UPSERT_CHATS_ENDPOINT
+from jonbot.api_interface.api_routes import UPSERT_MESSAGES_ENDPOINT, GET_CONTEXT_MEMORY_ENDPOINT, \
+    UPSERT_CHATS_ENDPOINT, GET_SCRAPE_CHECKPOINTS_ENDPOINT, UPSERT_SCRAPE_CHECKPOINT_ENDPOINT, \
+    UPSERT_MESSAGE_REACTIONS_ENDPOINT, GET_MESSAGE_REACTIONS_ENDPOINT
 from jonbot.backend.data_layer.models.context_route import ContextRoute
 from jonbot.backend.data_layer.models.database_request_response_models import UpsertDiscordMessagesRequest, \
-    ContextMemoryDocumentRequest, UpsertDiscordChatsRequest
+    ContextMemoryDocumentRequest, UpsertDiscordChatsRequest, ScrapeCheckpointsRequest, ScrapeCheckpointsResponse, \
+    UpsertScrapeCheckpointRequest, UpsertMessageReactionsRequest, MessageReactionsRequest, MessageReactionsResponse
 from jonbot.backend.data_layer.models.discord_stuff.discord_chat_document import DiscordChatDocument
 from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+from jonbot.backend.data_layer.models.discord_stuff.message_reaction import MessageReactionChange
+from jonbot.backend.data_layer.models.discord_stuff.scrape_checkpoint import ScrapeCheckpoint
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 
 logger = get_jonbot_logger()
@@ -19,14 +25,14 @@ class DiscordDatabaseOperations:
         self._api_client = api_client
         self._database_name = database_name
 
-    async def upsert_messages(self, messages: List[discord.Message]) -> bool:
+    async def upsert_messages(self, messages: List[discord.Message], download_attachments: bool = True) -> bool:
         if len(messages) == 0:
             raise ValueError("Cannot upsert 0 messages")
         try:
-            documents = [
-                await DiscordMessageDocument.from_discord_message(message)
+            documents = await asyncio.gather(*[
+                DiscordMessageDocument.from_discord_message(message, download_attachments=download_attachments)
                 for message in messages
-            ]
+            ])
 
             request = UpsertDiscordMessagesRequest.from_discord_message_documents(
                 documents=documents, database_name=self._database_name
@@ -91,6 +97,44 @@ class DiscordDatabaseOperations:
         )
         return response["success"]
 
+    async def get_scrape_checkpoints(self, server_id: int) -> Dict[int, ScrapeCheckpoint]:
+        """Returns the server's scrape checkpoints, keyed by channel (or thread) id"""
+        request = ScrapeCheckpointsRequest(server_id=server_id, database_name=self._database_name)
+        response = await self._api_client.send_request_to_api(endpoint_name=GET_SCRAPE_CHECKPOINTS_ENDPOINT,
+                                                              data=request.dict(),
+                                                              method="GET")
+        checkpoints = ScrapeCheckpointsResponse(**response).data
+        return {checkpoint.channel_id: checkpoint for checkpoint in checkpoints}
+
+    async def upsert_scrape_checkpoint(self, checkpoint: ScrapeCheckpoint) -> bool:
+        request = UpsertScrapeCheckpointRequest(data=checkpoint, database_name=self._database_name)
+        response = await self._api_client.send_request_to_api(endpoint_name=UPSERT_SCRAPE_CHECKPOINT_ENDPOINT,
+                                                              data=request.dict())
+        if not response["success"]:
+            raise Exception(f"Error occurred while sending `upsert_scrape_checkpoint` request for"
+                            f" database: {self._database_name} at endpoint: {UPSERT_SCRAPE_CHECKPOINT_ENDPOINT}")
+        return response["success"]
+
+    async def upsert_message_reactions(self,
+                                       changes: List[MessageReactionChange],
+                                       backfilled_channel_id: Optional[int] = None) -> bool:
+        request = UpsertMessageReactionsRequest(data=changes,
+                                                database_name=self._database_name,
+                                                backfilled_channel_id=backfilled_channel_id)
+        response = await self._api_client.send_request_to_api(endpoint_name=UPSERT_MESSAGE_REACTIONS_ENDPOINT,
+                                                              data=request.dict())
+        if not response["success"]:
+            raise Exception(f"Error occurred while sending `upsert_message_reactions` request for"
+                            f" database: {self._database_name} at endpoint: {UPSERT_MESSAGE_REACTIONS_ENDPOINT}")
+        return response["success"]
+
+    async def get_message_reactions(self, channel_id: int, emoji: str) -> MessageReactionsResponse:
+        request = MessageReactionsRequest(channel_id=channel_id, emoji=emoji, database_name=self._database_name)
+        response = await self._api_client.send_request_to_api(endpoint_name=GET_MESSAGE_REACTIONS_ENDPOINT,
+                                                              data=request.dict(),
+                                                              method="GET")
+        return MessageReactionsResponse(**response)
+
     async def get_context_memory_document(self, message: discord.Message):
         try:
             context_route = ContextRoute.from_discord_message(message=message)
@@ -103,7 +147,8 @@ class DiscordDatabaseOperations:
             )
             response = await self._api_client.send_request_to_api(endpoint_name=GET_CONTEXT_MEMORY_ENDPOINT,
                                                                   data=get_request.dict(),
-                                                                  method="GET")
+                                                                  method="GET",
+                                                                  routing_key=context_route.route_id)
 
             if not response:
                 logger.warning(
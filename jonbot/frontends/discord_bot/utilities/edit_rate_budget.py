@@ -0,0 +1,47 @@
+from typing import Dict
+
+from jonbot.frontends.discord_bot.utilities.rate_limiter import TokenBucketRateLimiter
+from jonbot.system.environment_variables import (
+    DISCORD_EDITS_PER_SECOND_PER_CHANNEL,
+    DISCORD_EDITS_BURST_PER_CHANNEL,
+    DISCORD_EDITS_PER_SECOND_GLOBAL,
+)
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+
+class EditRateBudget:
+    """
+    Message-edit budget shared by every streaming reply - one token bucket per channel plus one for the whole bot,
+    so many replies streaming at once slow down (and coalesce more tokens per edit) instead of getting 429'd.
+    """
+
+    def __init__(self,
+                 edits_per_second_per_channel: float = DISCORD_EDITS_PER_SECOND_PER_CHANNEL,
+                 burst_per_channel: int = DISCORD_EDITS_BURST_PER_CHANNEL,
+                 edits_per_second_global: float = DISCORD_EDITS_PER_SECOND_GLOBAL):
+        self.edits_per_second_per_channel = edits_per_second_per_channel
+        self.burst_per_channel = burst_per_channel
+        self._global_limiter = TokenBucketRateLimiter(rate_per_second=edits_per_second_global,
+                                                      burst=max(1, int(edits_per_second_global)))
+        self._channel_limiters: Dict[int, TokenBucketRateLimiter] = {}
+
+    async def acquire(self, channel_id: int):
+        if channel_id not in self._channel_limiters:
+            self._channel_limiters[channel_id] = TokenBucketRateLimiter(
+                rate_per_second=self.edits_per_second_per_channel,
+                burst=self.burst_per_channel)
+        await self._channel_limiters[channel_id].acquire()
+        await self._global_limiter.acquire()
+
+
+EDIT_RATE_BUDGET = None
+
+
+def get_or_create_edit_rate_budget() -> EditRateBudget:
+    global EDIT_RATE_BUDGET
+    if EDIT_RATE_BUDGET is None:
+        logger.info("Creating new EditRateBudget instance")
+        EDIT_RATE_BUDGET = EditRateBudget()
+    return EDIT_RATE_BUDGET
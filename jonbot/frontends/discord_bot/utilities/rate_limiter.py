@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from jonbot.system.setup_logging.get_logger import get_jonbot_logger
+
+logger = get_jonbot_logger()
+
+
+class TokenBucketRateLimiter:
+    """
+    Async token bucket - `acquire()` waits until a token is available, refilling at `rate_per_second` up to `burst`.
+
+    `pause(seconds)` stops handing out tokens for a while, e.g. when Discord answers with a 429 and a `Retry-After`.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def available_tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def pause(self, seconds: float):
+        logger.warning(f"Rate limiter paused for {seconds:.2f} seconds")
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        self._refill()
+        if time.monotonic() < self._paused_until or self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    async def acquire(self, tokens: int = 1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate_per_second)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
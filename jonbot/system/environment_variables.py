@@ -25,6 +25,26 @@ CHATS_COLLECTION_NAME = "chats"
 USERS_COLLECTION_NAME = f"users"
 CONTEXT_MEMORIES_COLLECTION_NAME = "context_memories"
 ANALYSIS_COLLECTION_NAME = "analysis"
+CONTEXT_ROUTES_COLLECTION_NAME = "context_routes"
+SCRAPE_CHECKPOINTS_COLLECTION_NAME = "scrape_checkpoints"
+MESSAGE_REACTIONS_COLLECTION_NAME = "message_reactions"
+MESSAGE_REACTION_BACKFILLS_COLLECTION_NAME = "message_reaction_backfills"
+STORE_MESSAGE_DUMPS = os.getenv("STORE_MESSAGE_DUMPS", "false").lower() == "true"
+MONGO_WRITE_CONCERN_W = os.getenv("MONGO_WRITE_CONCERN_W", "1")
+MONGO_WRITE_CONCERN_W = int(MONGO_WRITE_CONCERN_W) if MONGO_WRITE_CONCERN_W.isdigit() else MONGO_WRITE_CONCERN_W
+MONGO_WRITE_CONCERN_JOURNAL = os.getenv("MONGO_WRITE_CONCERN_JOURNAL", "false").lower() == "true"
+MONGO_CURSOR_BATCH_SIZE = int(os.getenv("MONGO_CURSOR_BATCH_SIZE", "500"))
+# "true" runs explain() on the common lookups before and after the startup index build, and logs the difference
+MONGO_INDEX_EXPLAIN_REPORT = os.getenv("MONGO_INDEX_EXPLAIN_REPORT", "false").lower() == "true"
+# After a database's indexes fail to build, wait this long before trying again on a write (doubling up to the max)
+MONGO_INDEX_RETRY_SECONDS = float(os.getenv("MONGO_INDEX_RETRY_SECONDS", "30"))
+MONGO_INDEX_MAX_RETRY_SECONDS = float(os.getenv("MONGO_INDEX_MAX_RETRY_SECONDS", "1800"))
+UPSERT_BUFFER_MAX_BATCH_SIZE = int(os.getenv("UPSERT_BUFFER_MAX_BATCH_SIZE", "500"))
+UPSERT_BUFFER_FLUSH_INTERVAL_SECONDS = float(os.getenv("UPSERT_BUFFER_FLUSH_INTERVAL_SECONDS", "0.5"))
+# New upserts are refused past this many queued entries (e.g. while the database is down and failed ones pile up)
+UPSERT_BUFFER_MAX_QUEUE_DEPTH = int(os.getenv("UPSERT_BUFFER_MAX_QUEUE_DEPTH", "20000"))
+# Context memory documents kept in the API process (0 means "no limit")
+CONTEXT_MEMORY_CACHE_MAX_DOCUMENTS = int(os.getenv("CONTEXT_MEMORY_CACHE_MAX_DOCUMENTS", "1024"))
 
 # URL stuff
 URL_PREFIX = os.getenv("PREFIX")
@@ -35,3 +55,56 @@ if os.path.exists("/.dockerenv"):
     API_HOST_NAME = "api"
     HOST_NAME = "0.0.0.0"
     PORT_NUMBER = 8091
+
+# API worker stuff - worker `i` listens on PORT_NUMBER + i, and each chat is routed to a worker by its context route
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
+# ApiClient connection pool stuff
+API_CLIENT_CONNECTION_LIMIT = int(os.getenv("API_CLIENT_CONNECTION_LIMIT", "100"))
+API_CLIENT_CONNECTION_LIMIT_PER_HOST = int(os.getenv("API_CLIENT_CONNECTION_LIMIT_PER_HOST", "30"))
+API_CLIENT_DNS_CACHE_TTL_SECONDS = int(os.getenv("API_CLIENT_DNS_CACHE_TTL_SECONDS", "300"))
+API_CLIENT_KEEPALIVE_TIMEOUT_SECONDS = float(os.getenv("API_CLIENT_KEEPALIVE_TIMEOUT_SECONDS", "60"))
+
+# Multiplexed (WebSocket) API transport stuff - "false" sends every request as its own HTTP request
+API_CLIENT_USE_MULTIPLEXED_TRANSPORT = os.getenv("API_CLIENT_USE_MULTIPLEXED_TRANSPORT", "false").lower() == "true"
+API_CLIENT_MULTIPLEXED_MAX_IN_FLIGHT_REQUESTS = int(os.getenv("API_CLIENT_MULTIPLEXED_MAX_IN_FLIGHT_REQUESTS", "64"))
+# How long to stick with plain HTTP after the multiplexed connection can't be opened
+API_CLIENT_MULTIPLEXED_RETRY_SECONDS = float(os.getenv("API_CLIENT_MULTIPLEXED_RETRY_SECONDS", "30"))
+API_MULTIPLEXED_MAX_CONCURRENT_REQUESTS = int(os.getenv("API_MULTIPLEXED_MAX_CONCURRENT_REQUESTS", "64"))
+
+# Chatbot cache stuff (0 means "no limit")
+CHATBOT_CACHE_MAX_CHATBOTS = int(os.getenv("CHATBOT_CACHE_MAX_CHATBOTS", "256"))
+CHATBOT_CACHE_IDLE_TTL_SECONDS = float(os.getenv("CHATBOT_CACHE_IDLE_TTL_SECONDS", "3600"))
+CHATBOT_CACHE_MAX_BYTES = int(os.getenv("CHATBOT_CACHE_MAX_BYTES", "0"))
+
+# Server scraper stuff
+SCRAPER_MAX_CONCURRENT_SCRAPES = int(os.getenv("SCRAPER_MAX_CONCURRENT_SCRAPES", "8"))
+SCRAPER_HISTORY_REQUESTS_PER_SECOND = float(os.getenv("SCRAPER_HISTORY_REQUESTS_PER_SECOND", "20"))
+SCRAPER_PROGRESS_UPDATE_INTERVAL_SECONDS = float(os.getenv("SCRAPER_PROGRESS_UPDATE_INTERVAL_SECONDS", "3"))
+SCRAPER_UPSERT_BATCH_SIZE = int(os.getenv("SCRAPER_UPSERT_BATCH_SIZE", "100"))
+# "false" only records attachment urls (metadata) while scraping, without downloading the files
+SCRAPER_DOWNLOAD_ATTACHMENTS = os.getenv("SCRAPER_DOWNLOAD_ATTACHMENTS", "true").lower() == "true"
+
+# Attachment store stuff
+ATTACHMENTS_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("ATTACHMENTS_MAX_CONCURRENT_DOWNLOADS", "8"))
+
+# Discord message responder stuff
+# How often a streaming reply is edited (tokens that arrive in between are coalesced into one edit)
+RESPONDER_EDIT_INTERVAL_SECONDS = float(os.getenv("RESPONDER_EDIT_INTERVAL_SECONDS", "0.75"))
+# Edit budgets shared by every streaming reply (Discord allows 5 message edits per 5 seconds per channel, and a
+# bucket allows `burst + rate * 5` edits in any 5 seconds)
+DISCORD_EDITS_PER_SECOND_PER_CHANNEL = float(os.getenv("DISCORD_EDITS_PER_SECOND_PER_CHANNEL", "0.8"))
+DISCORD_EDITS_BURST_PER_CHANNEL = int(os.getenv("DISCORD_EDITS_BURST_PER_CHANNEL", "1"))
+DISCORD_EDITS_PER_SECOND_GLOBAL = float(os.getenv("DISCORD_EDITS_PER_SECOND_GLOBAL", "20"))
+
+# Memory emoji stuff - budgets for the 💭/❌ reactions the bot adds and removes to show what's in memory (Discord
+# allows roughly one reaction change per 0.25 seconds per channel)
+DISCORD_REACTIONS_PER_SECOND_PER_CHANNEL = float(os.getenv("DISCORD_REACTIONS_PER_SECOND_PER_CHANNEL", "4"))
+DISCORD_REACTIONS_BURST_PER_CHANNEL = int(os.getenv("DISCORD_REACTIONS_BURST_PER_CHANNEL", "1"))
+DISCORD_REACTIONS_PER_SECOND_GLOBAL = float(os.getenv("DISCORD_REACTIONS_PER_SECOND_GLOBAL", "20"))
+
+# Reaction index stuff - how many indexed messages are fetched from Discord at once (shared by every lookup)
+REACTION_INDEX_MAX_CONCURRENT_FETCHES = int(os.getenv("REACTION_INDEX_MAX_CONCURRENT_FETCHES", "5"))
+
+# Chat request scheduler stuff
+CHAT_SCHEDULER_MAX_CONCURRENT_REQUESTS = int(os.getenv("CHAT_SCHEDULER_MAX_CONCURRENT_REQUESTS", "8"))
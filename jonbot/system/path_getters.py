@@ -51,6 +51,10 @@ def get_new_attachments_folder_path():
     )
 
 
+def get_attachment_store_folder_path():
+    return str(Path(get_base_data_folder_path()) / "attachment_store")
+
+
 def create_log_file_name():
     return "log_" + get_current_date_time_string() + ".log"
 
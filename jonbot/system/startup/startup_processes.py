@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 
 from jonbot.api_interface.api_main import run_api_sync
 from jonbot.frontends.discord_bot.discord_main import run_discord_bot
+from jonbot.system.environment_variables import API_WORKERS
 from jonbot.system.setup_logging.get_logger import get_jonbot_logger
 from jonbot.system.startup.named_process import NamedProcess
 
@@ -33,7 +34,8 @@ def run_services(services: List[Dict[str, Any]]):
 
     processes = []
     for service in services:
-        process_name = f"{service['func'].__name__}__{service.get('kwargs', {}).get('bot_name_or_index', '')}"
+        kwargs = service.get("kwargs", {})
+        process_name = f"{service['func'].__name__}__{kwargs.get('bot_name_or_index', kwargs.get('worker_index', ''))}"
         process = NamedProcess(
             target=service["func"], name=process_name, kwargs=service.get("kwargs", {})
         )
@@ -67,7 +69,7 @@ def create_services(selected_services: str,
         logger.debug(f"selected_services: {selected_services} not in ['discord', 'all']")
 
     if selected_services in ["api", "all"]:
-        services.append({"func": run_api_sync})
+        services.extend(create_api_services(api_workers=API_WORKERS))
     else:
         logger.debug(f"selected_services: {selected_services} not in ['discord', 'all']")
 
@@ -88,6 +90,11 @@ def create_discord_services(bot_nick_names: List[str]):
     return bots
 
 
+def create_api_services(api_workers: int):
+    return [{"func": run_api_sync, "kwargs": {"worker_index": worker_index}}
+            for worker_index in range(max(api_workers, 1))]
+
+
 def filter_bot_nick_names(bot_nick_names: List[str],
                           bots_to_run_if_local: int = 2) -> List[str]:
     if not os.getenv("IS_DOCKER"):
@@ -0,0 +1,128 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from jonbot.frontends.discord_bot.handlers.chat_request_scheduler import ChatRequestScheduler
+
+
+async def start_waiting(scheduler: ChatRequestScheduler,
+                        granted_order: List[str],
+                        label: str,
+                        channel_id: int,
+                        user_id: int,
+                        high_priority: bool = False,
+                        positions: Optional[List[Optional[int]]] = None) -> asyncio.Task:
+    async def wait_for_slot():
+        await scheduler.acquire(channel_id=channel_id,
+                                user_id=user_id,
+                                high_priority=high_priority,
+                                on_queue_position_changed=positions.append if positions is not None else None)
+        granted_order.append(label)
+
+    task = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0)  # let it get in line
+    return task
+
+
+async def release_all(scheduler: ChatRequestScheduler, tasks: List[asyncio.Task]):
+    for task in tasks:
+        await asyncio.sleep(0)
+        scheduler.release()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_caps_requests_in_flight():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=2)
+    granted_order = []
+    tasks = [await start_waiting(scheduler, granted_order, label=str(number), channel_id=number, user_id=number)
+             for number in range(3)]
+
+    assert granted_order == ["0", "1"]
+    assert scheduler.stats["in_flight"] == 2
+    assert scheduler.stats["queued"] == 1
+
+    scheduler.release()
+    await tasks[2]
+    assert granted_order == ["0", "1", "2"]
+    assert scheduler.stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_high_priority_requests_jump_the_queue():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=1)
+    granted_order = []
+    tasks = [await start_waiting(scheduler, granted_order, label="running", channel_id=1, user_id=1),
+             await start_waiting(scheduler, granted_order, label="channel", channel_id=1, user_id=2),
+             await start_waiting(scheduler, granted_order, label="dm", channel_id=2, user_id=3, high_priority=True)]
+
+    await release_all(scheduler, tasks[1:])
+    assert granted_order == ["running", "dm", "channel"]
+
+
+@pytest.mark.asyncio
+async def test_round_robin_across_channels_then_users():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=1)
+    granted_order = []
+    tasks = [await start_waiting(scheduler, granted_order, label="running", channel_id=0, user_id=0)]
+    for label, channel_id, user_id in [("a1", 1, 1), ("a2", 1, 1), ("a3", 1, 2), ("b1", 2, 3), ("a4", 1, 1)]:
+        tasks.append(await start_waiting(scheduler, granted_order, label=label, channel_id=channel_id, user_id=user_id))
+
+    await release_all(scheduler, tasks[1:])
+    # channel 1 and channel 2 take turns, and within channel 1 users 1 and 2 take turns
+    assert granted_order == ["running", "a1", "b1", "a3", "a2", "a4"]
+
+
+@pytest.mark.asyncio
+async def test_queue_positions_count_down_to_the_grant():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=1)
+    granted_order = []
+    positions = []
+    tasks = [await start_waiting(scheduler, granted_order, label="running", channel_id=1, user_id=1),
+             await start_waiting(scheduler, granted_order, label="first", channel_id=2, user_id=2),
+             await start_waiting(scheduler, granted_order, label="second", channel_id=3, user_id=3,
+                                 positions=positions)]
+
+    assert positions == [2]
+    await release_all(scheduler, tasks[1:])
+    assert positions == [2, 1, None]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_leave_the_queue():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=1)
+    granted_order = []
+    positions = []
+    running = await start_waiting(scheduler, granted_order, label="running", channel_id=1, user_id=1)
+    cancelled = await start_waiting(scheduler, granted_order, label="cancelled", channel_id=2, user_id=2)
+    waiting = await start_waiting(scheduler, granted_order, label="waiting", channel_id=3, user_id=3,
+                                  positions=positions)
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert scheduler.stats["queued"] == 1
+    assert positions == [2, 1]
+
+    await release_all(scheduler, [waiting])
+    await running
+    assert granted_order == ["running", "waiting"]
+
+
+@pytest.mark.asyncio
+async def test_a_waiter_cancelled_after_its_grant_releases_the_slot():
+    scheduler = ChatRequestScheduler(max_concurrent_requests=1)
+    granted_order = []
+    await start_waiting(scheduler, granted_order, label="running", channel_id=1, user_id=1)
+    cancelled = await start_waiting(scheduler, granted_order, label="cancelled", channel_id=2, user_id=2)
+    waiting = await start_waiting(scheduler, granted_order, label="waiting", channel_id=3, user_id=3)
+
+    scheduler.release()  # grants the slot to `cancelled`...
+    cancelled.cancel()  # ...which is cancelled before it gets to use it
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    await waiting
+    assert granted_order == ["running", "waiting"]
+    assert scheduler.stats["in_flight"] == 1
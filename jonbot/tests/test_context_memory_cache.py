@@ -0,0 +1,110 @@
+import asyncio
+from typing import List
+
+import pytest
+from langchain.schema import AIMessage, HumanMessage
+
+from jonbot.backend.backend_database_operator.backend_database_operator import BackendDatabaseOperations
+from jonbot.backend.data_layer.database.context_memory_cache import ContextMemoryCache
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.models.context_route import ContextRoute
+from jonbot.backend.data_layer.models.database_request_response_models import ContextMemoryDocumentRequest
+from jonbot.backend.data_layer.models.user_stuff.memory.chat_memory_message_buffer import ChatMemoryMessageBuffer
+from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
+
+DATABASE_NAME = "test_database"
+
+
+def build_document() -> ContextMemoryDocument:
+    document = ContextMemoryDocument.build_empty(context_route=ContextRoute.dummy(dummy_text="test"))
+    document.chat_memory_message_buffer = ChatMemoryMessageBuffer(message_buffer=[
+        HumanMessage(content="hello", additional_kwargs={"message_id": 4, "type": "human"}),
+        AIMessage(content="hi!", additional_kwargs={"message_id": 5, "type": "ai"}),
+    ])
+    return document
+
+
+def test_mutating_a_get_result_leaves_the_cache_unchanged():
+    cache = ContextMemoryCache()
+    document = build_document()
+    cache.put(database_name=DATABASE_NAME, document=document)
+
+    returned = cache.get(database_name=DATABASE_NAME, context_route=document.context_route)
+    returned.chat_memory_message_buffer.message_buffer[0].additional_kwargs["message_id"] = 999
+    returned.chat_memory_message_buffer.message_buffer[1].additional_kwargs["token_count"] = 3
+    returned.chat_memory_message_buffer.message_buffer.pop()
+
+    cached = cache.get(database_name=DATABASE_NAME, context_route=document.context_route)
+    assert cached.memory_message_ids == [4, 5]
+    assert "token_count" not in cached.chat_memory_message_buffer.message_buffer[1].additional_kwargs
+
+
+def test_mutating_a_put_document_leaves_the_cache_unchanged():
+    cache = ContextMemoryCache()
+    document = build_document()
+    cache.put(database_name=DATABASE_NAME, document=document)
+
+    document.chat_memory_message_buffer.message_buffer[0].additional_kwargs["message_id"] = 999
+
+    cached = cache.get(database_name=DATABASE_NAME, context_route=document.context_route)
+    assert cached.memory_message_ids == [4, 5]
+
+
+def test_writes_bump_the_version():
+    cache = ContextMemoryCache()
+    document = build_document()
+    assert cache.put(database_name=DATABASE_NAME, document=document) == 1
+    assert cache.put(database_name=DATABASE_NAME, document=document) == 2
+    assert cache.get(database_name=DATABASE_NAME, context_route=document.context_route).version == 2
+
+
+class FakeMongoDatabaseManager(MongoDatabaseManager):
+    def __init__(self, write_seconds: List[float], succeed: List[bool]):
+        self._write_seconds = write_seconds
+        self._succeed = succeed
+        self.written_versions = []
+
+    async def upsert_context_memory(self, request: ContextMemoryDocumentRequest) -> bool:
+        await asyncio.sleep(self._write_seconds.pop(0))
+        success = self._succeed.pop(0)
+        if success:
+            self.written_versions.append(request.data.version)
+        return success
+
+
+def build_upsert_request(document: ContextMemoryDocument) -> ContextMemoryDocumentRequest:
+    return ContextMemoryDocumentRequest(data=document.copy(deep=True),
+                                        database_name=DATABASE_NAME,
+                                        query=document.query,
+                                        request_type="upsert")
+
+
+@pytest.mark.asyncio
+async def test_overlapping_writes_reach_the_database_in_version_order():
+    # the first write is the slow one - it mustn't land on top of the second
+    mongo_database = FakeMongoDatabaseManager(write_seconds=[0.05, 0.0], succeed=[True, True])
+    database_operations = BackendDatabaseOperations(mongo_database=mongo_database,
+                                                    context_memory_cache=ContextMemoryCache())
+    document = build_document()
+    await asyncio.gather(database_operations.upsert_context_memory(build_upsert_request(document)),
+                         database_operations.upsert_context_memory(build_upsert_request(document)))
+
+    assert mongo_database.written_versions == [1, 2]
+    assert database_operations.context_memory_cache.get(database_name=DATABASE_NAME,
+                                                        context_route=document.context_route).version == 2
+
+
+@pytest.mark.asyncio
+async def test_a_failed_write_only_invalidates_its_own_version():
+    mongo_database = FakeMongoDatabaseManager(write_seconds=[0.0, 0.0], succeed=[True, False])
+    cache = ContextMemoryCache()
+    database_operations = BackendDatabaseOperations(mongo_database=mongo_database, context_memory_cache=cache)
+    document = build_document()
+
+    await database_operations.upsert_context_memory(build_upsert_request(document))
+    await database_operations.upsert_context_memory(build_upsert_request(document))
+    assert cache.get(database_name=DATABASE_NAME, context_route=document.context_route) is None
+
+    cache.put(database_name=DATABASE_NAME, document=document.copy(update={"version": 5}), new_version=False)
+    cache.invalidate(database_name=DATABASE_NAME, context_route=document.context_route, version=2)
+    assert cache.get(database_name=DATABASE_NAME, context_route=document.context_route).version == 5
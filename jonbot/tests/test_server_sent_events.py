@@ -0,0 +1,68 @@
+import pytest
+
+from jonbot.api_interface.helpers.server_sent_events import (
+    DONE_EVENT,
+    ERROR_EVENT,
+    TOKEN_EVENT,
+    USAGE_EVENT,
+    ServerSentEvent,
+    ServerSentEventDecoder,
+    format_server_sent_event,
+    frame_token_stream,
+)
+
+
+def decode_in_chunks(payload: bytes, chunk_size: int):
+    decoder = ServerSentEventDecoder()
+    events = []
+    for start in range(0, len(payload), chunk_size):
+        events.extend(decoder.feed(payload[start:start + chunk_size]))
+    return events
+
+
+STREAM = (format_server_sent_event(TOKEN_EVENT, {"token": "Hello"})
+          + format_server_sent_event(TOKEN_EVENT, {"token": " wörld 🧠\nsecond line"})
+          + format_server_sent_event(DONE_EVENT, {}))
+EXPECTED_EVENTS = [ServerSentEvent(event=TOKEN_EVENT, data={"token": "Hello"}),
+                   ServerSentEvent(event=TOKEN_EVENT, data={"token": " wörld 🧠\nsecond line"}),
+                   ServerSentEvent(event=DONE_EVENT, data={})]
+
+
+def test_decodes_whole_events():
+    assert decode_in_chunks(STREAM, chunk_size=len(STREAM)) == EXPECTED_EVENTS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16])
+def test_decodes_events_split_across_chunks(chunk_size: int):
+    # small chunks split events, lines, and the multi-byte characters (ö is 2 bytes, 🧠 is 4) at every offset
+    assert decode_in_chunks(STREAM, chunk_size=chunk_size) == EXPECTED_EVENTS
+
+
+def test_decodes_a_character_split_between_chunks():
+    payload = format_server_sent_event(TOKEN_EVENT, {"token": "🧠"})
+    split_at = payload.index("🧠".encode("utf-8")) + 1
+    decoder = ServerSentEventDecoder()
+    assert decoder.feed(payload[:split_at]) == []
+    assert decoder.feed(payload[split_at:]) == [ServerSentEvent(event=TOKEN_EVENT, data={"token": "🧠"})]
+
+
+def test_decodes_already_decoded_text_with_crlf_and_comments():
+    decoder = ServerSentEventDecoder()
+    events = decoder.feed(": keep-alive\r\nevent: token\r\ndata: {\"token\": \"hi\"}\r\n\r\n")
+    assert events == [ServerSentEvent(event=TOKEN_EVENT, data={"token": "hi"})]
+
+
+@pytest.mark.asyncio
+async def test_frame_token_stream_reports_errors_before_usage_and_done():
+    async def failing_tokens():
+        yield "partial"
+        raise RuntimeError("model went away")
+
+    decoder = ServerSentEventDecoder()
+    events = []
+    async for chunk in frame_token_stream(failing_tokens()):
+        events.extend(decoder.feed(chunk))
+
+    assert [event.event for event in events] == [TOKEN_EVENT, ERROR_EVENT, USAGE_EVENT, DONE_EVENT]
+    assert events[1].data == {"message": "RuntimeError: model went away"}
+    assert events[2].data == {"streamed_tokens": 1, "characters": len("partial")}
@@ -0,0 +1,129 @@
+"""Micro-benchmark: pooled `ApiClient` session vs. a fresh `aiohttp.ClientSession` per request.
+
+Spins up a local FastAPI stand-in for the jonbot API (an `/upsert_messages`-shaped POST endpoint and a
+token-streaming `/chat`-shaped endpoint) and compares per-request latency and throughput for both strategies.
+
+Run with:
+    python -m scratchpad.benchmarks.api_client_session_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+import aiohttp
+import uvicorn
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+from jonbot.api_interface.api_client.api_client import ApiClient
+from jonbot.api_interface.helpers.server_sent_events import frame_token_stream
+from jonbot.backend.data_layer.models.api_endpoint_url import ApiRoute
+
+BENCHMARK_PORT = 8123
+NUMBER_OF_REQUESTS = 500
+CONCURRENCY = 20
+STREAMED_TOKENS = 50
+
+stand_in_app = FastAPI()
+
+
+@stand_in_app.post("/upsert_messages")
+async def upsert_messages_stand_in(payload: dict):
+    return {"success": True}
+
+
+@stand_in_app.post("/chat")
+async def chat_stand_in(payload: dict):
+    async def token_generator():
+        for token_number in range(STREAMED_TOKENS):
+            yield f"token{token_number} "
+
+    return StreamingResponse(frame_token_stream(token_generator()), media_type="text/event-stream")
+
+
+def endpoint_url(endpoint: str) -> str:
+    return ApiRoute.from_endpoint(host_name="localhost", port_number=BENCHMARK_PORT, endpoint=endpoint).endpoint_url
+
+
+async def per_call_session_request(endpoint: str, data: dict):
+    # The old `ApiClient` behaviour - a brand new session (and TCP connection) for every call
+    async with aiohttp.ClientSession() as session:
+        async with session.post(endpoint_url(endpoint), json=data) as response:
+            return await response.json()
+
+
+async def per_call_session_stream(endpoint: str, data: dict):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(endpoint_url(endpoint), json=data) as response:
+            async for _ in response.content.iter_any():
+                pass
+
+
+async def run_load(request_function: Callable[[], Awaitable], number_of_requests: int, concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def timed_request():
+        async with semaphore:
+            tik = time.perf_counter()
+            await request_function()
+            latencies.append(time.perf_counter() - tik)
+
+    wall_clock_start = time.perf_counter()
+    await asyncio.gather(*[timed_request() for _ in range(number_of_requests)])
+    wall_clock_duration = time.perf_counter() - wall_clock_start
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "requests_per_second": number_of_requests / wall_clock_duration,
+    }
+
+
+def print_results(label: str, results: Dict):
+    print(f"{label:<40} p50: {results['p50_ms']:8.2f} ms | p99: {results['p99_ms']:8.2f} ms"
+          f" | throughput: {results['requests_per_second']:8.1f} req/s")
+
+
+async def main():
+    server = uvicorn.Server(uvicorn.Config(app=stand_in_app, host="localhost", port=BENCHMARK_PORT, log_level="error"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    pooled_client = ApiClient(api_port_number=BENCHMARK_PORT)
+    pooled_client.api_host_name = "localhost"
+    upsert_payload = {"data": [{"content": "hello" * 20}], "database_name": "benchmark_database"}
+
+    try:
+        print(f"{NUMBER_OF_REQUESTS} requests, concurrency {CONCURRENCY}\n")
+        print_results("upsert - per-call session",
+                      await run_load(lambda: per_call_session_request("/upsert_messages", upsert_payload),
+                                     NUMBER_OF_REQUESTS, CONCURRENCY))
+        print_results("upsert - pooled ApiClient session",
+                      await run_load(lambda: pooled_client.send_request_to_api(endpoint_name="/upsert_messages",
+                                                                               data=upsert_payload),
+                                     NUMBER_OF_REQUESTS, CONCURRENCY))
+        print_results("chat stream - per-call session",
+                      await run_load(lambda: per_call_session_stream("/chat", upsert_payload),
+                                     NUMBER_OF_REQUESTS, CONCURRENCY))
+        print_results("chat stream - pooled ApiClient session",
+                      await run_load(lambda: pooled_client.send_request_to_api_streaming(endpoint_name="/chat",
+                                                                                         data=upsert_payload),
+                                     NUMBER_OF_REQUESTS, CONCURRENCY))
+    finally:
+        await pooled_client.close()
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
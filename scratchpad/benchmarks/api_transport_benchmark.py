@@ -0,0 +1,121 @@
+"""Benchmark: per-request overhead of the pooled-HTTP `ApiClient` vs. the multiplexed WebSocket transport, under a
+mixed load of concurrent chat streams and small upserts (what the Discord bot sends while busy and scraping).
+
+Spins up a local FastAPI stand-in for the jonbot API - an `/upsert_messages`-shaped POST endpoint, an SSE `/chat`
+endpoint, and the real `/multiplexed` WebSocket endpoint - so both transports hit the same routes. The stand-in does no
+work, so the latencies are pure transport overhead.
+
+Run with (uvicorn needs a WebSocket implementation, e.g. `pip install websockets`):
+    python -m scratchpad.benchmarks.api_transport_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+import uvicorn
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+from starlette.websockets import WebSocket
+
+from jonbot.api_interface.api_client.api_client import ApiClient
+from jonbot.api_interface.helpers.serve_multiplexed_connection import (
+    MULTIPLEXED_ENDPOINT,
+    serve_multiplexed_connection,
+)
+from jonbot.api_interface.helpers.server_sent_events import frame_token_stream
+
+BENCHMARK_PORT = 8123
+NUMBER_OF_UPSERTS = 2000
+NUMBER_OF_CHAT_STREAMS = 200
+CONCURRENCY = 64
+STREAMED_TOKENS = 50
+
+stand_in_app = FastAPI()
+
+
+@stand_in_app.post("/upsert_messages")
+async def upsert_messages_stand_in(payload: dict):
+    return {"success": True}
+
+
+@stand_in_app.post("/chat")
+async def chat_stand_in(payload: dict):
+    async def token_generator():
+        for token_number in range(STREAMED_TOKENS):
+            yield f"token{token_number} "
+
+    return StreamingResponse(frame_token_stream(token_generator()), media_type="text/event-stream")
+
+
+@stand_in_app.websocket(MULTIPLEXED_ENDPOINT)
+async def multiplexed_stand_in(websocket: WebSocket):
+    await serve_multiplexed_connection(websocket=websocket, app=stand_in_app)
+
+
+async def run_mixed_load(client: ApiClient) -> Dict[str, Dict]:
+    upsert_payload = {"data": [{"content": "hello" * 20}], "database_name": "benchmark_database"}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies: Dict[str, List[float]] = {"upsert": [], "chat stream": []}
+
+    async def timed(kind: str, request):
+        async with semaphore:
+            tik = time.perf_counter()
+            await request
+            latencies[kind].append(time.perf_counter() - tik)
+
+    requests = [timed("upsert", client.send_request_to_api(endpoint_name="/upsert_messages", data=upsert_payload))
+                for _ in range(NUMBER_OF_UPSERTS)]
+    # interleave the chat streams through the upserts
+    for request_number in range(NUMBER_OF_CHAT_STREAMS):
+        requests.insert(request_number * (NUMBER_OF_UPSERTS // NUMBER_OF_CHAT_STREAMS + 1),
+                        timed("chat stream", client.send_request_to_api_streaming(endpoint_name="/chat",
+                                                                                  data=upsert_payload)))
+
+    wall_clock_start = time.perf_counter()
+    await asyncio.gather(*requests)
+    wall_clock_duration = time.perf_counter() - wall_clock_start
+
+    results = {}
+    for kind, kind_latencies in latencies.items():
+        kind_latencies.sort()
+        results[kind] = {"p50_ms": statistics.median(kind_latencies) * 1000,
+                         "p99_ms": kind_latencies[int(len(kind_latencies) * 0.99) - 1] * 1000}
+    results["total"] = {"requests_per_second": len(requests) / wall_clock_duration}
+    return results
+
+
+async def main():
+    server = uvicorn.Server(uvicorn.Config(app=stand_in_app, host="localhost", port=BENCHMARK_PORT, log_level="error"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    print(f"{NUMBER_OF_UPSERTS} upserts + {NUMBER_OF_CHAT_STREAMS} chat streams ({STREAMED_TOKENS} tokens each), "
+          f"concurrency {CONCURRENCY}\n")
+    try:
+        for label, use_multiplexed_transport in [("pooled HTTP", False), ("multiplexed WebSocket", True)]:
+            client = ApiClient(api_port_number=BENCHMARK_PORT, use_multiplexed_transport=use_multiplexed_transport)
+            client.api_host_name = "localhost"
+            try:
+                await run_mixed_load(client)  # warm up connections
+                results = await run_mixed_load(client)
+            finally:
+                await client.close()
+            for kind in ["upsert", "chat stream"]:
+                print(f"{label:<22} {kind:<12} p50: {results[kind]['p50_ms']:8.2f} ms"
+                      f" | p99: {results[kind]['p99_ms']:8.2f} ms")
+            print(f"{label:<22} throughput: {results['total']['requests_per_second']:8.1f} req/s\n")
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
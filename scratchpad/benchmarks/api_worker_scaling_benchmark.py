@@ -0,0 +1,160 @@
+"""Load test: chat throughput of the API with 1, 2, 4... worker processes (`API_WORKERS`), with chats routed to workers
+by context route the way the Discord bot's `ApiClient` does it.
+
+Each worker is a stand-in for the real API's `/chat` - it validates and logs-serialises a real `ChatRequest`, spins
+the CPU for `SIMULATED_PROMPT_BUILD_MILLISECONDS` (standing in for tokenising and building the prompt), and streams a
+reply through the real server-sent-event framing - so the per-chat work is the CPU-bound part of the API, without LLM
+or database calls. Scaling is only near-linear up to the number of free cores, and the load generator (this process)
+needs a core of its own.
+
+Run with:
+    python -m scratchpad.benchmarks.api_worker_scaling_benchmark
+"""
+import asyncio
+import multiprocessing
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+import uvicorn
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+from jonbot.api_interface.api_client.api_client import ApiClient
+from jonbot.api_interface.helpers.server_sent_events import frame_token_stream
+from jonbot.backend.data_layer.models.context_route import ContextRoute
+from jonbot.backend.data_layer.models.conversation_context import ConversationContextDescription
+from jonbot.backend.data_layer.models.conversation_models import ChatInput, ChatRequest, ChatRequestConfig
+
+BASE_PORT = 8123
+WORKER_COUNTS = [1, 2, 4]
+NUMBER_OF_CHATS = 400
+NUMBER_OF_CONTEXT_ROUTES = 64
+CONCURRENCY = 32
+REPLY_TOKENS = 100
+SIMULATED_PROMPT_BUILD_MILLISECONDS = 5
+CONFIG_PROMPT = "You are a helpful teaching assistant for a neuroscience class. " * 60
+
+
+def create_stand_in_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_stand_in():
+        return {"status": "alive"}
+
+    @app.post("/chat")
+    async def chat_stand_in(chat_request: ChatRequest):
+        str(chat_request)  # the real endpoint logs every request
+        spin_until = time.perf_counter() + SIMULATED_PROMPT_BUILD_MILLISECONDS / 1000
+        while time.perf_counter() < spin_until:
+            pass
+        reply_tokens = [f"{word} " for word in chat_request.config.config_prompts.split()[:REPLY_TOKENS]]
+
+        async def token_generator():
+            for token in reply_tokens:
+                yield token
+
+        return StreamingResponse(frame_token_stream(token_generator()), media_type="text/event-stream")
+
+    return app
+
+
+def run_stand_in_worker(port_number: int):
+    uvicorn.run(create_stand_in_app(), host="localhost", port=port_number, log_level="error")
+
+
+def build_chat_request(route_number: int) -> ChatRequest:
+    context_route = ContextRoute.dummy(dummy_text="benchmark")
+    context_route.channel.id = route_number
+    return ChatRequest(user_id=route_number,
+                       message_id=route_number,
+                       reply_message_id=route_number,
+                       chat_input=ChatInput(message=f"What do neurons in channel {route_number} do?"),
+                       database_name="benchmark_database",
+                       context_route=context_route,
+                       conversation_context_description=ConversationContextDescription(text="benchmark channel"),
+                       config=ChatRequestConfig(config_prompts=CONFIG_PROMPT))
+
+
+async def wait_until_healthy(client: ApiClient, number_of_workers: int):
+    for worker_index in range(number_of_workers):
+        while True:
+            try:
+                async with client.session.get(client._endpoint_url(endpoint_name="/health",
+                                                                   worker_index=worker_index)) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                pass
+            await asyncio.sleep(0.1)
+
+
+async def run_load(number_of_workers: int) -> Dict:
+    client = ApiClient(api_port_number=BASE_PORT, api_workers=number_of_workers)
+    client.api_host_name = "localhost"
+    chat_requests = [build_chat_request(route_number=chat_number % NUMBER_OF_CONTEXT_ROUTES)
+                     for chat_number in range(NUMBER_OF_CHATS)]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies: List[float] = []
+    chats_per_worker = [0] * number_of_workers
+
+    async def timed_chat(chat_request: ChatRequest):
+        async with semaphore:
+            routing_key = chat_request.context_route.route_id
+            chats_per_worker[client.worker_index(routing_key=routing_key)] += 1
+            tik = time.perf_counter()
+            await client.send_request_to_api_streaming(endpoint_name="/chat",
+                                                       data=chat_request.dict(),
+                                                       routing_key=routing_key)
+            latencies.append(time.perf_counter() - tik)
+
+    try:
+        await wait_until_healthy(client, number_of_workers)
+        await asyncio.gather(*[timed_chat(chat_request) for chat_request in chat_requests[:CONCURRENCY]])  # warm up
+        latencies.clear()
+        chats_per_worker = [0] * number_of_workers
+        wall_clock_start = time.perf_counter()
+        await asyncio.gather(*[timed_chat(chat_request) for chat_request in chat_requests])
+        wall_clock_duration = time.perf_counter() - wall_clock_start
+    finally:
+        await client.close()
+
+    latencies.sort()
+    return {"chats_per_second": NUMBER_OF_CHATS / wall_clock_duration,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            "chats_per_worker": chats_per_worker}
+
+
+def main():
+    print(f"{NUMBER_OF_CHATS} chats across {NUMBER_OF_CONTEXT_ROUTES} context routes, concurrency {CONCURRENCY}, "
+          f"{os.cpu_count()} cores\n")
+    baseline_chats_per_second = None
+    for number_of_workers in WORKER_COUNTS:
+        workers = [multiprocessing.Process(target=run_stand_in_worker, args=(BASE_PORT + worker_index,), daemon=True)
+                   for worker_index in range(number_of_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            results = asyncio.run(run_load(number_of_workers=number_of_workers))
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+
+        baseline_chats_per_second = baseline_chats_per_second or results["chats_per_second"]
+        print(f"API_WORKERS={number_of_workers}  {results['chats_per_second']:7.1f} chats/s "
+              f"({results['chats_per_second'] / baseline_chats_per_second:4.2f}x)"
+              f" | p50: {results['p50_ms']:7.1f} ms | p99: {results['p99_ms']:7.1f} ms"
+              f" | chats per worker: {results['chats_per_worker']}")
+
+
+if __name__ == "__main__":
+    main()
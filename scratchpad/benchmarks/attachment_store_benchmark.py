@@ -0,0 +1,92 @@
+"""Benchmark: saving message attachments one at a time (the old `attachment.save` loop) vs. the `AttachmentStore`.
+
+Uses fake attachments whose download costs a simulated round-trip, with some files re-posted across messages, then
+"re-scrapes" the same messages to show the attachment-id index skipping downloads entirely.
+
+Run with:
+    python -m scratchpad.benchmarks.attachment_store_benchmark
+"""
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.backend.data_layer.attachments.attachment_store import AttachmentStore
+
+SIMULATED_DOWNLOAD_SECONDS = 0.03
+NUMBER_OF_MESSAGES = 100
+ATTACHMENTS_PER_MESSAGE = 2
+DISTINCT_FILES = 120  # fewer distinct files than attachments - some get re-posted
+FILE_SIZE_BYTES = 200_000
+
+
+class FakeAttachment:
+    def __init__(self, attachment_id: int, file_number: int):
+        self.id = attachment_id
+        self.filename = f"lecture_slide_{file_number}.png"
+        self._content = file_number.to_bytes(4, "big") * (FILE_SIZE_BYTES // 4)
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(SIMULATED_DOWNLOAD_SECONDS)
+        return self._content
+
+    async def save(self, file_path: Path):
+        file_path.write_bytes(await self.read())
+
+
+def build_attachments() -> List[List[FakeAttachment]]:
+    return [[FakeAttachment(attachment_id=message_number * 10 + offset,
+                            file_number=(message_number * ATTACHMENTS_PER_MESSAGE + offset) % DISTINCT_FILES)
+             for offset in range(ATTACHMENTS_PER_MESSAGE)]
+            for message_number in range(NUMBER_OF_MESSAGES)]
+
+
+async def save_sequentially(messages: List[List[FakeAttachment]], folder: Path) -> float:
+    tik = time.perf_counter()
+    for message_number, attachments in enumerate(messages):
+        for attachment in attachments:
+            await attachment.save(folder / f"{message_number}_{attachment.filename}")
+    return time.perf_counter() - tik
+
+
+async def save_with_store(messages: List[List[FakeAttachment]], store: AttachmentStore) -> float:
+    tik = time.perf_counter()
+    await asyncio.gather(*[store.save_attachments(attachments) for attachments in messages])
+    return time.perf_counter() - tik
+
+
+def folder_size(folder: Path) -> int:
+    return sum(path.stat().st_size for path in folder.rglob("*") if path.is_file())
+
+
+async def main():
+    messages = build_attachments()
+    print(f"{NUMBER_OF_MESSAGES} messages x {ATTACHMENTS_PER_MESSAGE} attachments ({DISTINCT_FILES} distinct files), "
+          f"{SIMULATED_DOWNLOAD_SECONDS * 1000:.0f} ms per download\n")
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        sequential_folder = Path(temporary_folder) / "sequential"
+        sequential_folder.mkdir()
+        sequential_seconds = await save_sequentially(messages, sequential_folder)
+        print(f"sequential attachment.save:  {sequential_seconds:6.2f} s | "
+              f"{folder_size(sequential_folder) / 1e6:6.1f} MB on disk")
+
+        store_folder = Path(temporary_folder) / "store"
+        store = AttachmentStore(root_folder=store_folder)
+        store_seconds = await save_with_store(messages, store)
+        print(f"AttachmentStore:             {store_seconds:6.2f} s | "
+              f"{folder_size(store_folder) / 1e6:6.1f} MB on disk | {store.stats}")
+
+        rescrape_store = AttachmentStore(root_folder=store_folder)  # a fresh process, loading the index from disk
+        rescrape_seconds = await save_with_store(messages, rescrape_store)
+        print(f"AttachmentStore (re-scrape): {rescrape_seconds:6.2f} s | {rescrape_store.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""Benchmark: Discord API calls and latency spent gathering config before each chat, with `BotConfigCog`'s
+event-invalidated config cache vs. re-gathering everything for every message (what `handle_text_message` used to do).
+
+Uses a fake guild - a top-level `bot-config` channel, and categories that each have a `bot-config` channel and chat
+channels with threads - whose `pins()` and `history()` calls cost a simulated Discord round-trip. Now and then a
+`bot-config` channel's pins change, which invalidates the prompts of the categories it feeds.
+
+Run with:
+    python -m scratchpad.benchmarks.bot_config_cache_benchmark
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+from typing import Dict, List, Optional
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.bot_config_cog import BotConfigCog
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.bot_config_cache import BotConfigCache
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.channel_memory_messages import ChannelMemoryMessages
+
+SIMULATED_DISCORD_ROUND_TRIP_SECONDS = 0.03
+NUMBER_OF_CATEGORIES = 4
+CHANNELS_PER_CATEGORY = 3
+THREADS_PER_CHANNEL = 4
+NUMBER_OF_CHATS = 200
+PIN_UPDATE_PROBABILITY = 0.03
+RANDOM_SEED = 42
+
+api_calls = {"count": 0}
+
+
+class FakeReaction:
+    def __init__(self, emoji: str):
+        self.emoji = emoji
+        self.me = True
+
+
+class FakeMessage:
+    def __init__(self, content: str, reactions: List[FakeReaction] = None):
+        self.content = content
+        self.reactions = reactions or []
+
+
+class FakeGuildChannel:
+    def __init__(self, channel_id: int, name: str, guild: "FakeGuild", category: Optional["FakeCategory"]):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.category = category
+        self.type = "text"
+        self.pinned_messages = [FakeMessage(f"{name} pin")]
+        self.messages = [FakeMessage(f"{name} message {message_number}",
+                                     reactions=[FakeReaction("🤖")] if message_number % 10 == 0 else [])
+                         for message_number in range(100)]
+
+    async def pins(self) -> List[FakeMessage]:
+        api_calls["count"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        return self.pinned_messages
+
+    async def history(self, limit: int = 100):
+        api_calls["count"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        for message in self.messages[:limit]:
+            yield message
+
+
+class FakeThread(FakeGuildChannel):
+    def __init__(self, channel_id: int, parent: FakeGuildChannel):
+        super().__init__(channel_id=channel_id, name=f"{parent.name} thread", guild=parent.guild,
+                         category=parent.category)
+        self.parent = parent
+        self.type = "public_thread"
+        self.messages = []
+
+
+class FakeCategory:
+    def __init__(self, category_id: int):
+        self.id = category_id
+
+
+class FakeGuild:
+    def __init__(self):
+        self.id = 1
+        self.channels: List[FakeGuildChannel] = []
+
+
+class FakeBot:
+    def __init__(self):
+        self.memory_messages_by_channel_id: Dict[int, ChannelMemoryMessages] = {}
+
+
+def build_guild():
+    guild = FakeGuild()
+    bot_config_channels = [FakeGuildChannel(channel_id=10, name="bot-config", guild=guild, category=None)]
+    threads = []
+    for category_number in range(NUMBER_OF_CATEGORIES):
+        category = FakeCategory(category_id=100 + category_number)
+        bot_config_channels.append(FakeGuildChannel(channel_id=1000 + category_number * 100, name="bot-config",
+                                                    guild=guild, category=category))
+        for channel_number in range(1, CHANNELS_PER_CATEGORY + 1):
+            channel = FakeGuildChannel(channel_id=1000 + category_number * 100 + channel_number,
+                                       name=f"chat-{channel_number}", guild=guild, category=category)
+            guild.channels.append(channel)
+            threads.extend(FakeThread(channel_id=channel.id * 100 + thread_number, parent=channel)
+                           for thread_number in range(THREADS_PER_CHANNEL))
+    guild.channels.extend(bot_config_channels)
+    return bot_config_channels, threads
+
+
+async def run(use_config_cache: bool) -> Dict:
+    generator = random.Random(RANDOM_SEED)
+    bot_config_channels, threads = build_guild()
+    cog = BotConfigCog(bot=FakeBot())
+    api_calls["count"] = 0
+
+    latencies = []
+    for _ in range(NUMBER_OF_CHATS):
+        if generator.random() < PIN_UPDATE_PROBABILITY:
+            await cog.on_guild_channel_pins_update(channel=generator.choice(bot_config_channels), last_pin=None)
+        if not use_config_cache:
+            cog.config_cache = BotConfigCache()
+        tik = time.perf_counter()
+        await cog.gather_config_messages(channel=generator.choice(threads))
+        latencies.append(time.perf_counter() - tik)
+
+    return {"p50_ms": statistics.median(latencies) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "api_calls_per_chat": api_calls["count"] / NUMBER_OF_CHATS,
+            "cache_stats": cog.config_cache_stats}
+
+
+async def main():
+    print(f"{NUMBER_OF_CHATS} chats across {NUMBER_OF_CATEGORIES * CHANNELS_PER_CATEGORY * THREADS_PER_CHANNEL} threads "
+          f"in {NUMBER_OF_CATEGORIES} categories, {SIMULATED_DISCORD_ROUND_TRIP_SECONDS * 1000:.0f} ms simulated "
+          f"Discord round-trip, {PIN_UPDATE_PROBABILITY:.0%} chance of a `bot-config` pin update before each chat\n")
+    for label, use_config_cache in [("gather every message", False), ("event-invalidated cache", True)]:
+        results = await run(use_config_cache=use_config_cache)
+        print(f"{label:<24} gather p50: {results['p50_ms']:7.2f} ms | mean: {results['mean_ms']:7.2f} ms"
+              f" | Discord API calls per chat: {results['api_calls_per_chat']:5.2f}")
+        if use_config_cache:
+            for kind, kind_stats in results["cache_stats"].items():
+                print(f"{'':<24} {kind:<20} hit rate: {kind_stats['hit_rate']:6.1%}"
+                      f" | invalidations: {kind_stats['invalidations']:3d}"
+                      f" | estimated saved: {kind_stats['estimated_saved_ms'] / 1000:6.2f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
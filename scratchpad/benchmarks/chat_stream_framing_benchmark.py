@@ -0,0 +1,116 @@
+"""Benchmark: correctness and cost of reading a `/chat` stream, raw unframed tokens (the old `iter_any` + per-chunk
+`.decode` + `response_tokens` list) vs. server-sent-event framing with the incremental `ServerSentEventDecoder`.
+
+Replays the same reply (including multi-byte characters and the old `STOP_STREAMING` sentinel) through chunk
+boundaries the way a TCP stream can deliver them - at random byte offsets - and checks what the client reconstructs.
+
+Run with:
+    python -m scratchpad.benchmarks.chat_stream_framing_benchmark
+"""
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.api_interface.helpers.server_sent_events import (
+    DONE_EVENT,
+    ServerSentEventDecoder,
+    TOKEN_EVENT,
+    frame_token_stream,
+)
+
+LEGACY_STOP_STREAMING_TOKEN = "STOP_STREAMING"
+NUMBER_OF_TOKENS = 20_000
+MAX_CHUNK_BYTES = 64
+RANDOM_SEED = 42
+TOKEN_VOCABULARY = ["the ", "student", " asked", " about", " neurons", ".\n\n", " café", " — ", " 🧠", " résumé", "\n- "]
+
+
+def build_tokens() -> List[str]:
+    generator = random.Random(RANDOM_SEED)
+    return [generator.choice(TOKEN_VOCABULARY) for _ in range(NUMBER_OF_TOKENS)]
+
+
+def split_into_chunks(payload: bytes) -> List[bytes]:
+    generator = random.Random(RANDOM_SEED)
+    chunks = []
+    position = 0
+    while position < len(payload):
+        chunk_size = generator.randint(1, MAX_CHUNK_BYTES)
+        chunks.append(payload[position:position + chunk_size])
+        position += chunk_size
+    return chunks
+
+
+def read_legacy_stream(chunks: List[bytes]) -> Dict:
+    response_tokens = []
+    decode_errors = 0
+    sentinel_seen = False
+    for chunk in chunks:
+        try:
+            text = chunk.decode("utf-8")
+        except UnicodeDecodeError:
+            decode_errors += 1  # `run_callbacks` raised here, killing the stream
+            continue
+        sentinel_seen = sentinel_seen or LEGACY_STOP_STREAMING_TOKEN in text
+        response_tokens.append(text)
+    text = "".join(response_tokens).replace(LEGACY_STOP_STREAMING_TOKEN, "")
+    return {"text": text, "decode_errors": decode_errors, "stop_detected": sentinel_seen}
+
+
+def read_framed_stream(chunks: List[bytes]) -> Dict:
+    decoder = ServerSentEventDecoder()
+    tokens = []
+    done = False
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            if event.event == TOKEN_EVENT:
+                tokens.append(event.data["token"])
+            elif event.event == DONE_EVENT:
+                done = True
+    return {"text": "".join(tokens), "decode_errors": 0, "stop_detected": done}
+
+
+async def build_framed_payload(tokens: List[str]) -> bytes:
+    async def token_generator():
+        for token in tokens:
+            yield token
+
+    return b"".join([frame async for frame in frame_token_stream(token_generator())])
+
+
+def measure(label: str, reader, chunks: List[bytes], expected_text: str):
+    tik = time.perf_counter()
+    results = reader(chunks)
+    microseconds_per_token = (time.perf_counter() - tik) / NUMBER_OF_TOKENS * 1e6
+
+    tracemalloc.start()
+    reader(chunks)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<26} {microseconds_per_token:5.2f} us/token | {sum(map(len, chunks)) / 1e6:5.2f} MB on the wire"
+          f" | peak alloc: {peak_bytes / 1e6:5.2f} MB"
+          f" | undecodable chunks: {results['decode_errors']:4d}"
+          f" | end of stream detected: {str(results['stop_detected']):<5}"
+          f" | text intact: {results['text'] == expected_text}")
+
+
+async def main():
+    tokens = build_tokens()
+    expected_text = "".join(tokens)
+    legacy_chunks = split_into_chunks((expected_text + LEGACY_STOP_STREAMING_TOKEN).encode("utf-8"))
+    framed_chunks = split_into_chunks(await build_framed_payload(tokens))
+    print(f"{NUMBER_OF_TOKENS} tokens, split at random byte offsets into chunks of 1-{MAX_CHUNK_BYTES} bytes\n")
+    measure("raw tokens + .decode", read_legacy_stream, legacy_chunks, expected_text)
+    measure("SSE + incremental decoder", read_framed_stream, framed_chunks, expected_text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
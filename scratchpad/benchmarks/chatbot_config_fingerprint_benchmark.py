@@ -0,0 +1,101 @@
+"""Benchmark: time-to-first-token for a cached `Chatbot` with and without config fingerprinting.
+
+Uses a fake in-memory `MongoDatabaseManager` with a simulated round-trip latency and a fake streaming chat model,
+so the numbers isolate the per-request chain rebuild + context memory round-trips done in
+`Chatbot.apply_config_and_build_chain`.
+
+Run with:
+    python -m scratchpad.benchmarks.chatbot_config_fingerprint_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+os.environ.setdefault("OPENAI_API_KEY", "sk-not-a-real-key")
+
+from langchain.chat_models.fake import FakeListChatModel
+
+from jonbot.backend.ai.chatbot.chatbot import Chatbot
+from jonbot.backend.backend_database_operator.backend_database_operator import BackendDatabaseOperations
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.models.context_route import ContextRoute
+from jonbot.backend.data_layer.models.conversation_context import ConversationContextDescription
+from jonbot.backend.data_layer.models.conversation_models import ChatRequestConfig
+from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
+
+SIMULATED_DATABASE_ROUND_TRIP_SECONDS = 0.005
+NUMBER_OF_REQUESTS = 50
+
+
+class FakeStreamingChatModel(FakeListChatModel):
+    temperature: float = ChatRequestConfig().temperature
+
+
+class FakeMongoDatabaseManager(MongoDatabaseManager):
+    def __init__(self):
+        self._context_memories: Dict[str, dict] = {}
+
+    async def upsert_context_memory(self, request) -> bool:
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        self._context_memories[str(request.query)] = request.data.dict()
+        return True
+
+    async def get_context_memory(self, request):
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        document = self._context_memories.get(str(request.query))
+        if document is None:
+            return None
+        return ContextMemoryDocument(**document)
+
+
+async def time_to_first_token(chatbot: Chatbot, config: ChatRequestConfig, message_number: int,
+                              fingerprinting: bool) -> float:
+    tik = time.perf_counter()
+    if not fingerprinting:
+        chatbot._config_fingerprint = None  # force the pre-fingerprinting behaviour (full rebuild every request)
+    await chatbot.apply_config_and_build_chain(config=config)
+    async for _ in chatbot.chain.astream({"human_input": f"hello {message_number}"}):
+        return time.perf_counter() - tik
+
+
+async def run(fingerprinting: bool) -> List[float]:
+    database_operations = BackendDatabaseOperations(mongo_database=FakeMongoDatabaseManager())
+    config = ChatRequestConfig(config_prompts="You are a helpful bot " * 100, memory_messages=[])
+    chatbot = Chatbot(
+        human_user_id=0,
+        context_route=ContextRoute.dummy(dummy_text="benchmark"),
+        conversation_context_description=ConversationContextDescription(text="A benchmark conversation"),
+        database_name="benchmark_database",
+        database_operations=database_operations,
+        config=config,
+    )
+    fake_model = FakeStreamingChatModel(responses=["hello there friend"])
+    chatbot._get_model = lambda model_name, temperature: fake_model
+
+    return [await time_to_first_token(chatbot=chatbot,
+                                      config=config,
+                                      message_number=message_number,
+                                      fingerprinting=fingerprinting)
+            for message_number in range(NUMBER_OF_REQUESTS)]
+
+
+def print_results(label: str, latencies: List[float]):
+    print(f"{label:<35} first request: {latencies[0] * 1000:8.2f} ms"
+          f" | p50 (subsequent): {statistics.median(latencies[1:]) * 1000:8.2f} ms")
+
+
+async def main():
+    print(f"{NUMBER_OF_REQUESTS} requests with an unchanged config, "
+          f"{SIMULATED_DATABASE_ROUND_TRIP_SECONDS * 1000:.1f} ms simulated database round-trip\n")
+    print_results("rebuild every request", await run(fingerprinting=False))
+    print_results("config fingerprinting", await run(fingerprinting=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
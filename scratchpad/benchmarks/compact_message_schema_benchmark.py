@@ -0,0 +1,122 @@
+"""Benchmark: bytes per `raw_messages` document and history-read cost, legacy vs. compact `DiscordMessageDocument` format.
+
+Builds realistic synthetic messages (the `dump` is shaped like py-cord's `str(discord.Message)`), BSON-encodes them in
+both formats, and times reading a page of history back the way `get_message_history` does (BSON decode + model
+hydration).
+
+Run with:
+    python -m scratchpad.benchmarks.compact_message_schema_benchmark
+"""
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+import bson
+
+from jonbot.backend.data_layer.models.context_route import ContextRoute, SubContextComponent, \
+    SubContextComponentTypes, Frontends
+from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+from jonbot.backend.data_layer.models.timestamp_model import Timestamp
+
+NUMBER_OF_MESSAGES = 200
+HISTORY_PAGE_SIZE = 50
+REPEATS = 20
+
+
+def build_context_route() -> ContextRoute:
+    server = SubContextComponent(type=SubContextComponentTypes.SERVER, name="Neural Control of Movement",
+                                 id=1150736235430686720, parent=Frontends.DISCORD.value)
+    category = SubContextComponent(type=SubContextComponentTypes.CATEGORY, name="Class Channels",
+                                   id=1150736235430686721, parent=str(server))
+    channel = SubContextComponent(type=SubContextComponentTypes.CHANNEL, name="eye-tracking-and-oculomotor-control",
+                                  id=1150736235430686722, parent=str(server))
+    thread = SubContextComponent(type=SubContextComponentTypes.THREAD, name="how do saccades work",
+                                 id=1150736235430686723, parent=str(channel))
+    return ContextRoute(frontend=Frontends.DISCORD, server=server, category=category, channel=channel, thread=thread)
+
+
+def build_message(context_route: ContextRoute, message_number: int) -> DiscordMessageDocument:
+    message_id = 1160000000000000000 + message_number
+    created_at = datetime(2023, 10, 1, 12, 0) + timedelta(minutes=message_number)
+    dump = (f"<Message id={message_id} channel=<Thread id={context_route.thread.id} name='{context_route.thread.name}' "
+            f"parent=eye-tracking-and-oculomotor-control owner_id=1150736235430686799 locked=False archived=False> "
+            f"type=<MessageType.default: 0> author=<Member id=1150736235430686799 name='student' "
+            f"global_name='Student' bot=False nick=None guild=<Guild id={context_route.server.id} "
+            f"name='{context_route.server.name}' shard_id=0 chunked=True member_count=87>> "
+            f"flags=<MessageFlags value=0>>")
+    return DiscordMessageDocument(
+        content="Can you explain how the superior colliculus coordinates saccadic eye movements? " * 3,
+        reference_dict={"message_id": message_id, "channel_id": context_route.thread.id,
+                        "guild_id": context_route.server.id, "fail_if_not_exists": True},
+        message_id=message_id,
+        author="student",
+        author_id=1150736235430686799,
+        is_bot=message_number % 2 == 1,
+        in_thread=True,
+        timestamp=Timestamp.from_datetime(created_at),
+        edited_timestamp="",
+        received_timestamp=Timestamp.from_datetime(created_at + timedelta(seconds=1)),
+        mentions=[],
+        jump_url=f"https://discord.com/channels/{context_route.server.id}/{context_route.thread.id}/{message_id}",
+        dump=dump,
+        reactions=[],
+        attachment_urls=[],
+        attachment_local_paths=[],
+        parent_message_id=message_id - 1,
+        parent_message_jump_url="",
+        context_description="This conversation is happening in a Discord with a user named: `student` "
+                            "in a server named: `Neural Control of Movement`",
+        context_route=context_route,
+        context_route_full_path=context_route.full_path,
+        context_route_as_friendly_dict=context_route.friendly_path,
+        query={"message_id": message_id},
+        **context_route.as_flat_dict,
+    )
+
+
+def time_history_reads(encoded_documents: List[bytes], hydrate) -> float:
+    latencies = []
+    for _ in range(REPEATS):
+        tik = time.perf_counter()
+        for encoded_document in encoded_documents[:HISTORY_PAGE_SIZE]:
+            hydrate(bson.decode(encoded_document))
+        latencies.append(time.perf_counter() - tik)
+    return statistics.median(latencies)
+
+
+def main():
+    context_route = build_context_route()
+    messages = [build_message(context_route, message_number) for message_number in range(NUMBER_OF_MESSAGES)]
+
+    legacy_documents = [bson.encode(message.dict()) for message in messages]
+    compact_documents = [bson.encode(message.to_compact_document(include_dump=False)) for message in messages]
+    compact_with_dump_documents = [bson.encode(message.to_compact_document(include_dump=True)) for message in messages]
+    route_document_bytes = len(bson.encode(context_route.as_route_document()))
+
+    legacy_read = time_history_reads(legacy_documents, lambda document: DiscordMessageDocument(**document))
+    compact_read = time_history_reads(
+        compact_documents,
+        lambda document: DiscordMessageDocument.from_compact_document(document=document, context_route=context_route))
+
+    def average_bytes(documents: List[bytes]) -> float:
+        return sum(len(document) for document in documents) / len(documents)
+
+    print(f"{NUMBER_OF_MESSAGES} messages in one thread, history page of {HISTORY_PAGE_SIZE}\n")
+    print(f"legacy format:                 {average_bytes(legacy_documents):7.0f} bytes/message")
+    print(f"compact format (with dump):    {average_bytes(compact_with_dump_documents):7.0f} bytes/message")
+    print(f"compact format (no dump):      {average_bytes(compact_documents):7.0f} bytes/message"
+          f"  (+ one {route_document_bytes} byte shared route document)")
+    print(f"reduction (no dump):           {100 * (1 - average_bytes(compact_documents) / average_bytes(legacy_documents)):7.1f} %\n")
+    print(f"history read (decode + hydrate {HISTORY_PAGE_SIZE} messages): "
+          f"legacy {legacy_read * 1000:.2f} ms | compact {compact_read * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
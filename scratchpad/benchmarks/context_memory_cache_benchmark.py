@@ -0,0 +1,138 @@
+"""Benchmark: database round-trips and latency per chat turn with and without the write-through context memory cache.
+
+Each turn goes through the `Controller` the way `/chat` does - grab (or rebuild) the route's `Chatbot`, stream the
+reply, save the turn to context memory - and then looks up the updated memory ids for the Discord bot's memory emojis,
+which used to be a separate `/get_context_memory` request and is now sent inline in the stream's `done` event.
+The `ChatbotCache` is kept smaller than the number of active routes, so chatbots get evicted and rebuilt from their
+stored context memory too.
+
+Uses a fake in-memory `MongoDatabaseManager` with a simulated round-trip latency and a fake streaming chat model.
+Saving a turn counts tokens, which needs tiktoken's encoding files (downloaded and cached on first use).
+
+Run with:
+    python -m scratchpad.benchmarks.context_memory_cache_benchmark
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Dict
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+os.environ.setdefault("OPENAI_API_KEY", "sk-not-a-real-key")
+
+from langchain.chat_models.fake import FakeListChatModel
+
+from jonbot.backend.ai.chatbot.chatbot import Chatbot
+from jonbot.backend.ai.chatbot.chatbot_cache import ChatbotCache
+from jonbot.backend.backend_database_operator.backend_database_operator import BackendDatabaseOperations
+from jonbot.backend.controller.controller import Controller
+from jonbot.backend.data_layer.database.context_memory_cache import ContextMemoryCache
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.models.context_route import ContextRoute
+from jonbot.backend.data_layer.models.conversation_context import ConversationContextDescription
+from jonbot.backend.data_layer.models.conversation_models import ChatInput, ChatRequest, ChatRequestConfig
+from jonbot.backend.data_layer.models.user_stuff.memory.context_memory_document import ContextMemoryDocument
+
+SIMULATED_DATABASE_ROUND_TRIP_SECONDS = 0.005
+NUMBER_OF_TURNS = 300
+NUMBER_OF_CONTEXT_ROUTES = 24
+MAX_CACHED_CHATBOTS = 16
+RANDOM_SEED = 42
+
+
+class FakeStreamingChatModel(FakeListChatModel):
+    temperature: float = ChatRequestConfig().temperature
+
+
+class FakeMongoDatabaseManager(MongoDatabaseManager):
+    def __init__(self):
+        self._context_memories: Dict[str, dict] = {}
+        self.round_trips = Counter()
+
+    async def upsert_context_memory(self, request) -> bool:
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        self.round_trips["writes"] += 1
+        self._context_memories[str(request.query)] = request.data.dict()
+        return True
+
+    async def get_context_memory(self, request):
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        self.round_trips["reads"] += 1
+        document = self._context_memories.get(str(request.query))
+        if document is None:
+            return None
+        return ContextMemoryDocument(**document)
+
+
+def build_chat_request(route_number: int, turn_number: int, config: ChatRequestConfig) -> ChatRequest:
+    context_route = ContextRoute.dummy(dummy_text="benchmark")
+    context_route.channel.id = route_number
+    return ChatRequest(user_id=route_number,
+                       message_id=turn_number * 2,
+                       reply_message_id=turn_number * 2 + 1,
+                       chat_input=ChatInput(message=f"What do neurons do? (turn {turn_number})"),
+                       database_name="benchmark_database",
+                       context_route=context_route,
+                       conversation_context_description=ConversationContextDescription(text="benchmark channel"),
+                       config=config)
+
+
+async def run(use_context_memory_cache: bool) -> Dict:
+    mongo_database = FakeMongoDatabaseManager()
+    database_operations = BackendDatabaseOperations(
+        mongo_database=mongo_database,
+        context_memory_cache=ContextMemoryCache() if use_context_memory_cache else None,
+    )
+    controller = Controller(database_operations=database_operations,
+                            chatbot_cache=ChatbotCache(max_chatbots=MAX_CACHED_CHATBOTS))
+    config = ChatRequestConfig(config_prompts="You are a helpful teaching assistant. " * 20, memory_messages=[])
+    generator = random.Random(RANDOM_SEED)
+
+    turn_durations = []
+    memory_lookup_durations = []
+    for turn_number in range(NUMBER_OF_TURNS):
+        chat_request = build_chat_request(route_number=generator.randrange(NUMBER_OF_CONTEXT_ROUTES),
+                                          turn_number=turn_number,
+                                          config=config)
+        tik = time.perf_counter()
+        async for _ in controller.get_response_from_chatbot(chat_request=chat_request):
+            pass
+        lookup_tik = time.perf_counter()
+        memory_update = await controller.get_memory_update(chat_request=chat_request)
+        memory_lookup_durations.append(time.perf_counter() - lookup_tik)
+        turn_durations.append(time.perf_counter() - tik)
+        assert chat_request.reply_message_id in memory_update["memory_message_ids"]
+
+    return {"turn_p50_ms": statistics.median(turn_durations) * 1000,
+            "memory_lookup_p50_ms": statistics.median(memory_lookup_durations) * 1000,
+            "reads_per_turn": mongo_database.round_trips["reads"] / NUMBER_OF_TURNS,
+            "writes_per_turn": mongo_database.round_trips["writes"] / NUMBER_OF_TURNS,
+            "cache_stats": database_operations.context_memory_cache_stats}
+
+
+async def main():
+    fake_model = FakeStreamingChatModel(responses=["Neurons fire when their membrane potential crosses threshold."])
+    Chatbot._get_model = staticmethod(lambda model_name, temperature: fake_model)
+
+    print(f"{NUMBER_OF_TURNS} turns across {NUMBER_OF_CONTEXT_ROUTES} context routes "
+          f"({MAX_CACHED_CHATBOTS} cached chatbots), "
+          f"{SIMULATED_DATABASE_ROUND_TRIP_SECONDS * 1000:.1f} ms simulated database round-trip\n")
+    for label, use_context_memory_cache in [("no context memory cache", False),
+                                            ("write-through cache", True)]:
+        results = await run(use_context_memory_cache=use_context_memory_cache)
+        print(f"{label:<24} turn p50: {results['turn_p50_ms']:7.2f} ms"
+              f" | memory ids lookup p50: {results['memory_lookup_p50_ms']:6.2f} ms"
+              f" | database reads/turn: {results['reads_per_turn']:4.2f}"
+              f" | writes/turn: {results['writes_per_turn']:4.2f}")
+        if use_context_memory_cache:
+            print(f"{'':<24} {results['cache_stats']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""Benchmark: perceived streaming latency and edits per reply for `DiscordMessageResponder`, the old polling token
+queue loop vs. the event-driven, budgeted renderer.
+
+Streams tokens into many replies at once (several per channel) through fake Discord messages whose `edit` costs a
+simulated round-trip, and that enforce Discord's 5 edits per 5 seconds per channel the way py-cord experiences it
+(a 429, then waiting out the `Retry-After` before the edit goes through). "Perceived latency" is the time from a token
+arriving to the first edit that shows it.
+
+Run with:
+    python -m scratchpad.benchmarks.discord_responder_render_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.frontends.discord_bot.handlers.discord_message_responder import DiscordMessageResponder
+from jonbot.frontends.discord_bot.utilities.edit_rate_budget import EditRateBudget
+
+SIMULATED_EDIT_SECONDS = 0.03
+SCENARIOS = [(1, 1), (4, 3)]  # (channels, concurrent replies per channel)
+TOKENS_PER_REPLY = 200
+TOKENS_PER_SECOND = 40
+DISCORD_EDITS_PER_WINDOW = 5
+DISCORD_WINDOW_SECONDS = 5.0
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.recent_edit_times: List[float] = []
+        self.rate_limited_edits = 0
+
+    async def wait_for_edit_slot(self):
+        while True:
+            now = time.perf_counter()
+            self.recent_edit_times = [edit_time for edit_time in self.recent_edit_times
+                                      if now - edit_time < DISCORD_WINDOW_SECONDS]
+            if len(self.recent_edit_times) < DISCORD_EDITS_PER_WINDOW:
+                self.recent_edit_times.append(now)
+                return
+            self.rate_limited_edits += 1
+            await asyncio.sleep(self.recent_edit_times[0] + DISCORD_WINDOW_SECONDS - now)
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, edit_log: List):
+        self.id = 0
+        self.channel = channel
+        self.content = ""
+        self.jump_url = "https://discord.com/channels/0/0/0"
+        self._edit_log = edit_log
+
+    async def reply(self, content: str, mention_author: bool = True) -> "FakeMessage":
+        return FakeMessage(channel=self.channel, edit_log=self._edit_log)
+
+    async def edit(self, content: str = None, files=None):
+        await self.channel.wait_for_edit_slot()
+        await asyncio.sleep(SIMULATED_EDIT_SECONDS)
+        if content is not None:
+            self.content = content
+        self._edit_log.append((self.channel.id, time.perf_counter(), self, len(self.content)))
+
+
+class LegacyPollingResponder(DiscordMessageResponder):
+    """The token queue loop this repo used before - polls with growing sleeps, flushes every >20 tokens"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token_queue = asyncio.Queue()
+
+    async def add_token_to_queue(self, token: str):
+        await self._token_queue.put(token)
+
+    async def _edit_reply_message(self, **kwargs):
+        await self._reply_message.edit(**kwargs)
+        self.edit_count += 1
+
+    async def _run_token_queue_loop(self, base_delay: float = 0.5, chunk_size: int = 20):
+        chunk = []
+        delay = base_delay
+        while True:
+            await asyncio.sleep(delay)
+            delay *= 1.2
+            if self._token_queue.empty():
+                await asyncio.sleep(base_delay)
+                if self.done:
+                    break
+            else:
+                delay = base_delay
+                while not self._token_queue.empty():
+                    chunk.append(await self._token_queue.get())
+                if len(chunk) > chunk_size:
+                    await self.add_text_to_reply_message("".join(chunk))
+                    chunk = []
+        await self.add_text_to_reply_message("".join(chunk))
+
+
+async def stream_reply(responder: DiscordMessageResponder, channel: FakeChannel, edit_log: List) -> Dict:
+    await responder.initialize(message=FakeMessage(channel=channel, edit_log=edit_log))
+    token_arrivals = []  # (arrival time, reply length once this token is shown)
+    length = 0
+    for token_number in range(TOKENS_PER_REPLY):
+        await asyncio.sleep(1 / TOKENS_PER_SECOND)
+        token = f"tok{token_number % 10} "
+        length += len(token)
+        token_arrivals.append((time.perf_counter(), length))
+        await responder.add_token_to_queue(token)
+    await responder.shutdown()
+    return {"responder": responder, "token_arrivals": token_arrivals}
+
+
+def perceived_latencies(reply: Dict, edit_log: List) -> List[float]:
+    reply_message = reply["responder"]._reply_message
+    edits = [(edit_time, visible_length)
+             for _, edit_time, message, visible_length in edit_log if message is reply_message]
+    latencies = []
+    for arrival_time, length in reply["token_arrivals"]:
+        shown_at = next(edit_time for edit_time, visible_length in edits
+                        if visible_length >= length and edit_time >= arrival_time)
+        latencies.append(shown_at - arrival_time)
+    return latencies
+
+
+async def run(responder_class, number_of_channels: int, replies_per_channel: int) -> Dict:
+    edit_log = []
+    budget = EditRateBudget()
+    channels = [FakeChannel(channel_id=channel_number) for channel_number in range(number_of_channels)]
+    replies = await asyncio.gather(*[stream_reply(responder_class(edit_rate_budget=budget), channel, edit_log)
+                                     for channel in channels
+                                     for _ in range(replies_per_channel)])
+    latencies = sorted(latency for reply in replies for latency in perceived_latencies(reply, edit_log))
+    return {"p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            "edits_per_reply": statistics.mean(reply["responder"].edit_count for reply in replies),
+            "rate_limited_edits": sum(channel.rate_limited_edits for channel in channels)}
+
+
+async def main():
+    print(f"{TOKENS_PER_REPLY} tokens per reply at {TOKENS_PER_SECOND} tokens/s, "
+          f"{SIMULATED_EDIT_SECONDS * 1000:.0f} ms per edit")
+    for number_of_channels, replies_per_channel in SCENARIOS:
+        print(f"\n{number_of_channels} channel(s) x {replies_per_channel} concurrent replies")
+        for label, responder_class in [("polling token queue", LegacyPollingResponder),
+                                       ("event-driven renderer", DiscordMessageResponder)]:
+            results = await run(responder_class,
+                                number_of_channels=number_of_channels,
+                                replies_per_channel=replies_per_channel)
+            print(f"{label:<22} perceived latency p50: {results['p50_ms']:6.0f} ms | p99: {results['p99_ms']:6.0f} ms"
+                  f" | edits/reply: {results['edits_per_reply']:5.1f}"
+                  f" | 429s: {results['rate_limited_edits']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,205 @@
+"""Benchmark: Discord API calls and reply-path latency spent keeping the 💭 memory emojis up to date after each chat
+turn - `MemoryEmojiReconciler` vs. what `update_memory_emojis` used to do (scan the channel for 💭 messages,
+`fetch_message` every memory id that wasn't tagged, and remove reactions from each stale message one at a time -
+from the wrong message, the one that triggered the reply).
+
+Each turn adds a message and a reply to a fake channel whose context memory keeps the last few of them, so the memory
+window slides by two messages per turn. Every Discord call costs a simulated round-trip, and every reaction change
+sends a gateway event to a stand-in for `BotConfigCog`'s reaction listeners - whose own calls (a `fetch_message` for
+each added reaction, plus a ❌ for each 💭) are counted too, along with the memory message reloads its removals cause.
+
+Run with:
+    python -m scratchpad.benchmarks.memory_emoji_reconciler_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.memory_emoji_reconciler import MemoryEmojiReconciler
+
+SIMULATED_DISCORD_ROUND_TRIP_SECONDS = 0.01
+NUMBER_OF_TURNS = 12
+MEMORY_WINDOW_MESSAGES = 12
+SECONDS_BETWEEN_TURNS = 2.0
+
+discord_calls = Counter()
+memory_message_reloads = Counter()
+
+
+class FakeReaction:
+    def __init__(self, emoji: str):
+        self.emoji = emoji
+        self.me = True
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+BOT_USER = FakeUser(user_id=0)
+AUTHOR = FakeUser(user_id=1)
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", message_id: int):
+        self.channel = channel
+        self.id = message_id
+        self.author = AUTHOR
+        self.reactions: List[FakeReaction] = []
+
+    async def add_reaction(self, emoji: str, call_name: str = "add_reaction"):
+        discord_calls[call_name] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        if emoji not in [reaction.emoji for reaction in self.reactions]:
+            self.reactions.append(FakeReaction(emoji))
+        self.channel.send_reaction_event(added=True, message=self, emoji=emoji, user=BOT_USER)
+
+    async def remove_reaction(self, emoji: str, member: FakeUser):
+        discord_calls["remove_reaction"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        self.reactions = [reaction for reaction in self.reactions if reaction.emoji != emoji]
+        self.channel.send_reaction_event(added=False, message=self, emoji=emoji, user=member)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 1
+        self.messages: Dict[int, FakeMessage] = {}
+        # the reconciler whose changes the reaction listeners claim (None for the old listeners, which had none)
+        self.reconciler: Optional[MemoryEmojiReconciler] = None
+        self.pending_events: Set[asyncio.Task] = set()
+
+    def send_reaction_event(self, added: bool, message: FakeMessage, emoji: str, user: FakeUser):
+        handler = on_reaction_add if added else on_reaction_remove
+        task = asyncio.create_task(handler(channel=self, message=message, emoji=emoji, user=user))
+        self.pending_events.add(task)
+        task.add_done_callback(self.pending_events.discard)
+
+    def post(self) -> FakeMessage:
+        message = FakeMessage(channel=self, message_id=len(self.messages) + 1)
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return self.messages[message_id]
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        discord_calls["fetch_message"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        return self.messages[message_id]
+
+    async def history(self, limit: int = 100):
+        discord_calls["history"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        for message in sorted(self.messages.values(), key=lambda message: message.id, reverse=True)[:limit]:
+            yield message
+
+    def tagged_message_ids(self) -> List[int]:
+        return sorted(message.id for message in self.messages.values()
+                      if "💭" in [reaction.emoji for reaction in message.reactions])
+
+
+class FakeBot:
+    user = BOT_USER
+
+    def get_message(self, message_id: int):
+        return None
+
+
+async def on_reaction_add(channel: FakeChannel, message: FakeMessage, emoji: str, user: FakeUser):
+    """The Discord calls `BotConfigCog.on_raw_reaction_add` makes for one of the bot's own reactions"""
+    if channel.reconciler is not None and channel.reconciler.claim_addition(channel_id=channel.id,
+                                                                            message_id=message.id,
+                                                                            emoji=emoji,
+                                                                            user_id=user.id):
+        return
+    discord_calls["event handler fetch_message"] += 1
+    await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+    if emoji == "💭":
+        await message.add_reaction("❌", call_name="event handler add_reaction")
+
+
+async def on_reaction_remove(channel: FakeChannel, message: FakeMessage, emoji: str, user: FakeUser):
+    """`BotConfigCog.on_raw_reaction_remove` - a 💭 removal it can't claim reloads the channel's memory messages"""
+    if emoji != "💭":
+        return
+    if channel.reconciler is not None and channel.reconciler.claim_removal(channel_id=channel.id,
+                                                                           message_id=message.id,
+                                                                           user_id=user.id):
+        return
+    memory_message_reloads["reloads"] += 1
+
+
+async def scan_for_memory_messages(channel: FakeChannel) -> List[FakeMessage]:
+    return [message async for message in channel.history(limit=100)
+            if "💭" in [reaction.emoji for reaction in message.reactions]]
+
+
+async def previous_update_memory_emojis(memory_message_ids: List[int], message: FakeMessage):
+    current_message_ids = [current.id for current in await scan_for_memory_messages(message.channel)]
+    for current_message_id in current_message_ids:
+        if current_message_id not in memory_message_ids:
+            for emoji, member in [("💭", BOT_USER), ("💭", message.author), ("❌", BOT_USER), ("❌", message.author)]:
+                await message.remove_reaction(emoji, member)  # `message` is the one that triggered the reply
+
+    async def tag(message_id: int):
+        memory_message = await message.channel.fetch_message(message_id)
+        await memory_message.add_reaction("💭")
+
+    await asyncio.gather(*[tag(message_id) for message_id in memory_message_ids
+                           if message_id not in current_message_ids])
+
+
+async def run(use_reconciler: bool) -> Dict:
+    channel = FakeChannel()
+    reconciler = MemoryEmojiReconciler(bot=FakeBot(),
+                                       load_tagged_message_ids=lambda channel: asyncio.sleep(0, result=[]))
+    if use_reconciler:
+        channel.reconciler = reconciler
+    discord_calls.clear()
+    memory_message_reloads.clear()
+    reply_path_durations = []
+    for _ in range(NUMBER_OF_TURNS):
+        channel.post()
+        reply = channel.post()
+        memory_message_ids = sorted(channel.messages)[-MEMORY_WINDOW_MESSAGES:]
+        tik = time.perf_counter()
+        if use_reconciler:
+            reconciler.update(channel=channel, memory_message_ids=memory_message_ids)
+        else:
+            await previous_update_memory_emojis(memory_message_ids=memory_message_ids, message=reply)
+        reply_path_durations.append(time.perf_counter() - tik)
+        await asyncio.sleep(SECONDS_BETWEEN_TURNS)
+    await asyncio.sleep(3)
+
+    final_memory_message_ids = sorted(channel.messages)[-MEMORY_WINDOW_MESSAGES:]
+    return {"reply_path_p50_ms": statistics.median(reply_path_durations) * 1000,
+            "calls_per_turn": sum(discord_calls.values()) / NUMBER_OF_TURNS,
+            "calls": dict(discord_calls),
+            "memory_message_reloads": memory_message_reloads["reloads"],
+            "in_step": channel.tagged_message_ids() == final_memory_message_ids,
+            "stale_tags": len(set(channel.tagged_message_ids()) - set(final_memory_message_ids))}
+
+
+async def main():
+    print(f"{NUMBER_OF_TURNS} turns, a {MEMORY_WINDOW_MESSAGES} message memory window, "
+          f"{SIMULATED_DISCORD_ROUND_TRIP_SECONDS * 1000:.0f} ms simulated Discord round-trip\n")
+    for label, use_reconciler in [("scan + fetch + remove", False), ("MemoryEmojiReconciler", True)]:
+        results = await run(use_reconciler=use_reconciler)
+        print(f"{label:<22} on the reply path p50: {results['reply_path_p50_ms']:6.1f} ms"
+              f" | Discord calls/turn: {results['calls_per_turn']:5.2f}"
+              f" | 💭 matches memory: {results['in_step']} ({results['stale_tags']} stale tags)")
+        print(f"{'':<22} {results['calls']} | memory message reloads: {results['memory_message_reloads']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Benchmark: the Discord bot's per-channel 💭 memory message bookkeeping on reaction events - `ChannelMemoryMessages`
+(keyed by message id) vs. the list `on_raw_reaction_add` used to keep, where the duplicate check compared a
+`discord.Message` against `DiscordMessageDocument`s (so it never matched) and removal re-scanned the list and
+`deepcopy`'d the document.
+
+Replays a stream of 💭 adds (some of them re-reactions to a message that's already a memory message) and ❌ removes,
+and reports the time per event and how many documents each chat request would end up sending.
+
+Run with:
+    python -m scratchpad.benchmarks.memory_message_bookkeeping_benchmark
+"""
+import os
+import random
+import time
+from copy import deepcopy
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.backend.data_layer.models.discord_stuff.discord_message_document import DiscordMessageDocument
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.helpers.channel_memory_messages import ChannelMemoryMessages
+
+NUMBER_OF_EVENTS = 5000
+NUMBER_OF_MESSAGES = 400
+REMOVE_PROBABILITY = 0.3
+RANDOM_SEED = 42
+
+
+def build_events() -> List[tuple]:
+    generator = random.Random(RANDOM_SEED)
+    return [("remove" if generator.random() < REMOVE_PROBABILITY else "add", generator.randrange(NUMBER_OF_MESSAGES))
+            for _ in range(NUMBER_OF_EVENTS)]
+
+
+def build_document(message_id: int) -> DiscordMessageDocument:
+    return DiscordMessageDocument.construct(message_id=message_id, content=f"message {message_id} " * 20)
+
+
+def run_list_bookkeeping(events: List[tuple]) -> Dict:
+    memory_messages: List[DiscordMessageDocument] = []
+    tik = time.perf_counter()
+    for action, message_id in events:
+        if action == "add":
+            memory_messages.append(build_document(message_id))  # `discord.Message not in [documents]` is always True
+        else:
+            for message in memory_messages:
+                if message.message_id == message_id:
+                    for document in memory_messages:
+                        if document.message_id == message_id:
+                            deepcopy(document.dict())
+                            memory_messages.remove(document)
+                            break
+                    break
+    return {"us_per_event": (time.perf_counter() - tik) / len(events) * 1e6,
+            "documents_sent": len(memory_messages),
+            "unique_messages": len({message.message_id for message in memory_messages})}
+
+
+def run_keyed_bookkeeping(events: List[tuple]) -> Dict:
+    memory_messages = ChannelMemoryMessages()
+    tik = time.perf_counter()
+    for action, message_id in events:
+        if action == "add":
+            if message_id not in memory_messages:
+                memory_messages.add(build_document(message_id))
+        else:
+            memory_messages.remove(message_id)
+    documents = memory_messages.documents
+    return {"us_per_event": (time.perf_counter() - tik) / len(events) * 1e6,
+            "documents_sent": len(documents),
+            "unique_messages": len({document.message_id for document in documents})}
+
+
+def main():
+    events = build_events()
+    print(f"{NUMBER_OF_EVENTS} reaction events over {NUMBER_OF_MESSAGES} messages "
+          f"({REMOVE_PROBABILITY:.0%} removes)\n")
+    for label, run in [("list", run_list_bookkeeping), ("ChannelMemoryMessages", run_keyed_bookkeeping)]:
+        results = run(events)
+        print(f"{label:<22} {results['us_per_event']:8.2f} us/event | memory messages sent per chat: "
+              f"{results['documents_sent']:5d} ({results['unique_messages']} unique)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: per-turn token bookkeeping of the chatbot memory - langchain's `ConversationTokenBufferMemory` (re-tokenises
+the whole buffer after every turn, and again for every pruned message) vs. `ChatbotConversationMemory`'s cached
+per-message counts and running total. Also times `get_number_of_tokens_from_string` with and without the memoized
+encoder lookup.
+
+Tokenising needs tiktoken's encoding files (downloaded and cached on first use).
+
+Run with:
+    python -m scratchpad.benchmarks.memory_token_accounting_benchmark
+"""
+import os
+import random
+import statistics
+import time
+from typing import Dict
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import tiktoken
+from langchain.chat_models import ChatOpenAI
+from langchain.memory import ChatMessageHistory, ConversationTokenBufferMemory
+
+from jonbot.backend.ai.chatbot.components.memory.conversation_memory.conversation_memory import (
+    ChatbotConversationMemory,
+)
+from jonbot.backend.ai.utilities.get_number_of_tokens_from_string import get_number_of_tokens_from_string
+
+MODEL_NAME = "gpt-3.5-turbo-16k"
+MAX_TOKEN_LIMITS = [1000, 8000]
+NUMBER_OF_TURNS = 300
+STRING_COUNTS = 2000
+RANDOM_SEED = 42
+WORDS = ["the", "neuron", "fires", "when", "its", "membrane", "potential", "crosses", "threshold", "and", "then",
+         "students", "asked", "about", "synapses", "dopamine", "reward", "prediction", "error", "signals"]
+
+
+def build_memory(memory_class, max_token_limit: int):
+    memory_kwargs = dict(llm=ChatOpenAI(model_name=MODEL_NAME),
+                         max_token_limit=max_token_limit,
+                         chat_memory=ChatMessageHistory(),
+                         input_key="human_input",
+                         memory_key="chat_memory",
+                         return_messages=True)
+    if memory_class is ChatbotConversationMemory:
+        # skip the database-backed context memory handler - only the in-memory bookkeeping is timed here
+        return ChatbotConversationMemory.construct(**memory_kwargs, buffer_token_count=0)
+    return memory_class(**memory_kwargs)
+
+
+def run_turns(memory_class, max_token_limit: int) -> Dict:
+    generator = random.Random(RANDOM_SEED)
+    memory = build_memory(memory_class, max_token_limit=max_token_limit)
+    turn_durations = []
+    for _ in range(NUMBER_OF_TURNS):
+        human_input = " ".join(generator.choice(WORDS) for _ in range(generator.randint(5, 80)))
+        output = " ".join(generator.choice(WORDS) for _ in range(generator.randint(20, 300)))
+        tik = time.perf_counter()
+        memory.save_context({"human_input": human_input}, {"output": output})
+        if memory_class is ChatbotConversationMemory:
+            token_count = memory.token_count
+        else:
+            token_count = memory.llm.get_num_tokens_from_messages(memory.buffer)  # what `token_count` used to do
+        turn_durations.append(time.perf_counter() - tik)
+    turn_durations.sort()
+    return {"p50_ms": statistics.median(turn_durations) * 1000,
+            "p99_ms": turn_durations[int(len(turn_durations) * 0.99) - 1] * 1000,
+            "buffered_messages": len(memory.chat_memory.messages),
+            "token_count": token_count}
+
+
+def time_string_counts(count_tokens) -> float:
+    tik = time.perf_counter()
+    for string_number in range(STRING_COUNTS):
+        count_tokens(f"message number {string_number}", MODEL_NAME)
+    return (time.perf_counter() - tik) / STRING_COUNTS * 1e6
+
+
+def main():
+    for max_token_limit in MAX_TOKEN_LIMITS:
+        print(f"{NUMBER_OF_TURNS} turns, max_token_limit={max_token_limit}")
+        for label, memory_class in [("ConversationTokenBufferMemory", ConversationTokenBufferMemory),
+                                    ("ChatbotConversationMemory", ChatbotConversationMemory)]:
+            results = run_turns(memory_class, max_token_limit=max_token_limit)
+            print(f"{label:<30} per-turn bookkeeping p50: {results['p50_ms']:7.3f} ms | p99: {results['p99_ms']:7.3f} ms"
+                  f" | {results['buffered_messages']} messages, {results['token_count']} tokens")
+        print()
+
+    uncached_us = time_string_counts(lambda string, model: len(tiktoken.encoding_for_model(model).encode(string)))
+    cached_us = time_string_counts(get_number_of_tokens_from_string)
+    print(f"get_number_of_tokens_from_string: {uncached_us:6.2f} us/call with `encoding_for_model` per call | "
+          f"{cached_us:6.2f} us/call with the memoized encoder")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: caller-observed `MongoDatabaseManager.upsert_one` latency for each `WriteMode`.
+
+Uses a fake collection whose `update_one` costs a simulated (write concern dependent) round-trip, and fails every
+`FAILURE_EVERY`th write, so the numbers show what each mode costs the caller and that fire-and-forget failures
+still get reported.
+
+Run with:
+    python -m scratchpad.benchmarks.mongo_write_mode_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from pymongo import WriteConcern
+
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager, WriteMode
+
+SIMULATED_ROUND_TRIP_SECONDS = {"w=1": 0.002, "w=majority,j=true": 0.010}
+NUMBER_OF_WRITES = 200
+FAILURE_EVERY = 50
+
+
+class FakeCollection:
+    def __init__(self, round_trip_seconds: float):
+        self.round_trip_seconds = round_trip_seconds
+        self.writes = 0
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        await asyncio.sleep(self.round_trip_seconds)
+        self.writes += 1
+        if self.writes % FAILURE_EVERY == 0:
+            raise Exception("simulated write failure")
+
+
+class FakeMongoDatabaseManager(MongoDatabaseManager):
+    def __init__(self, round_trip_seconds: float):
+        self.write_concern = WriteConcern(w=1)
+        self._background_writes = set()
+        self.background_write_errors = 0
+        self.collection = FakeCollection(round_trip_seconds=round_trip_seconds)
+
+    async def ensure_indexes(self, database_name: str):
+        pass
+
+    def get_write_collection(self, database_name: str, collection_name: str):
+        return self.collection
+
+
+async def run(write_mode: WriteMode, round_trip_seconds: float) -> Dict:
+    mongo_database = FakeMongoDatabaseManager(round_trip_seconds=round_trip_seconds)
+    latencies = []
+    failures = 0
+
+    wall_clock_start = time.perf_counter()
+    for write_number in range(NUMBER_OF_WRITES):
+        tik = time.perf_counter()
+        success = await mongo_database.upsert_one(database_name="benchmark_database",
+                                                  collection_name="analysis_global",
+                                                  data={"result": "x" * 1000},
+                                                  query={"write_number": write_number},
+                                                  write_mode=write_mode)
+        latencies.append(time.perf_counter() - tik)
+        failures += not success
+    await mongo_database.drain_background_writes()
+    wall_clock_duration = time.perf_counter() - wall_clock_start
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "wall_clock_s": wall_clock_duration,
+        "reported_failures": failures + mongo_database.background_write_errors,
+    }
+
+
+async def main():
+    print(f"{NUMBER_OF_WRITES} sequential upsert_one calls, every {FAILURE_EVERY}th write fails\n")
+    for write_concern_label, round_trip_seconds in SIMULATED_ROUND_TRIP_SECONDS.items():
+        for write_mode in WriteMode:
+            results = await run(write_mode=write_mode, round_trip_seconds=round_trip_seconds)
+            print(f"{write_concern_label:<18} {write_mode.value:<16} p50: {results['p50_ms']:7.3f} ms"
+                  f" | p99: {results['p99_ms']:7.3f} ms | wall clock (incl. drain): {results['wall_clock_s']:.2f} s"
+                  f" | failures reported: {results['reported_failures']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""Benchmark: finding a channel's 💭-tagged memory messages with `BotConfigCog`'s Mongo reaction index vs. scanning
+the channel's recent history (what `look_for_emoji_reaction_in_channel` used to do).
+
+Uses a fake channel with a long history - a few of its messages tagged with 💭, some of them older than the last 100 -
+whose `history()` pages (100 messages each) and `fetch_message()` calls cost a simulated Discord round-trip, and a
+fake `DiscordDatabaseOperations` holding the reaction index in memory with a simulated database round-trip. The first
+indexed lookup starts backfilling the channel's whole history into the index in the background (and answers from the
+100-message scan meanwhile) - the timed lookups run once that's done.
+
+Run with:
+    python -m scratchpad.benchmarks.reaction_index_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.backend.data_layer.models.database_request_response_models import MessageReactionsResponse
+from jonbot.frontends.discord_bot.cogs.bot_config_cog.bot_config_cog import BotConfigCog
+
+SIMULATED_DISCORD_ROUND_TRIP_SECONDS = 0.03
+SIMULATED_DATABASE_ROUND_TRIP_SECONDS = 0.005
+DISCORD_HISTORY_PAGE_SIZE = 100
+NUMBER_OF_MESSAGES = 2000
+MEMORY_MESSAGE_EVERY = 150
+NUMBER_OF_LOOKUPS = 50
+
+discord_calls = {"count": 0}
+
+
+class FakeReaction:
+    def __init__(self, emoji: str):
+        self.emoji = emoji
+        self.me = True
+        self.count = 1
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, reactions: List[FakeReaction]):
+        self.id = message_id
+        self.reactions = reactions
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 1
+        self.name = "chat"
+        self.guild = None
+        # newest first, like `channel.history()`
+        self.messages = [FakeMessage(message_id=message_id,
+                                     reactions=[FakeReaction("💭")] if message_id % MEMORY_MESSAGE_EVERY == 0 else [])
+                         for message_id in reversed(range(1, NUMBER_OF_MESSAGES + 1))]
+        self._messages_by_id = {message.id: message for message in self.messages}
+
+    async def history(self, limit: int = 100, before: FakeMessage = None):
+        messages = [message for message in self.messages if before is None or message.id < before.id]
+        messages = messages if limit is None else messages[:limit]
+        for message_number, message in enumerate(messages):
+            if message_number % DISCORD_HISTORY_PAGE_SIZE == 0:
+                discord_calls["count"] += 1
+                await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+            yield message
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        discord_calls["count"] += 1
+        await asyncio.sleep(SIMULATED_DISCORD_ROUND_TRIP_SECONDS)
+        return self._messages_by_id[message_id]
+
+
+class FakeDiscordDatabaseOperations:
+    def __init__(self):
+        self._counts: Dict[Tuple[int, int, str], int] = {}
+        self._backfilled_channel_ids = set()
+
+    async def upsert_message_reactions(self, changes, backfilled_channel_id: int = None) -> bool:
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        if backfilled_channel_id is not None:
+            self._counts = {key: count for key, count in self._counts.items() if key[0] != backfilled_channel_id}
+            self._backfilled_channel_ids.add(backfilled_channel_id)
+        for change in changes:
+            key = (change.channel_id, change.message_id, change.emoji)
+            self._counts[key] = change.count if change.count is not None else self._counts.get(key, 0) + change.count_change
+        return True
+
+    async def get_message_reactions(self, channel_id: int, emoji: str) -> MessageReactionsResponse:
+        await asyncio.sleep(SIMULATED_DATABASE_ROUND_TRIP_SECONDS)
+        return MessageReactionsResponse(success=True,
+                                        backfilled=channel_id in self._backfilled_channel_ids,
+                                        message_ids=sorted(message_id
+                                                           for (key_channel_id, message_id, key_emoji), count
+                                                           in self._counts.items()
+                                                           if key_channel_id == channel_id
+                                                           and key_emoji == emoji and count > 0))
+
+
+async def run(use_reaction_index: bool) -> Dict:
+    channel = FakeChannel()
+    cog = BotConfigCog(bot=None, database_operations=FakeDiscordDatabaseOperations() if use_reaction_index else None)
+
+    tik = time.perf_counter()
+    await cog.look_for_emoji_reaction_in_channel(channel=channel, emoji="💭")
+    first_lookup_ms = (time.perf_counter() - tik) * 1000
+    tik = time.perf_counter()
+    await asyncio.gather(*cog._reaction_index_backfills.values())
+    backfill_ms = (time.perf_counter() - tik) * 1000
+
+    discord_calls["count"] = 0
+    latencies = []
+    for _ in range(NUMBER_OF_LOOKUPS):
+        tik = time.perf_counter()
+        messages = await cog.look_for_emoji_reaction_in_channel(channel=channel, emoji="💭")
+        latencies.append(time.perf_counter() - tik)
+
+    return {"first_lookup_ms": first_lookup_ms,
+            "backfill_ms": backfill_ms,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "discord_calls_per_lookup": discord_calls["count"] / NUMBER_OF_LOOKUPS,
+            "found": len(messages),
+            "newest_first": [message.id for message in messages] == sorted((message.id for message in messages),
+                                                                           reverse=True)}
+
+
+async def main():
+    tagged = NUMBER_OF_MESSAGES // MEMORY_MESSAGE_EVERY
+    print(f"{NUMBER_OF_LOOKUPS} lookups in a {NUMBER_OF_MESSAGES} message channel with {tagged} 💭 messages, "
+          f"{SIMULATED_DISCORD_ROUND_TRIP_SECONDS * 1000:.0f} ms simulated Discord round-trip, "
+          f"{SIMULATED_DATABASE_ROUND_TRIP_SECONDS * 1000:.0f} ms simulated database round-trip\n")
+    for label, use_reaction_index in [("scan last 100 messages", False), ("reaction index", True)]:
+        results = await run(use_reaction_index=use_reaction_index)
+        print(f"{label:<24} first lookup: {results['first_lookup_ms']:6.1f} ms"
+              f" (+{results['backfill_ms']:6.1f} ms background backfill) | p50: {results['p50_ms']:6.1f} ms"
+              f" | Discord calls/lookup: {results['discord_calls_per_lookup']:5.2f}"
+              f" | found {results['found']}/{tagged} (newest first: {results['newest_first']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
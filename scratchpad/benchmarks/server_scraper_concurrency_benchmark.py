@@ -0,0 +1,176 @@
+"""Benchmark: wall-clock time of `ServerScraperCog._scrape` with serial vs. bounded-concurrent channel/thread scraping,
+and of an incremental (checkpointed) re-scrape after a few new messages.
+
+Uses fake channels whose `history` costs a simulated round-trip per 100 message page, and fake database operations
+with a small upsert cost, so the numbers show how much of a scrape is spent waiting on Discord one request at a time.
+
+Run with:
+    python -m scratchpad.benchmarks.server_scraper_concurrency_benchmark
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import discord
+
+from jonbot.frontends.discord_bot.cogs import server_scraper_cog
+from jonbot.frontends.discord_bot.cogs.server_scraper_cog import ServerScraperCog
+
+SIMULATED_HISTORY_PAGE_SECONDS = 0.05
+SIMULATED_UPSERT_SECONDS = 0.005
+NEW_MESSAGES_PER_CHANNEL = 5
+NUMBER_OF_CHANNELS = 12
+MESSAGES_PER_CHANNEL = 150
+THREADS_PER_CHANNEL = 6
+MESSAGES_PER_THREAD = 30
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, thread: "FakeChannel" = None):
+        self.id = message_id
+        self.thread = thread
+
+
+class FakeChannel(discord.TextChannel):
+    def __init__(self, channel_id: int, name: str, messages: List[FakeMessage]):
+        self.id = channel_id
+        self.name = name
+        self.guild = FakeContext.guild
+        self.messages = messages
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def last_message_id(self):
+        return self.messages[-1].id if self.messages else None
+
+    @property
+    def threads(self):
+        return [message.thread for message in self.messages if message.thread is not None]
+
+    async def archived_threads(self, limit=None):
+        return
+        yield
+
+    async def history(self, limit=None, oldest_first=True, after=None):
+        new_messages = [message for message in self.messages if after is None or message.id > after.id]
+        for message_number, message in enumerate(new_messages):
+            if message_number % 100 == 0:
+                await asyncio.sleep(SIMULATED_HISTORY_PAGE_SECONDS)
+            yield message
+
+
+class FakeDatabaseOperations:
+    def __init__(self, checkpoints: Dict = None):
+        self.messages_upserted = 0
+        self.chats_upserted = 0
+        self.checkpoints = checkpoints if checkpoints is not None else {}
+
+    async def get_scrape_checkpoints(self, server_id: int) -> Dict:
+        return dict(self.checkpoints)
+
+    async def upsert_scrape_checkpoint(self, checkpoint) -> bool:
+        self.checkpoints[checkpoint.channel_id] = checkpoint
+        return True
+
+    async def upsert_messages(self, messages: List, download_attachments: bool = True) -> bool:
+        await asyncio.sleep(SIMULATED_UPSERT_SECONDS)
+        self.messages_upserted += len(messages)
+        return True
+
+    async def upsert_chats(self, chat_documents: List) -> bool:
+        await asyncio.sleep(SIMULATED_UPSERT_SECONDS)
+        self.chats_upserted += len(chat_documents)
+        return True
+
+
+class FakeReplyMessage:
+    async def edit(self, embed: discord.Embed):
+        pass
+
+
+class FakeContext:
+    class guild:
+        id = 0
+        name = "benchmark server"
+
+    class channel:
+        name = "benchmark-channel"
+
+    async def send(self, embed: discord.Embed):
+        return FakeReplyMessage()
+
+
+class FakeChatDocument:
+    @classmethod
+    async def build(cls, chat_id: int, parent_message, messages: List, download_attachments: bool = True):
+        return {"chat_id": chat_id, "messages": len(messages)}
+
+
+def build_channels() -> List[FakeChannel]:
+    channels = []
+    for channel_number in range(NUMBER_OF_CHANNELS):
+        messages = []
+        for message_number in range(MESSAGES_PER_CHANNEL):
+            message_id = (channel_number + 1) * 1_000_000 + message_number * 1000
+            thread = None
+            if message_number < THREADS_PER_CHANNEL:
+                thread_messages = [FakeMessage(message_id=message_id + offset)
+                                   for offset in range(1, MESSAGES_PER_THREAD + 1)]
+                thread = FakeChannel(channel_id=message_id, name=f"thread-{message_id}", messages=thread_messages)
+            messages.append(FakeMessage(message_id=message_id, thread=thread))
+        channels.append(FakeChannel(channel_id=channel_number, name=f"channel-{channel_number}", messages=messages))
+    return channels
+
+
+def add_new_messages(channels: List[FakeChannel]):
+    for channel in channels:
+        last_message_id = channel.messages[-1].id
+        channel.messages.extend([FakeMessage(message_id=last_message_id + 1000 * (offset + 1))
+                                 for offset in range(NEW_MESSAGES_PER_CHANNEL)])
+
+
+async def run(max_concurrent_scrapes: int, channels: List[FakeChannel], checkpoints: Dict = None) -> Dict:
+    database_operations = FakeDatabaseOperations(checkpoints=checkpoints)
+    cog = ServerScraperCog(database_operations=database_operations,
+                           max_concurrent_scrapes=max_concurrent_scrapes,
+                           history_requests_per_second=1000)
+    tik = time.perf_counter()
+    await cog._scrape(channels=channels, ctx=FakeContext())
+    return {"wall_clock_s": time.perf_counter() - tik,
+            "messages_upserted": database_operations.messages_upserted,
+            "chats_upserted": database_operations.chats_upserted,
+            "checkpoints": database_operations.checkpoints}
+
+
+def print_results(label: str, results: Dict):
+    print(f"{label:<28} wall clock: {results['wall_clock_s']:6.2f} s"
+          f" | messages upserted: {results['messages_upserted']} | chats upserted: {results['chats_upserted']}")
+
+
+async def main():
+    server_scraper_cog.DiscordChatDocument = FakeChatDocument
+    print(f"{NUMBER_OF_CHANNELS} channels x {MESSAGES_PER_CHANNEL} messages, {THREADS_PER_CHANNEL} threads of "
+          f"{MESSAGES_PER_THREAD} messages each, {SIMULATED_HISTORY_PAGE_SECONDS * 1000:.0f} ms per history page\n")
+    for max_concurrent_scrapes in [1, 4, 8, 16]:
+        results = await run(max_concurrent_scrapes=max_concurrent_scrapes, channels=build_channels())
+        print_results(f"max_concurrent_scrapes={max_concurrent_scrapes}", results)
+
+    channels = build_channels()
+    full_results = await run(max_concurrent_scrapes=8, channels=channels)
+    add_new_messages(channels)
+    incremental_results = await run(max_concurrent_scrapes=8, channels=channels,
+                                    checkpoints=full_results["checkpoints"])
+    print_results(f"incremental, +{NEW_MESSAGES_PER_CHANNEL} per channel", incremental_results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""Benchmark: building the DM prompt for a classbot student - `StudentInterestPromptCache` (summaries built offline,
+served from memory, missing ones summarized in the background) vs. what `get_private_message_prompts` used to do
+(read the student's interests file and summarize it with a synchronous `chain.invoke` on every DM).
+
+Uses a fake summary chain whose calls take a simulated model latency - blocking (`time.sleep`) for `invoke`, like a
+synchronous HTTP request, and non-blocking for `ainvoke`/`abatch`. A heartbeat task measures how long the event loop is
+blocked while the DMs come in. A few students have no offline summary yet, to exercise the background fallback.
+
+Run with:
+    python -m scratchpad.benchmarks.student_interest_prompt_cache_benchmark
+"""
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.backend.data_layer.analysis import student_interest_prompt_cache
+from jonbot.backend.data_layer.analysis.student_interest_prompt_cache import (
+    ORGANIZED_RESULTS_FOLDER_NAME,
+    StudentInterestPromptCache,
+    build_student_interest_summaries,
+)
+
+SIMULATED_MODEL_SECONDS = 0.5
+NUMBER_OF_STUDENTS = 30
+STUDENTS_WITHOUT_OFFLINE_SUMMARY = 3
+NUMBER_OF_DMS = 20
+HEARTBEAT_SECONDS = 0.01
+RANDOM_SEED = 42
+
+model_calls = {"count": 0}
+
+
+class FakeSummary:
+    def __init__(self, text: str):
+        self.content = f"summary of {len(text)} characters of interests"
+
+
+class FakeSummaryChain:
+    def invoke(self, inputs: Dict[str, str]) -> FakeSummary:
+        model_calls["count"] += 1
+        time.sleep(SIMULATED_MODEL_SECONDS)
+        return FakeSummary(inputs["text"])
+
+    async def ainvoke(self, inputs: Dict[str, str]) -> FakeSummary:
+        model_calls["count"] += 1
+        await asyncio.sleep(SIMULATED_MODEL_SECONDS)
+        return FakeSummary(inputs["text"])
+
+    async def abatch(self, inputs: List[Dict[str, str]]) -> List[FakeSummary]:
+        return await asyncio.gather(*[self.ainvoke(chain_inputs) for chain_inputs in inputs])
+
+
+def previous_get_private_message_prompts(student_interests_folder: Path, user_id: int) -> str:
+    file_path = student_interests_folder / ORGANIZED_RESULTS_FOLDER_NAME / f"student_{user_id}_interests_organized.md"
+    with open(file_path, "r") as file:
+        summarized_text = FakeSummaryChain().invoke({"text": file.read()})
+    return f"This student has expressed interests in these topics: \n\n {summarized_text.content}"
+
+
+async def measure_blocking(dms) -> Dict:
+    lags = []
+    running = True
+
+    async def heartbeat():
+        while running:
+            tik = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            lags.append(time.perf_counter() - tik - HEARTBEAT_SECONDS)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+    model_calls["count"] = 0
+    durations = []
+    for dm in dms:
+        tik = time.perf_counter()
+        dm()
+        durations.append(time.perf_counter() - tik)
+        await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+    running = False
+    await heartbeat_task
+    return {"p50_ms": statistics.median(durations) * 1000,
+            "max_loop_blocked_ms": max(lags) * 1000,
+            "model_calls": model_calls["count"]}
+
+
+async def main():
+    student_interest_prompt_cache.create_student_interest_summary_chain = FakeSummaryChain
+    generator = random.Random(RANDOM_SEED)
+    student_ids = [generator.randrange(10 ** 17, 10 ** 18) for _ in range(NUMBER_OF_STUDENTS)]
+    dm_student_ids = [generator.choice(student_ids) for _ in range(NUMBER_OF_DMS)]
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        student_interests_folder = Path(temporary_folder)
+        organized_results_folder = student_interests_folder / ORGANIZED_RESULTS_FOLDER_NAME
+        organized_results_folder.mkdir()
+        for student_id in student_ids[STUDENTS_WITHOUT_OFFLINE_SUMMARY:]:
+            (organized_results_folder / f"student_{student_id}_interests_organized.md").write_text(
+                "SUMMARY:\n- likes motion capture\n\nTOPICS:\n[[Eye tracking]], [[Gait]]\n" * 20, encoding="utf-8")
+        tik = time.perf_counter()
+        await build_student_interest_summaries(student_interests_folder=student_interests_folder)
+        build_seconds = time.perf_counter() - tik
+        for student_id in student_ids[:STUDENTS_WITHOUT_OFFLINE_SUMMARY]:
+            (organized_results_folder / f"student_{student_id}_interests_organized.md").write_text(
+                "SUMMARY:\n- new student\n\nTOPICS:\n[[Dance]]\n" * 20, encoding="utf-8")
+
+        print(f"{NUMBER_OF_DMS} DMs from {NUMBER_OF_STUDENTS} students ({STUDENTS_WITHOUT_OFFLINE_SUMMARY} without an "
+              f"offline summary), {SIMULATED_MODEL_SECONDS * 1000:.0f} ms simulated model latency - offline build "
+              f"took {build_seconds:.2f} s\n")
+
+        previous = await measure_blocking(
+            [lambda student_id=student_id: previous_get_private_message_prompts(student_interests_folder, student_id)
+             for student_id in dm_student_ids])
+        cache = StudentInterestPromptCache(student_interests_folder=student_interests_folder)
+        cached = await measure_blocking([lambda student_id=student_id: cache.get_interests(student_id=student_id)
+                                         for student_id in dm_student_ids])
+        await asyncio.sleep(SIMULATED_MODEL_SECONDS * 2)
+        reloaded = StudentInterestPromptCache(student_interests_folder=student_interests_folder)
+        fresh = sum(reloaded._get_summary(str(student_id)) is not None for student_id in student_ids)
+
+    for label, results in [("summarize on every DM", previous), ("StudentInterestPromptCache", cached)]:
+        print(f"{label:<27} prompt p50: {results['p50_ms']:8.2f} ms"
+              f" | max event loop blocked: {results['max_loop_blocked_ms']:7.1f} ms"
+              f" | model calls: {results['model_calls']}")
+    print(f"\nThe cache's model calls ran in the background, for the students without an offline summary. "
+          f"Up-to-date summaries saved afterwards: {fresh}/{NUMBER_OF_STUDENTS}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
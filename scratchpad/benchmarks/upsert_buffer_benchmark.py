@@ -0,0 +1,102 @@
+"""Benchmark: `/upsert_messages` request-path latency with direct `bulk_write`s vs. the write-behind `UpsertBuffer`.
+
+Uses a fake `MongoDatabaseManager` whose `upsert_many` costs a simulated round-trip plus a small per-document cost,
+and fires message upserts from many "channels" concurrently, the way a busy server does.
+
+Run with:
+    python -m scratchpad.benchmarks.upsert_buffer_benchmark
+"""
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_NICK_NAMES", "benchmark")
+os.environ.setdefault("CLASSBOT_SERVER_ID", "0")
+os.environ.setdefault("PORT_NUMBER", "8123")
+os.environ.setdefault("PREFIX", "http")
+
+from jonbot.backend.data_layer.database.mongo_database import MongoDatabaseManager
+from jonbot.backend.data_layer.database.upsert_buffer import UpsertBuffer
+from jonbot.system.environment_variables import RAW_MESSAGES_COLLECTION_NAME
+
+SIMULATED_BULK_WRITE_ROUND_TRIP_SECONDS = 0.005
+SIMULATED_PER_DOCUMENT_SECONDS = 0.00005
+NUMBER_OF_CHANNELS = 50
+MESSAGES_PER_CHANNEL = 40
+MESSAGES_PER_UPSERT = 2  # the human message + the bot's reply
+
+
+class FakeMongoDatabaseManager(MongoDatabaseManager):
+    def __init__(self):
+        self.bulk_writes = 0
+        self.documents_written = 0
+
+    async def upsert_many(self, database_name: str, entries: List[Dict[str, dict]], collection_name: str,
+                          ordered: bool = True) -> bool:
+        await asyncio.sleep(SIMULATED_BULK_WRITE_ROUND_TRIP_SECONDS + SIMULATED_PER_DOCUMENT_SECONDS * len(entries))
+        self.bulk_writes += 1
+        self.documents_written += len(entries)
+        return True
+
+
+def build_entries(channel_number: int, message_number: int) -> List[Dict[str, dict]]:
+    return [{"query": {"message_id": channel_number * 10_000 + message_number * MESSAGES_PER_UPSERT + offset},
+             "data": {"content": "hello " * 50, "channel_id": channel_number}}
+            for offset in range(MESSAGES_PER_UPSERT)]
+
+
+async def run(buffered: bool) -> Dict:
+    mongo_database = FakeMongoDatabaseManager()
+    upsert_buffer = UpsertBuffer(mongo_database=mongo_database)
+    latencies = []
+
+    async def channel(channel_number: int):
+        for message_number in range(MESSAGES_PER_CHANNEL):
+            entries = build_entries(channel_number, message_number)
+            tik = time.perf_counter()
+            if buffered:
+                await upsert_buffer.enqueue(database_name="benchmark_database",
+                                            collection_name=RAW_MESSAGES_COLLECTION_NAME,
+                                            entries=entries)
+            else:
+                await mongo_database.upsert_many(database_name="benchmark_database",
+                                                 collection_name=RAW_MESSAGES_COLLECTION_NAME,
+                                                 entries=entries)
+            latencies.append(time.perf_counter() - tik)
+            await asyncio.sleep(0.001)
+
+    wall_clock_start = time.perf_counter()
+    await asyncio.gather(*[channel(channel_number) for channel_number in range(NUMBER_OF_CHANNELS)])
+    await upsert_buffer.close()
+    wall_clock_duration = time.perf_counter() - wall_clock_start
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "bulk_writes": mongo_database.bulk_writes,
+        "documents_written": mongo_database.documents_written,
+        "wall_clock_s": wall_clock_duration,
+        "stats": upsert_buffer.stats,
+    }
+
+
+def print_results(label: str, results: Dict):
+    print(f"{label:<20} request-path p50: {results['p50_ms']:7.3f} ms | p99: {results['p99_ms']:7.3f} ms"
+          f" | bulk_writes: {results['bulk_writes']:5d} | documents: {results['documents_written']:5d}"
+          f" | wall clock: {results['wall_clock_s']:.2f} s")
+
+
+async def main():
+    print(f"{NUMBER_OF_CHANNELS} channels x {MESSAGES_PER_CHANNEL} upserts of {MESSAGES_PER_UPSERT} messages, "
+          f"{SIMULATED_BULK_WRITE_ROUND_TRIP_SECONDS * 1000:.1f} ms simulated bulk_write round-trip\n")
+    print_results("direct bulk_write", await run(buffered=False))
+    buffered_results = await run(buffered=True)
+    print_results("UpsertBuffer", buffered_results)
+    print(f"\nUpsertBuffer stats: {buffered_results['stats']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())